@@ -0,0 +1,189 @@
+"""
+asyncio flavour of graph_submission functions
+
+all coroutines here run on a single event loop living in it's own thread,
+so they never block houdini's main thread.
+Blocking http calls are done by the same pooled clients as the sync functions use, in a worker pool.
+
+from main thread use the *_future helpers (or run_async), they return concurrent.futures.Future
+that can be polled with .done() or given a callback with add_main_thread_callback
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Coroutine
+
+from .graph_submission import (
+    submit_graph, check_if_prompt_done_and_get_result, get_prompt_history_result, download_result,
+    cancel_prompt, cleanup_submission, forget_prompt, poll_interval, ws_wait_interval, safety_poll_interval,
+)
+from .prompt_tracking import PromptTracker, get_prompt_tracker
+from .upload_common import upload_image
+
+try:
+    import hdefereval  # only available in graphical houdini session
+except ImportError:
+    hdefereval = None
+
+
+max_io_workers = 32
+
+
+_loop: asyncio.AbstractEventLoop|None = None
+_io_executor: ThreadPoolExecutor|None = None
+_loop_lock = threading.Lock()
+_tracker_lock: asyncio.Lock|None = None  # only touched from the loop thread
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    get the bridge's event loop, starting it's thread if needed
+    """
+    global _loop, _io_executor
+    with _loop_lock:
+        if _loop is None:
+            _io_executor = ThreadPoolExecutor(max_workers=max_io_workers, thread_name_prefix='comfyui-async-io')
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(_io_executor)
+            thread = threading.Thread(target=loop.run_forever, name='comfyui-async-loop', daemon=True)
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+def run_async(coro: Coroutine) -> Future:
+    """
+    schedule coroutine on the bridge's event loop, can be called from any thread
+
+    cancelling returned future cancels the coroutine
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def add_main_thread_callback(future: Future, callback: Callable[[Future], Any]):
+    """
+    like future.add_done_callback, but callback is called from houdini's main thread, so it may use hou
+    """
+    if hdefereval is None:
+        # no event loop in non-graphical session, so there is no main thread to defer to
+        future.add_done_callback(callback)
+        return
+    future.add_done_callback(lambda f: hdefereval.executeDeferred(callback, f))
+
+
+async def _run_blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args, **kwargs))
+
+
+async def submit_graph_async(host: str, graph: dict, client_id: str|None = None) -> tuple[str, dict]:
+    return await _run_blocking(submit_graph, host, graph, client_id)
+
+
+async def wait_for_prompt_result_async(host: str, prompt_id: str, tracker: PromptTracker|None, connection_epoch: int = -1, *, output_ids=None) -> dict:
+    """
+    same as wait_for_prompt_result, but without occupying a thread while waiting
+    """
+    next_poll_time = 0.0
+    if tracker is not None and tracker.is_connected() and tracker.connection_epoch == connection_epoch:
+        next_poll_time = time.monotonic() + safety_poll_interval
+
+    while True:
+        if tracker is not None and tracker.is_connected():
+            if tracker.connection_epoch != connection_epoch:
+                # reconnected, events might have been lost meanwhile, so double check with a poll
+                connection_epoch = tracker.connection_epoch
+                next_poll_time = 0.0
+            elif tracker.finished_status(prompt_id) is not None:
+                forget_prompt(tracker, prompt_id)
+                if (res := await _run_blocking(get_prompt_history_result, host, prompt_id, output_ids)) is not None:
+                    return res
+                next_poll_time = 0.0  # should not happen, but let poll sort it out
+            fallback_interval = safety_poll_interval
+        else:
+            fallback_interval = poll_interval
+
+        now = time.monotonic()
+        if now >= next_poll_time:
+            if (res := await _run_blocking(check_if_prompt_done_and_get_result, host, prompt_id, output_ids)) is not None:
+                if tracker is not None:
+                    forget_prompt(tracker, prompt_id)
+                return res
+            next_poll_time = now + fallback_interval
+
+        await asyncio.sleep(ws_wait_interval)
+
+
+async def submit_graph_and_get_result_async(host: str, graph: dict, *, output_ids=None) -> tuple[dict, str]:
+    """
+    if the task is cancelled while waiting - prompt is cancelled on the server too
+    """
+    global _tracker_lock
+    if _tracker_lock is None:
+        _tracker_lock = asyncio.Lock()
+    # so that concurrent first submissions all wait for tracker's first connection, not just one of them
+    async with _tracker_lock:
+        tracker = await _run_blocking(get_prompt_tracker, host)
+    connection_epoch = tracker.connection_epoch if tracker else -1
+    prompt_id, errors = await submit_graph_async(host, graph, tracker.client_id if tracker else None)
+
+    if errors:
+        raise RuntimeError(f'some nodes have errors: {errors}')
+    if tracker is not None:
+        tracker.track_progress(prompt_id, graph)
+
+    try:
+        res = await wait_for_prompt_result_async(host, prompt_id, tracker, connection_epoch, output_ids=output_ids)
+    except asyncio.CancelledError:
+        await cancel_prompt_async(host, prompt_id)
+        raise
+
+    return res, prompt_id
+
+
+async def upload_image_async(host: str, file_path: Path, subdir: str, image_name: str|None):
+    return await _run_blocking(upload_image, host, file_path, subdir, image_name)
+
+
+async def download_result_async(host: str, filename: str, subfolder: str, dest_path: Path):
+    return await _run_blocking(download_result, host, filename, subfolder, dest_path)
+
+
+async def download_results_async(host: str, downloads: list[tuple[str, str, Path]]):
+    """
+    download all given (filename, subfolder, dest_path) concurrently
+    """
+    await asyncio.gather(*(download_result_async(host, filename, subfolder, dest_path) for filename, subfolder, dest_path in downloads))
+
+
+async def cancel_prompt_async(host: str, prompt_id: str):
+    return await _run_blocking(cancel_prompt, host, prompt_id)
+
+
+async def cleanup_submission_async(host: str, *, inputs=(), outputs=(), prompt_ids=()) -> dict[str, list[str]]:
+    return await _run_blocking(cleanup_submission, host, inputs=inputs, outputs=outputs, prompt_ids=prompt_ids)
+
+
+def submit_graph_and_get_result_future(host: str, graph: dict, *, output_ids=None) -> Future:
+    """
+    start submission from any thread, future's result is (result, prompt_id)
+    """
+    return run_async(submit_graph_and_get_result_async(host, graph, output_ids=output_ids))
+
+
+def download_results_future(host: str, downloads: list[tuple[str, str, Path]]) -> Future:
+    return run_async(download_results_async(host, downloads))
+
+
+def upload_image_future(host: str, file_path: Path, subdir: str, image_name: str|None) -> Future:
+    return run_async(upload_image_async(host, file_path, subdir, image_name))
+
+
+def cancel_prompt_future(host: str, prompt_id: str) -> Future:
+    return run_async(cancel_prompt_async(host, prompt_id))
+
+
+def cleanup_submission_future(host: str, *, inputs=(), outputs=(), prompt_ids=()) -> Future:
+    return run_async(cleanup_submission_async(host, inputs=inputs, outputs=outputs, prompt_ids=prompt_ids))
@@ -0,0 +1,183 @@
+"""
+cache of the node-local part of partial graph compilation
+
+parsing cui_graph and reading all the multiparms is the slow part of graph construction,
+and it only depends on node's own parameters, so we keep it per node,
+and drop it when node's parameters change.
+
+nodes with expressions or variables in parameters may change without any events, so those are never cached
+"""
+import json
+from dataclasses import dataclass
+import hou  # type:ignore
+from .partial_graph_parms import read_partial_graph_parms
+
+
+_invalidating_events = (
+    hou.nodeEventType.ParmTupleChanged,
+    hou.nodeEventType.BeingDeleted,
+)
+
+
+@dataclass
+class CompiledPartialGraph:
+    graph: dict
+    outputs: dict[int, tuple[str, int]]  # output index -> (node key, node output index)
+    params: dict[tuple[str, str], int|float|str|bool]  # (node key, input) -> value set on the node
+    node_inputs: list[tuple[str, str, int, str]]  # (node title, input, node input index, original value type) - inputs fed from node connections
+    graph_input_nums: dict[int, int]  # node input index -> cui input number using it
+    input_metas: dict[int, tuple[bool, str]]  # cui input number -> (needs cc bake, input type)
+    title_index: dict[str, str]  # node title -> node key, see build_title_index
+
+    def node_key(self, title: str) -> str:
+        """
+        node inputs keep titles, as unconnected inputs may refer to titles that are not in the graph anymore,
+        so keys are only looked up for inputs that are actually used
+        """
+        from .compound_graph_core import title_index_to_key
+        return title_index_to_key(self.title_index, title)
+
+    def copy_graph(self) -> dict:
+        """
+        graph gets modified while combined, so each use must get it's own copy
+        """
+        return _copy_json_like(self.graph)
+
+
+_compiled: dict[int, CompiledPartialGraph] = {}  # node session id -> compiled data
+_uncacheable: set[int] = set()  # node session ids known to have expressions
+_watched: set[int] = set()  # node session ids we have event callbacks on
+_hip_callback_registered = False
+
+
+def get_compiled_partial_graph(node: hou.Node) -> CompiledPartialGraph:
+    session_id = node.sessionId()
+    if (compiled := _compiled.get(session_id)) is not None:
+        return compiled
+
+    compiled = compile_partial_graph_node(node)
+
+    if session_id in _uncacheable:
+        return compiled
+    _watch(node)
+    if _has_volatile_parms(node):
+        _uncacheable.add(session_id)
+    else:
+        _compiled[session_id] = compiled
+    return compiled
+
+
+def compile_partial_graph_node(node: hou.Node) -> CompiledPartialGraph:
+    # imported here to avoid circular import
+    from .compound_graph_core import build_title_index, title_index_to_key
+
+    parms = read_partial_graph_parms(node)
+    graph = json.loads(parms.graph)
+    title_index = build_title_index(graph)
+
+    params = {}
+    node_inputs = []
+    graph_input_nums = {}
+    input_metas = {}
+    for i, inp in enumerate(parms.inputs, 1):
+        if not inp.is_input:
+            value = inp.value
+            if inp.value_type in ('int', 'float'):
+                pass
+            elif inp.value_type == 'textint':
+                value = int(value)
+                if value > 2**63 - 1 or value < -2**63:
+                    raise ValueError(f'comfy backend cannot process such big/small numbers! ({value})')
+            elif inp.value_type == 'text':
+                contype = inp.converted_type
+                if contype == 'int':
+                    value = int(value)
+                elif contype == 'float':
+                    value = float(value)
+                elif contype == 'text':
+                    pass
+                elif contype == 'bool':
+                    value = bool(value)
+                else:
+                    raise AssertionError('unreachable')
+            elif inp.value_type == 'bool':
+                value = bool(value)
+            else:
+                raise RuntimeError(f'unknown value type "{inp.value_type}"')
+
+            params[(title_index_to_key(title_index, inp.node_title), inp.node_input)] = value
+            continue
+
+        input_idx = inp.input_index
+        graph_input_nums.setdefault(input_idx, i)
+        input_metas[i] = (inp.bake_cc, inp.input_type)
+        node_inputs.append((inp.node_title, inp.node_input, input_idx, inp.orig_value_type))
+
+    outputs = {
+        i: (title_index_to_key(title_index, out.node_title), out.node_output)
+        for i, out in enumerate(parms.outputs)
+    }
+
+    return CompiledPartialGraph(graph, outputs, params, node_inputs, graph_input_nums, input_metas, title_index)
+
+
+def invalidate(node: hou.Node):
+    session_id = node.sessionId()
+    _compiled.pop(session_id, None)
+    _uncacheable.discard(session_id)
+
+
+def clear():
+    _compiled.clear()
+    _uncacheable.clear()
+
+
+def _has_volatile_parms(node: hou.Node) -> bool:
+    """
+    anything but a plain constant (expressions, references, animation, variables)
+    may change value without parm change event
+    """
+    for parm in node.parms():
+        if parm.keyframes() or parm.getReferencedParm() != parm:
+            return True
+        try:
+            parm.expression()
+            return True
+        except hou.OperationFailed:
+            pass  # no expression
+        if parm.parmTemplate().type() == hou.parmTemplateType.String and parm.unexpandedString() != parm.evalAsString():
+            return True
+    return False
+
+
+def _watch(node: hou.Node):
+    global _hip_callback_registered
+    if not _hip_callback_registered:
+        hou.hipFile.addEventCallback(_hip_event_callback)
+        _hip_callback_registered = True
+
+    session_id = node.sessionId()
+    if session_id in _watched:
+        return
+    node.addEventCallback(_invalidating_events, _node_event_callback)
+    _watched.add(session_id)
+
+
+def _node_event_callback(node, event_type, **kwargs):
+    invalidate(node)
+    if event_type == hou.nodeEventType.BeingDeleted:
+        _watched.discard(node.sessionId())
+
+
+def _hip_event_callback(event_type):
+    if event_type in (hou.hipFileEventType.BeforeClear, hou.hipFileEventType.BeforeLoad):
+        clear()
+        _watched.clear()
+
+
+def _copy_json_like(val):
+    if isinstance(val, dict):
+        return {k: _copy_json_like(v) for k, v in val.items()}
+    elif isinstance(val, list):
+        return [_copy_json_like(v) for v in val]
+    return val
@@ -6,8 +6,27 @@ from pathlib import Path
 import json
 import re
 import uuid
-from houdini_comfyui_connection.graph_submission import BadInputSubstituteError, ResultNotFound, GraphValidationError, delete_input_image, delete_output_image, delete_prompt_history, download_result, submit_graph_and_get_result, FunctionalityNotAvailable, FailedToDeleteImage
+import tempfile
+import shutil
+from collections import deque
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from houdini_comfyui_connection.graph_submission import BadInputSubstituteError, ResultNotFound, GraphValidationError, cancel_prompt, cleanup_submission, delete_input_image, delete_output_image, delete_prompt_history, download_results, submit_graph, submit_graph_and_get_result, FunctionalityNotAvailable, FailedToDeleteImage, ws_wait_interval
+from .async_client import run_async, wait_for_prompt_result_async
+from .prompt_tracking import PromptTracker, get_prompt_tracker
+from .preview_streaming import PreviewStream
 from .compound_graph_core_graph_helpers import follow_input_till_deadend
+from .compound_graph_compile_cache import get_compiled_partial_graph
+from .host_pool import acquire_host, dispatch, dispatched_to, parse_hosts, release_host
+from . import result_cache
+from . import tracing
+from .cop_layer_encoding import LayerNotEncodable, encode_cop_input_png, encode_cop_input_npy
+from .upload_common import CookedInput, content_addressed_name, discard_cooked_input, upload_cooked_inputs_as, batch_upload_max_files, batch_upload_max_bytes
+
+
+max_parallel_uploads = 4
+encode_cop_inputs_directly = True  # raw image inputs at current frame are encoded from cop layer in memory, without ROP render
+raw_float_inputs = os.environ.get('HCUI_RAW_FLOAT_INPUTS', '0') == '1'  # upload raw (not cc-baked) image inputs as float .npy instead of 8 bit png, needs HouCuiLoadRawImage on the server
 
 
 class SubmitVariableNotFoundError(KeyError):
@@ -34,6 +53,11 @@ class UploadInfo:
     filename: str
     frame: int|float|None
     was_uploaded: bool = field(default=False, init=False)
+    original_filename: str = field(default='', init=False)  # name graph parts were built with, before it got content-addressed
+    content_addressed: bool = field(default=False, init=False)  # such inputs are shared between submissions, so cleanup leaves them to server's collection
+
+    def __post_init__(self):
+        self.original_filename = self.filename
 
 
 @dataclass
@@ -137,6 +161,22 @@ def title_to_key(graph: dict, title: str) -> str:
     raise KeyError(f'node with title {title} not found')
 
 
+def build_title_index(graph: dict) -> dict[str, str]:
+    """
+    title -> node key, for many title lookups in the same graph. like title_to_key, first node with the title wins
+    """
+    index = {}
+    for node_key, node_data in graph.items():
+        index.setdefault(node_data.get('_meta', {}).get('title'), node_key)
+    return index
+
+
+def title_index_to_key(title_index: dict[str, str], title: str) -> str:
+    if (node_key := title_index.get(title)) is None:
+        raise KeyError(f'node with title {title} not found')
+    return node_key
+
+
 def get_image_load_graph(cui_image_path: str) -> dict:
     return {
         "0": {
@@ -151,17 +191,27 @@ def get_image_load_graph(cui_image_path: str) -> dict:
     }
 
 
-def get_mask_load_graph(cui_image_path: str) -> dict:
+def get_raw_image_load_graph(cui_image_path: str) -> dict:
     return {
-        "1": {
+        "0": {
             "inputs": {
                 "image": cui_image_path
             },
-            "class_type": "LoadImage",
+            "class_type": "HouCuiLoadRawImage",
             "_meta": {
-                "title": "Load Image"
+                "title": "Load Raw Image"
             }
-        },
+        }
+    }
+
+
+def get_mask_load_graph(cui_image_path: str) -> dict:
+    if cui_image_path.endswith('.npy'):
+        loader = get_raw_image_load_graph(cui_image_path)["0"]
+    else:
+        loader = get_image_load_graph(cui_image_path)["0"]
+    return {
+        "1": loader,
         "0": {
             "inputs": {
                 "image": [
@@ -177,21 +227,15 @@ def get_mask_load_graph(cui_image_path: str) -> dict:
     }
 
 
-def get_image_save_graph(cui_image_prefix: str, node_key: str = "0", sort_order: int = 0) -> dict:
+def get_image_save_graph(cui_image_prefix: str, node_key: str = "0", sort_order: int = 0, precision: str = 'png') -> dict:
+    """
+    precision is 'png' for 8 bit png, or 'half'/'float' for float exr
+    """
     return {
-        node_key: {
-            "inputs": {
-                "filename_prefix": cui_image_prefix
-            },
-            "class_type": "SaveImage",
-            "_meta": {
-                "_sort_order": sort_order,
-                "title": "Save Image",
-            }
-        }
+        node_key: _get_save_node(cui_image_prefix, sort_order, precision)
     }
 
-def get_mask_save_graph(cui_image_prefix: str, node_key: str = "0", sort_order: int = 0) -> dict:
+def get_mask_save_graph(cui_image_prefix: str, node_key: str = "0", sort_order: int = 0, precision: str = 'png') -> dict:
     return {
         node_key: {
             'class_type': 'MaskToImage',
@@ -199,18 +243,36 @@ def get_mask_save_graph(cui_image_prefix: str, node_key: str = "0", sort_order:
                 'title': 'masktoimage',
             }
         },
-        (node_key + "0"): {
-            "inputs": {
-                'images': [node_key, 0],
-                "filename_prefix": cui_image_prefix
-            },
+        (node_key + "0"): _get_save_node(cui_image_prefix, sort_order, precision, images_from=[node_key, 0]),
+    }
+
+
+def _get_save_node(cui_image_prefix: str, sort_order: int, precision: str, images_from: list|None = None) -> dict:
+    inputs = {
+        "filename_prefix": cui_image_prefix
+    }
+    if images_from is not None:
+        inputs['images'] = images_from
+    if precision == 'png':
+        return {
+            "inputs": inputs,
             "class_type": "SaveImage",
             "_meta": {
                 "_sort_order": sort_order,
                 "title": "Save Image",
             }
         }
-    }
+    elif precision in ('half', 'float'):
+        inputs['precision'] = precision
+        return {
+            "inputs": inputs,
+            "class_type": "HouCuiSaveImageFloat",
+            "_meta": {
+                "_sort_order": sort_order,
+                "title": "Save Image (Float EXR)",
+            }
+        }
+    raise ValueError(f'unknown result precision "{precision}"')
 
 def get_string_save_graph(node_key: str = "0", sort_order: int = 0) -> dict:
     return {
@@ -269,13 +331,7 @@ def get_mesh_save_graph(cui_image_prefix: str, node_key: str = "0", sort_order:
 
 
 def get_graph_input_num_from_node_input(node: hou.Node, node_input: int) -> int|None:
-    for i in range(1, 1 + node.evalParm('cui_inputs')):
-        input_type = node.evalParm(f'cui_i_value_type_{i}')
-        if not input_type.startswith('input'):
-            continue
-        if int(input_type[5:]) - 1 == node_input:
-            return i
-    return None
+    return get_compiled_partial_graph(node).graph_input_nums.get(node_input)
 
 
 def is_custom_partial_graph_processing_node(subnode):
@@ -305,7 +361,9 @@ def process_graph_node(
         # treat other nodes as bypassed ones
         return process_graph_node(subnode.inputs()[0] if len(subnode.inputs()) else None, node_to_graph, nodes_to_upload, context_vars, long_op=long_op)
         
-    graph = json.loads(subnode.evalParm('cui_graph'))
+    with tracing.span('compile node', node=subnode.path()):
+        compiled = get_compiled_partial_graph(subnode)
+    graph = compiled.copy_graph()
     # process all input nodes
     input_nodes = []
     for i, input_node_maybe in enumerate(subnode.inputConnectors()):
@@ -322,14 +380,11 @@ def process_graph_node(
             if in_node_source_data.image_type != ImageType.RGBA:
                 raise NotImplementedError('only single type is supported for now')
             # treat it as color input
-            input_parm_i_corresponding_to_this_node_input = get_graph_input_num_from_node_input(subnode, i)
+            input_parm_i_corresponding_to_this_node_input = compiled.graph_input_nums.get(i)
             if input_parm_i_corresponding_to_this_node_input is None:
                 # connected input is not used in the graph
                 continue
-            needs_cc_parm = subnode.parm(f'cui_i_meta_bakecc_{input_parm_i_corresponding_to_this_node_input}')
-            needs_cc = bool(needs_cc_parm.eval()) if needs_cc_parm else True  # default True - compatible with older asset version
-            input_type_parm = subnode.parm(f'cui_i_meta_intype_{input_parm_i_corresponding_to_this_node_input}')
-            input_type = input_type_parm.evalAsString() if input_type_parm else 'IMAGE'  # default IMAGE for compat
+            needs_cc, input_type = compiled.input_metas[input_parm_i_corresponding_to_this_node_input]
 
             upload_node = subnode.node(f'input_upload{i+1}')
             # first check if we already are uploading required input
@@ -337,10 +392,13 @@ def process_graph_node(
             if source_context in nodes_to_upload:
                 image_name = nodes_to_upload[source_context][1].filename
             else:
-                image_name = f"houdini_comfyui_connection/{uuid.uuid4()}.png"
+                ext = '.npy' if raw_float_inputs and not needs_cc else '.png'
+                image_name = f"houdini_comfyui_connection/{uuid.uuid4()}{ext}"
                 nodes_to_upload[source_context] = (upload_node, ImageInfo(image_name, source_context.context.frame, needs_cc))
             # need to create loader for that new image
-            if input_type in ('IMAGE', ''):  # treat empty as image for compat for now
+            if input_type in ('IMAGE', '') and image_name.endswith('.npy'):
+                img_load_graph = get_raw_image_load_graph(image_name)
+            elif input_type in ('IMAGE', ''):  # treat empty as image for compat for now
                 img_load_graph = get_image_load_graph(image_name)
             elif input_type == 'MASK':
                 img_load_graph = get_mask_load_graph(image_name)
@@ -362,43 +420,8 @@ def process_graph_node(
         input_nodes[-1] = (in_node_source_data.node, in_node_source_data.output)
         
     inputs = {}
-    params = {}
-    for i in range(1, 1+subnode.evalParm('cui_inputs')):
-        inp_node_title = subnode.evalParm(f'cui_i_node_title_{i}')
-        inp_node_input = subnode.evalParm(f'cui_i_node_input_{i}')
-        inp_node_vtype = subnode.evalParm(f'cui_i_value_type_{i}')
-        inp_node_orig_vtype = subnode.evalParm(f'cui_i_meta_orig_value_type_{i}')
-        if not inp_node_vtype.startswith('input'):
-            if inp_node_vtype == 'int':
-                value = subnode.evalParm(f'cui_i_value_int_{i}')
-            elif inp_node_vtype == 'textint':
-                value = int(subnode.evalParm(f'cui_i_value_textint_{i}'))
-                if value > 2<<63-1 or value < -2<<63:
-                    raise ValueError('comfy backend cannot process such big/small numbers! ({value})')
-            elif inp_node_vtype == 'float':
-                value = subnode.evalParm(f'cui_i_value_float_{i}')
-            elif inp_node_vtype == 'text':
-                value = subnode.evalParm(f'cui_i_value_text_{i}')
-                contype = subnode.evalParm(f'cui_i_meta_convertedtype_{i}')
-                if contype == 'int':
-                    value = int(value)
-                elif contype == 'float':
-                    value = float(value)
-                elif contype == 'text':
-                    pass
-                elif contype == 'bool':
-                    value = bool(value)
-                else:
-                    raise AssertionError('unreachable')
-            elif inp_node_vtype == 'bool':
-                value = bool(subnode.evalParm(f'cui_i_value_bool_{i}'))
-            else:
-                raise RuntimeError(f'unknown value type "{inp_node_vtype}"')
-                
-            params[(title_to_key(graph, inp_node_title), inp_node_input)] = value
-            continue
-        
-        input_idx = int(inp_node_vtype[5:]) - 1
+    params = dict(compiled.params)
+    for inp_node_title, inp_node_input, input_idx, inp_node_orig_vtype in compiled.node_inputs:
         if input_idx >= len(input_nodes) or input_nodes[input_idx] is None:
             # we know that a node is not connected to another comfyui node, 
             #  but it may sitll have a houdini-level node connection that might lead to a value substitution
@@ -413,17 +436,14 @@ def process_graph_node(
             maybe_value = _try_get_input_value(deadend_node, inp_node_orig_vtype, deadend_node_input)
             if maybe_value is None:
                 continue
-            params[(title_to_key(graph, inp_node_title), inp_node_input)] = maybe_value
+            params[(compiled.node_key(inp_node_title), inp_node_input)] = maybe_value
             continue
 
-        inputs[(title_to_key(graph, inp_node_title), inp_node_input)] = input_nodes[input_idx]
+        inputs[(compiled.node_key(inp_node_title), inp_node_input)] = input_nodes[input_idx]
         
     node_to_graph[subnode] = GraphPartData(
         graph,
-        {
-            i: (title_to_key(graph, subnode.evalParm(f'cui_o_node_title_{i+1}')), subnode.evalParm(f'cui_o_node_output_{i+1}'))
-            for i in range(subnode.evalParm('cui_outputs'))
-        },
+        dict(compiled.outputs),
         inputs,
         params,
     )
@@ -477,7 +497,7 @@ def combine_graph_parts(node_to_graph: dict[hou.Node, GraphPartData]) -> tuple[d
     return new_graph, param_overrides
 
 
-def _expand_val(text: str, context_vars: dict[str, str|float|int], upload_nodes: dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]]) -> str:
+def _expand_val(text: str, context_vars: dict[str, str|float|int], upload_index: dict[tuple[hou.Node, int, float], UploadInfo]) -> str:
     magic_string = ':#:cuiinputfrom:#:'
     if not text.startswith(magic_string):
         try:
@@ -494,29 +514,35 @@ def _expand_val(text: str, context_vars: dict[str, str|float|int], upload_nodes:
     if not isinstance(in_node_data, NonGraphSource):
         raise ValueError('expression referenced node is not a source!')
     
-    in_node = in_node_data.node
-    out_idx = in_node_data.output
-    for key, (_, info) in upload_nodes.items():
-        if (key.node != in_node
-            or key.output_index != out_idx
-            or key.context.frame != hou.frame()
-        ):
-            continue
+    if (info := upload_index.get((in_node_data.node, in_node_data.output, hou.frame()))) is not None:
         return info.filename
     raise ValueError('expression referenced node not found!')
 
 
+def build_upload_index(upload_nodes: dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]]) -> dict[tuple[hou.Node, int, float], UploadInfo]:
+    """
+    (source node, output index, frame) -> upload info, first upload wins
+    """
+    index = {}
+    for key, (_, info) in upload_nodes.items():
+        index.setdefault((key.node, key.output_index, key.context.frame), info)
+    return index
+
+
 def replace_params_in_graph_by_key(
     graph_data: dict,
     inputs_to_replace: dict,
     upload_nodes: dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]],
     context_vars: dict[str, str|float|int],
 ):
+    upload_index = None
     for node_key, node_data in inputs_to_replace.items():
         for input_name, value in node_data.items():
             # special cases of values
             if isinstance(value, str):
-                value = _expand_val(value, context_vars, upload_nodes)
+                if upload_index is None:
+                    upload_index = build_upload_index(upload_nodes)
+                value = _expand_val(value, context_vars, upload_index)
             graph_data[node_key].setdefault('inputs', {})[input_name] = value
 
 
@@ -527,9 +553,12 @@ def construct_full_graph(
     upload_nodes: dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]]|None = None,
     explicit_cui_roots: list[hou.Node]|None = None,
     long_op: hou.InterruptableOperation|None = None,
+    result_precision: str = 'png',
 ) -> tuple[dict, dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]], list[str]]:
     """
     construct final graph from inner pieces with all inputs already replaced
+
+    result_precision selects how IMAGE and MASK outputs are saved: 'png' for 8 bit png, 'half' or 'float' for exr
     """
     if output_node is None and explicit_cui_roots is None:
         raise ValueError('either output_node or explicit_cui_roots must be provided')
@@ -562,13 +591,13 @@ def construct_full_graph(
                 saving_graph.update(get_mesh_save_graph(f'houdini-connection-todo-change-this-{i}', f'{i}', i))
                 saving_inputs[(f'{i}', 'mesh')] = (in_source.node, in_source.output)
             elif output_type_name == 'MASK':
-                saving_graph.update(get_mask_save_graph(f'houdini-connection-todo-change-this-{i}', f'{i}', i))
+                saving_graph.update(get_mask_save_graph(f'houdini-connection-todo-change-this-{i}', f'{i}', i, result_precision))
                 saving_inputs[(f'{i}', 'mask')] = (in_source.node, in_source.output)
             elif output_type_name == 'STRING':
                 saving_graph.update(get_string_save_graph(f'{i}', i))
                 saving_inputs[(f'{i}', 'image_path')] = (in_source.node, in_source.output)
             elif output_type_name in ('IMAGE', ''):  # for backwards compat treat empty type as image too
-                saving_graph.update(get_image_save_graph(f'houdini-connection-todo-change-this-{i}', f'{i}', i))
+                saving_graph.update(get_image_save_graph(f'houdini-connection-todo-change-this-{i}', f'{i}', i, result_precision))
                 saving_inputs[(f'{i}', 'images')] = (in_source.node, in_source.output)
             else:
                 raise TypeError(f'saving of input type "{output_type_name}" is not implemented')
@@ -592,8 +621,9 @@ def construct_full_graph(
                 raise RuntimeError('graph root must consist of a single output node')
             node_to_graph[explicit_root].graph[graph_keys[0]]['_meta']['_sort_order'] = i
 
-    new_graph, param_overrides = combine_graph_parts(node_to_graph)
-    replace_params_in_graph_by_key(new_graph, param_overrides, upload_nodes, context_vars)
+    with tracing.span('combine graph parts', parts=len(node_to_graph)):
+        new_graph, param_overrides = combine_graph_parts(node_to_graph)
+        replace_params_in_graph_by_key(new_graph, param_overrides, upload_nodes, context_vars)
 
     outputs = []
     if output_node:
@@ -616,7 +646,92 @@ def construct_full_graph(
     return new_graph, upload_nodes, outputs
 
 
-def submit_compound_graph(
+def _cook_input_to(upload_node: hou.Node, filename: str, **kwargs) -> CookedInput|None:
+    """
+    cook input to a local file without uploading it
+
+    returns None if given uploader does not support separate cooking
+    """
+    if (source_filepath := kwargs.get('override_source_filepath')) is not None:
+        # already a file, nothing to cook
+        return CookedInput(Path(source_filepath))
+
+    hda_module = upload_node.hdaModule()
+    if hasattr(hda_module, 'cook_input_to'):
+        return hda_module.cook_input_to(upload_node, filename, **kwargs)
+    
+    if upload_node.node('rop_image1') is not None and hasattr(hda_module, 'set_session_parm'):
+        # image uploader does not provide cook_input_to, so we do the cooking part of it's upload_input_to here
+        return _cook_image_uploader_input_to(upload_node, filename, **kwargs)
+    
+    return None
+
+
+def _cook_image_uploader_input_to(upload_node: hou.Node, filename: str, *, frame: int|float|None = None, bake_cc: bool = True) -> CookedInput:
+    if Path(filename).suffix.lower() == '.npy':
+        # ROP cannot write raw arrays, so there is no fallback here
+        try:
+            return CookedInput(Path(filename), data=encode_cop_input_npy(upload_node, frame=frame))
+        except AttributeError as e:
+            raise LayerNotEncodable(f'this houdini version cannot read cop layers, unset HCUI_RAW_FLOAT_INPUTS ({e})') from None
+
+    if (
+        encode_cop_inputs_directly
+        and not bake_cc  # baking cc needs OCIO, which only ROP does
+        and (frame is None or frame == hou.frame())
+        and Path(filename).suffix.lower() == '.png'
+    ):
+        try:
+            data = encode_cop_input_png(upload_node)
+        except (LayerNotEncodable, AttributeError) as e:  # AttributeError for houdini versions without layer api
+            debug(f'cannot encode {upload_node.path()} directly, falling back to ROP: {e}')
+        else:
+            return CookedInput(Path(filename), data=data)
+
+    hda_module = upload_node.hdaModule()
+    rop_node = upload_node.node('rop_image1')
+
+    base_path = Path(tempfile.mkdtemp('-hou-connection'))
+    img_path = base_path / filename
+    if frame is not None:
+        frame_range = (frame, frame)
+    else:
+        frame_range = ()
+    # same hack as uploader does to override cc
+    hda_module.set_session_parm(upload_node, 'colorconversion', 1 if bake_cc else 2)  # 1 is bake, 2 is raw
+    try:
+        rop_node.render(
+            frame_range=frame_range,
+            output_file=str(img_path),
+        )
+    finally:
+        hda_module.unset_session_node(upload_node)
+
+    return CookedInput(img_path, temp_dir=base_path)
+
+
+def _rename_inputs_in_graph(graph: dict, renames: dict[str, str]) -> dict:
+    """
+    replace all mentions of uploaded input names in graph's string values
+
+    names we generate are unique enough to be replaced as substrings
+    """
+    def _rename(val):
+        if isinstance(val, str):
+            for old_name, new_name in renames.items():
+                if old_name in val:
+                    val = val.replace(old_name, new_name)
+            return val
+        elif isinstance(val, dict):
+            return {k: _rename(v) for k, v in val.items()}
+        elif isinstance(val, list):
+            return [_rename(v) for v in val]
+        return val
+
+    return _rename(graph)
+
+
+def prepare_compound_graph(
     host: str,
     output_node: hou.Node,
     long_op: hou.InterruptableOperation|None = None,
@@ -624,67 +739,329 @@ def submit_compound_graph(
     context_vars: dict[str, str|float|int]|None = None,
     reuse_upload_nodes: dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]]|None = None,
     explicit_roots: list[hou.Node]|None = None,
-) -> tuple[dict, str, dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]], list[str]]:
+    result_cache_lookup: Callable[[dict, list[str]], Any]|None = None,
+    result_precision: str = 'png',
+) -> tuple[dict, dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]], list[str], Any]:
+    """
+    construct the final graph and upload everything it needs, but do not submit it
 
-    graph, upload_nodes, outputs = construct_full_graph(output_node, upload_nodes=reuse_upload_nodes, explicit_cui_roots=explicit_roots, context_vars=context_vars, long_op=long_op)
+    returns graph, upload nodes, output keys and whatever result_cache_lookup returned (None if not given).
+    if result_cache_lookup is given - it's called with final graph and output keys once all inputs are hashed,
+    if it returns anything but None - uploads that did not start yet are dropped
+    """
+
+    with tracing.span('construct graph') as construct_span:
+        graph, upload_nodes, outputs = construct_full_graph(output_node, upload_nodes=reuse_upload_nodes, explicit_cui_roots=explicit_roots, context_vars=context_vars, long_op=long_op, result_precision=result_precision)
+        construct_span.set(nodes=len(graph), inputs=len(upload_nodes))
     debug('full graph:', graph)
 
-    for upload_node, image_info in (x for x in upload_nodes.values()):
-        if image_info.was_uploaded:
-            continue
-        image_info.was_uploaded = True
-        if long_op:
-            long_op.updateLongProgress(-1, "Cooking and Uploading inputs...")
-        subdir, filename = image_info.filename.rsplit('/', 1) if '/' in image_info.filename else ('', image_info.filename)
-        kwargs = {}
-        if isinstance(image_info, ImageInfo):
-            kwargs = {
-                'bake_cc': image_info.bake_cc,
-                'frame': image_info.frame,
-            }
-        elif isinstance(image_info, GeometryUploadInfo):
+    # cooking has to happen on main thread, but hashing and uploads do not,
+    #  so while input N is being hashed by a worker - main thread is cooking input N+1
+    # cooked inputs are uploaded under content-addressed names, so unchanged inputs are not re-uploaded,
+    #  graph is then updated to use those names.
+    # hashed inputs are grouped, and each group goes to the server in a single request, also by a worker.
+    # uploads do not wait for result cache lookup, on a hit they were just wasted bandwidth,
+    #  and content-addressed inputs will be reused by later submissions anyway
+    executor = ThreadPoolExecutor(max_workers=max_parallel_uploads, thread_name_prefix='comfyui-upload')
+    hash_jobs: dict[Future, tuple[UploadInfo, str, CookedInput]] = {}
+    upload_jobs: dict[Future, list[tuple[CookedInput, str, str]]] = {}
+    ready_uploads: list[tuple[CookedInput, str, str]] = []  # (cooked, subdir, final_name) hashed, but not yet grouped
+    ready_size = 0
+
+    def _flush_ready_uploads():
+        nonlocal ready_size
+        if not ready_uploads:
+            return
+        items = list(ready_uploads)
+        ready_uploads.clear()
+        ready_size = 0
+        upload_jobs[executor.submit(tracing.bind(upload_cooked_inputs_as), host, items)] = items
+
+    def _finish_hash_job(future: Future):
+        nonlocal ready_size
+        upload_info, subdir, cooked = hash_jobs.pop(future)
+        try:
+            final_name = future.result()
+        except BaseException:
+            discard_cooked_input(cooked)
+            raise
+        ready_uploads.append((cooked, subdir, final_name))
+        final_path = f'{subdir}/{final_name}' if subdir else final_name
+        upload_info.filename = final_path
+        upload_info.content_addressed = True
+        ready_size += cooked.size()
+        if len(ready_uploads) >= batch_upload_max_files or ready_size >= batch_upload_max_bytes:
+            _flush_ready_uploads()
+
+    def _finish_upload_job(future: Future):
+        upload_jobs.pop(future)
+        future.result()
+
+    def _wait_jobs(jobs: dict[Future, Any], finish_job: Callable[[Future], None], message: str):
+        total_jobs = len(jobs)
+        while jobs:
+            if long_op:
+                long_op.updateLongProgress(
+                    (total_jobs - len(jobs)) / total_jobs,
+                    f"{message} ({total_jobs - len(jobs)}/{total_jobs})...",
+                )
+            done, _ = wait(jobs, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish_job(future)
+
+    try:
+        for upload_node, image_info in (x for x in upload_nodes.values()):
+            if image_info.was_uploaded:
+                continue
+            image_info.was_uploaded = True
+            if long_op:
+                long_op.updateLongProgress(-1, "Cooking and Uploading inputs...")
+            subdir, filename = image_info.filename.rsplit('/', 1) if '/' in image_info.filename else ('', image_info.filename)
             kwargs = {}
-        elif isinstance(image_info, GenericFileInfo):
-            # NOTE: we rely on image uploader here
-            kwargs = {
-                'override_source_filepath': image_info.source_path,
-            }
-        else:
-            raise NotImplementedError(f'upload for type "{image_info}" is not implemented')
+            if isinstance(image_info, ImageInfo):
+                kwargs = {
+                    'bake_cc': image_info.bake_cc,
+                    'frame': image_info.frame,
+                }
+            elif isinstance(image_info, GeometryUploadInfo):
+                kwargs = {}
+            elif isinstance(image_info, GenericFileInfo):
+                # NOTE: we rely on image uploader here
+                kwargs = {
+                    'override_source_filepath': image_info.source_path,
+                }
+            else:
+                raise NotImplementedError(f'upload for type "{image_info}" is not implemented')
+
+            with tracing.span('cook input', node=upload_node.path(), filename=filename) as cook_span:
+                cooked = _cook_input_to(upload_node, filename, **kwargs)
+                if cooked is not None:
+                    cook_span.set(in_memory=cooked.data is not None, size=cooked.size())
+            if cooked is not None:
+                debug(f'cooked {upload_node.path()} to {cooked.file_path}, processing in background')
+                future = executor.submit(tracing.bind(content_addressed_name), cooked.source, Path(filename).suffix)
+                hash_jobs[future] = (image_info, subdir, cooked)
+            else:
+                # uploader cannot separate cooking from uploading
+                with tracing.span('cook and upload input', node=upload_node.path(), filename=filename):
+                    upload_node.hdaModule().upload_input_to(
+                        upload_node,
+                        host,
+                        subdir,
+                        filename,
+                        **kwargs,
+                    )
+            # fail early if something already failed
+            for future in [x for x in hash_jobs if x.done()]:
+                _finish_hash_job(future)
+            for future in [x for x in upload_jobs if x.done()]:
+                _finish_upload_job(future)
+
+        with tracing.span('wait for hashing'):
+            _wait_jobs(hash_jobs, _finish_hash_job, "Hashing inputs")
+
+        # inputs may have been renamed by an earlier call sharing upload nodes (like a nested submission),
+        #  while graph parts built before that still use original names
+        renames = {
+            info.original_filename: info.filename
+            for _, info in upload_nodes.values()
+            if info.filename != info.original_filename
+        }
+        if renames:
+            graph = _rename_inputs_in_graph(graph, renames)
+
+        if result_cache_lookup is not None:
+            with tracing.span('result cache lookup') as lookup_span:
+                cached = result_cache_lookup(graph, outputs)
+                lookup_span.set(hit=cached is not None)
+            if cached is not None:
+                debug('result cache hit')
+                return graph, upload_nodes, outputs, cached
+        _flush_ready_uploads()
+
+        with tracing.span('wait for uploads'):
+            _wait_jobs(upload_jobs, _finish_upload_job, "Uploading inputs")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        # cooked inputs that never got to upload
+        for _, _, cooked in hash_jobs.values():
+            discard_cooked_input(cooked)
+        for cooked, _, _ in ready_uploads:
+            discard_cooked_input(cooked)
+        for future, items in upload_jobs.items():
+            if future.cancelled():  # started ones discard their inputs themselves
+                for cooked, _, _ in items:
+                    discard_cooked_input(cooked)
+
+    return graph, upload_nodes, outputs, None
+
+
+def submit_compound_graph(
+    host: str,
+    output_node: hou.Node,
+    long_op: hou.InterruptableOperation|None = None,
+    *,
+    context_vars: dict[str, str|float|int]|None = None,
+    reuse_upload_nodes: dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]]|None = None,
+    explicit_roots: list[hou.Node]|None = None,
+    result_cache_lookup: Callable[[dict, list[str]], Any]|None = None,
+    result_precision: str = 'png',
+    preview: PreviewStream|None = None,
+) -> tuple[dict, str, dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]], list[str]]:
+    """
+    if result_cache_lookup is given - it's called with final graph and output keys before the prompt is submitted,
+    if it returns anything but None - nothing is submitted, and returned value is given back instead of result,
+    with prompt_id being None
 
-        upload_node.hdaModule().upload_input_to(
-            upload_node,
+    if preview is given - previews of the running prompt are streamed to it
+    """
+    with tracing.span('prepare graph'):
+        graph, upload_nodes, outputs, cached = prepare_compound_graph(
             host,
-            subdir,
-            filename,
-            **kwargs,
+            output_node,
+            long_op,
+            context_vars=context_vars,
+            reuse_upload_nodes=reuse_upload_nodes,
+            explicit_roots=explicit_roots,
+            result_cache_lookup=result_cache_lookup,
+            result_precision=result_precision,
         )
+    if cached is not None:
+        return cached, None, upload_nodes, outputs
 
     # TODO: provide output_ids!
-    res, prompt_id = submit_graph_and_get_result(host, graph, long_op=long_op)
+    res, prompt_id = submit_graph_and_get_result(host, graph, long_op=long_op, preview=preview)
     debug(f'result {prompt_id}:', res)
     return res, prompt_id, upload_nodes, outputs
 
 
-def compute_compound_graph_node(node, long_op=None, override_output_node=None, override_result_loader_nodes=None):
-    host = node.evalParm('base_url').rstrip('/ ')
-    
-    do_cleanup = node.parm('cleanup_server_images').eval()
+def _result_local_path(outpath: Path, batch_i: int|None, ext: str) -> Path:
+    if batch_i is None:
+        return outpath
+    # we rely on batch id being last \.\d+\. in the filename
+    base_name, _, _ = outpath.name.rsplit('.', 2)
+    return outpath.with_name('.'.join((base_name, str(batch_i), ext)))
 
-    if override_output_node:
-        output_node = override_output_node
-    else:
-        output_node = node.node('graph').node('outputs')
-        if output_node is None:
-            raise RuntimeError('not node "outputs" found in the graph')
-    res, prompt_id, upload_nodes, outputs = submit_compound_graph(host, output_node, long_op=long_op)
-    
-    # get result
-    for i in range(len(override_result_loader_nodes) if override_result_loader_nodes else 2):
+
+def _cleanup_submission_one_by_one(host: str, input_files: list[tuple[str, str]], prompt_id: str, *, long_op=None):
+    for i, (upload_filename, upload_subdir) in enumerate(input_files):
         if long_op:
-            long_op.updateLongProgress(-1, "Downloading result...")
-        outnode = override_result_loader_nodes[i] if override_result_loader_nodes else node.node(f'result{i+1}')
-        outpath = Path(outnode.evalParm('filename'))
+            long_op.updateLongProgress(-1, "Cleaning up temporary images")
+            long_op.updateProgress(i / len(input_files))
+
+        try:
+            delete_input_image(
+                host,
+                upload_filename,
+                upload_subdir,
+            )
+        except FailedToDeleteImage as e:
+            # we don't fail on cleanup error
+            print(f'[WARNING] server failed to remove input: {e}')
+        except FunctionalityNotAvailable:
+            print('[WARNING] failed to remove temp input image from comfyui: server does not support deletion')
+
+    if long_op:
+        long_op.updateLongProgress(-1, "Cleaning up prompt history")
+    delete_prompt_history(host, prompt_id)
+
+
+def _cleanup_input_files(upload_nodes: dict[GraphPorcessingInputKey, tuple[hou.Node, UploadInfo]]) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+    """
+    (filename, subdir) of inputs that should be removed from the server after submission,
+    and of content-addressed inputs, that may be used by other submissions
+    """
+    input_files = []
+    shared_input_files = []
+    for _, upload_data in upload_nodes.values():
+        if '/' in upload_data.filename:  # not os.path.split cuz it's not os-specific
+            upload_subdir, upload_filename = upload_data.filename.rsplit('/', 1)
+        else:
+            upload_subdir = ''
+            upload_filename = upload_data.filename
+        # content-addressed inputs are reused by later submissions, so we keep them,
+        #  server removes them once they are not used for a while
+        (shared_input_files if upload_data.content_addressed else input_files).append((upload_filename, upload_subdir))
+    return input_files, shared_input_files
+
+
+def _cleanup_submission(host: str, input_files: tuple[list[tuple[str, str]], list[tuple[str, str]]], prompt_id: str, *, long_op=None):
+    """
+    input_files are as returned by _cleanup_input_files
+    """
+    input_files, shared_input_files = input_files
+    if long_op:
+        long_op.updateLongProgress(-1, "Cleaning up temporary images and prompt history")
+    try:
+        with tracing.span('cleanup', inputs=len(input_files), shared_inputs=len(shared_input_files)):
+            statuses = cleanup_submission(host, inputs=input_files, prompt_ids=[prompt_id], shared_inputs=shared_input_files)
+    except FunctionalityNotAvailable:
+        # older server extension, delete one by one
+        with tracing.span('cleanup one by one', inputs=len(input_files)):
+            _cleanup_submission_one_by_one(host, input_files, prompt_id, long_op=long_op)
+        # shared inputs may be in use by prompts still queued (like next frames), so they cannot be deleted here
+        if shared_input_files:
+            print('[WARNING] server does not remove unused content-addressed inputs, update houdini-connection extension')
+    else:
+        for (upload_filename, upload_subdir), status in zip(input_files, statuses['inputs']):
+            if status != 'ok':
+                # we don't fail on cleanup error
+                print(f'[WARNING] server failed to remove input: {upload_subdir}/{upload_filename}: {status}')
+        if shared_input_files and 'shared_inputs' not in statuses:
+            print('[WARNING] server does not remove unused content-addressed inputs, update houdini-connection extension')
+        elif collected := statuses.get('collected_shared_inputs'):
+            debug(f'server removed {collected} unused content-addressed inputs')
+    #  comfy backend cache does not check image existance, and there is no clear stable way of cleaning cache,
+    #  so we have to leave output images as is for now
+
+
+def _restore_cached_results(cached_files: list[result_cache.CachedFile], loader_paths: list[Path]) -> dict[int, str]:
+    """
+    copy cached files to where result loaders expect them
+    returns indices of loaders that got files, mapped to extension of those files
+    """
+    restored = {}
+    for cached_file in cached_files:
+        local_path = _result_local_path(loader_paths[cached_file.loader_index], cached_file.batch_index, cached_file.ext)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(cached_file.path, local_path)
+        restored[cached_file.loader_index] = cached_file.ext
+    return restored
+
+
+def _reload_result_loader(loader: hou.Node, ext: str|None):
+    """
+    loaders pick file extension from this cached user data (see helper_result_get_ext),
+    since results may come as png or exr - it's set before reloading
+    """
+    if ext:
+        loader.setCachedUserData('comfyui_wrapper_downloaded_ext', ext)
+    loader.parm('reload').pressButton()
+
+
+def _preview_stream(node: hou.Node) -> PreviewStream|None:
+    if node.parm('stream_previews') is None or not node.evalParm('stream_previews'):  # older asset versions do not stream
+        return None
+    if (preview_loader := node.node('preview')) is None:
+        return None
+    return PreviewStream(preview_loader)
+
+
+def _result_precision(node: hou.Node) -> str:
+    if node.parm('result_precision') is None:  # older asset versions
+        return 'png'
+    return node.evalParm('result_precision')
+
+
+def _collect_result_downloads(res: dict, outputs: list[str|None], loader_paths: list[Path], is_batched: bool) -> tuple[list[tuple[str, str, Path]], list[int], list[tuple[int, int|None, str, Path]]]:
+    """
+    returns downloads (filename, subfolder, local path), loader index of each download,
+    and what to store in the result cache
+    """
+    downloads: list[tuple[str, str, Path]] = []
+    download_to_loader: list[int] = []
+    downloads_to_cache: list[tuple[int, int|None, str, Path]] = []
+    for i, outpath in enumerate(loader_paths):
         key = outputs[i]
         if key is None:  # not connected
             continue
@@ -692,48 +1069,290 @@ def compute_compound_graph_node(node, long_op=None, override_output_node=None, o
         if key not in res:
             raise ResultNotFound(key, res)
         
-        if node.parm('image_batch_index') is None:
+        if not is_batched:
             # 1.2 compatibility
-            download_result(host, res[key]['images'][0]['filename'], res[key]['images'][0]['subfolder'], outpath)
+            downloads.append((res[key]['images'][0]['filename'], res[key]['images'][0]['subfolder'], outpath))
+            download_to_loader.append(i)
+            downloads_to_cache.append((i, None, outpath.suffix.lstrip('.'), outpath))
         else:
-            for i, data in enumerate(res[key].get('images', res[key].get('3d', ()))):
-                # we rely on batch id being last \.\d+\. in the filename
-                base_name, _, _ = outpath.name.rsplit('.', 2)
+            for batch_i, data in enumerate(res[key].get('images', res[key].get('3d', ()))):
                 incoming_ext = data['filename'].rsplit('.', 1)[1] if '.' in data['filename'] else ''
-                local_path = outpath.with_name('.'.join((base_name, str(i), incoming_ext)))
-                debug(f'removing {local_path}')
-                local_path.unlink(missing_ok=True)  # remove existing before downloading new file
-                debug(f'downloading image {i} of batch: {local_path}')
-                download_result(host, data['filename'], data['subfolder'], local_path)
-        outnode.parm('reload').pressButton()
+                local_path = _result_local_path(outpath, batch_i, incoming_ext)
+                debug(f'downloading image {batch_i} of batch: {local_path}')
+                downloads.append((data['filename'], data['subfolder'], local_path))
+                download_to_loader.append(i)
+                downloads_to_cache.append((i, batch_i, incoming_ext, local_path))
+    return downloads, download_to_loader, downloads_to_cache
+
+
+def _store_in_result_cache(cache_key: str, downloads_to_cache: list[tuple[int, int|None, str, Path]]):
+    try:
+        result_cache.store(cache_key, downloads_to_cache)
+    except OSError as e:
+        # failing to cache is not a reason to fail the whole thing
+        print(f'[WARNING] failed to store result in cache: {e}')
+
+
+def compute_compound_graph_node(node, long_op=None, override_output_node=None, override_result_loader_nodes=None):
+    # base_url may be a pool of servers, whole computation goes to one of them
+    with tracing.span('compute', node=node.path()) as compute_span, dispatch(node.evalParm('base_url')) as host:
+        compute_span.set(host=host)
+        return _compute_compound_graph_node_on_host(node, host, long_op, override_output_node, override_result_loader_nodes)
+
+
+def _compute_compound_graph_node_on_host(node, host: str, long_op=None, override_output_node=None, override_result_loader_nodes=None):
+    do_cleanup = node.parm('cleanup_server_images').eval()
+
+    if override_output_node:
+        output_node = override_output_node
+    else:
+        output_node = node.node('graph').node('outputs')
+        if output_node is None:
+            raise RuntimeError('not node "outputs" found in the graph')
+    result_loaders = [
+        override_result_loader_nodes[i] if override_result_loader_nodes else node.node(f'result{i+1}')
+        for i in range(len(override_result_loader_nodes) if override_result_loader_nodes else 2)
+    ]
+    loader_paths = [Path(outnode.evalParm('filename')) for outnode in result_loaders]
+    is_batched = node.parm('image_batch_index') is not None
+
+    use_result_cache = node.parm('use_result_cache') is not None and node.evalParm('use_result_cache')
+    cache_key = None
+
+    def _result_cache_lookup(graph: dict, outputs: list[str]):
+        nonlocal cache_key
+        cache_key = result_cache.make_key(graph, outputs)
+        return result_cache.lookup(cache_key)
+
+    res, prompt_id, upload_nodes, outputs = submit_compound_graph(
+        host,
+        output_node,
+        long_op=long_op,
+        result_cache_lookup=_result_cache_lookup if use_result_cache else None,
+        result_precision=_result_precision(node),
+        preview=_preview_stream(node),
+    )
+
+    if prompt_id is None:  # result cache hit
+        with tracing.span('restore cached results', files=len(res)):
+            for loader_i, ext in sorted(_restore_cached_results(res, loader_paths).items()):
+                _reload_result_loader(result_loaders[loader_i], ext)
+        return
+    
+    # get result
+    downloads, download_to_loader, downloads_to_cache = _collect_result_downloads(res, outputs, loader_paths, is_batched)
+
+    # loaders are reloaded only when all of their files are in place
+    loader_files_left: dict[int, int] = {}
+    for loader_i in download_to_loader:
+        loader_files_left[loader_i] = loader_files_left.get(loader_i, 0) + 1
+
+    def _on_downloaded(download_i: int):
+        loader_i = download_to_loader[download_i]
+        loader_files_left[loader_i] -= 1
+        if loader_files_left[loader_i] == 0:
+            _reload_result_loader(result_loaders[loader_i], downloads_to_cache[download_i][2])
+
+    with tracing.span('download results', files=len(downloads)):
+        download_results(host, downloads, long_op=long_op, on_downloaded=_on_downloaded)
+
+    if cache_key is not None:
+        _store_in_result_cache(cache_key, downloads_to_cache)
 
     if do_cleanup:
-        image_infos = [x[1] for x in upload_nodes.values()]
-        for i, upload_data in enumerate(image_infos):
-            if long_op:
-                long_op.updateLongProgress(-1, "Cleaning up temporary images")
-                long_op.updateProgress(i / len(image_infos))
+        _cleanup_submission(host, _cleanup_input_files(upload_nodes), prompt_id, long_op=long_op)
 
-            try:
-                if '/' in upload_data.filename:  # not os.path.split cuz it's not os-specific
-                    upload_subdir, upload_filename = upload_data.filename.rsplit('/', 1)
-                else:
-                    upload_subdir = ''
-                    upload_filename = upload_data.filename
-                delete_input_image(
-                    host,
-                    upload_filename,
-                    upload_subdir,
-                )
-            except FailedToDeleteImage as e:
-                # we don't fail on cleanup error
-                print(f'[WARNING] server failed to remove input: {e}')
-            except FunctionalityNotAvailable:
-                print('[WARNING] failed to remove temp input image from comfyui: server does not support deletion')
 
-        if long_op:
-            long_op.updateLongProgress(-1, "Cleaning up prompt history")
-        delete_prompt_history(host, prompt_id)
-        #  comfy backend cache does not check image existance, and there is no clear stable way of cleaning cache,
-        #  so we have to leave output images as is for now
+@dataclass
+class _QueuedFrame:
+    frame: float
+    host: str  # acquired from host pool, released once frame is fully done
+    tracker: PromptTracker|None
+    prompt_id: str
+    result_future: Future
+    outputs: list[str|None]
+    loader_paths: list[Path]
+    cache_key: str|None
+    cleanup_inputs: tuple[list[tuple[str, str]], list[tuple[str, str]]]|None  # as returned by _cleanup_input_files, None if no cleanup needed
+
+
+def _finish_frame(job: _QueuedFrame, downloads: list[tuple[str, str, Path]], downloads_to_cache: list[tuple[int, int|None, str, Path]]):
+    """
+    runs in a worker thread, so no hou here
+    """
+    with tracing.span('download results', frame=job.frame, host=job.host, files=len(downloads)):
+        download_results(job.host, downloads)
+    if job.cache_key is not None:
+        _store_in_result_cache(job.cache_key, downloads_to_cache)
+    if job.cleanup_inputs is not None:
+        _cleanup_submission(job.host, job.cleanup_inputs, job.prompt_id)
 
+
+def compute_compound_graph_node_frame_range(node, frames: list[int|float], long_op=None, *, max_queued_prompts: int = 2):
+    """
+    compute the graph for every given frame
+
+    each frame is dispatched to a host of the pool separately.
+    up to max_queued_prompts frames per host are kept queued on the servers,
+    so while one frame is being computed - the next one is cooked and uploaded,
+    and results of the previous one are downloaded
+    """
+    with tracing.span('compute frame range', node=node.path(), frames=len(frames)):
+        return _compute_compound_graph_node_frame_range(node, frames, long_op, max(1, max_queued_prompts))
+
+
+def _compute_compound_graph_node_frame_range(node, frames: list[int|float], long_op, max_queued_prompts: int):
+    if not frames:
+        return
+    base_url = node.evalParm('base_url')
+    # back-pressure is global, but hosts are picked by load, so it comes to about max_queued_prompts per host
+    max_in_flight = max_queued_prompts * max(1, len(parse_hosts(base_url)))
+    do_cleanup = node.parm('cleanup_server_images').eval()
+    output_node = node.node('graph').node('outputs')
+    if output_node is None:
+        raise RuntimeError('not node "outputs" found in the graph')
+    result_loaders = [node.node(f'result{i+1}') for i in range(2)]
+    is_batched = node.parm('image_batch_index') is not None
+    use_result_cache = node.parm('use_result_cache') is not None and node.evalParm('use_result_cache')
+    result_precision = _result_precision(node)
+    loader_exts: dict[int, str] = {}  # extension of last files each loader got
+
+    # every frame needs it's own result files
+    frame_loader_paths = [
+        [Path(outnode.parm('filename').evalAtFrame(frame)) for outnode in result_loaders]
+        for frame in frames
+    ]
+    if len({tuple(x) for x in frame_loader_paths}) < len(frames):
+        raise RuntimeError('result file names do not change with frame, add $F to the File Suffix parameter')
+
+    in_flight: deque[_QueuedFrame] = deque()
+    finishing: deque[tuple[Future, _QueuedFrame]] = deque()  # downloads and cleanups of finished frames
+    executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='comfyui-frame-finish')
+    orig_frame = hou.frame()
+    frames_done = 0
+
+    def _progress(message: str):
+        if long_op:
+            # oldest queued frame is likely the one running, count how far it got
+            done = frames_done
+            if in_flight and in_flight[0].tracker is not None and (progress := in_flight[0].tracker.progress(in_flight[0].prompt_id)) is not None:
+                done += progress.fraction() or 0.0
+            long_op.updateLongProgress(done / len(frames), message)
+
+    def _wait_future(future: Future, message: str):
+        while not future.done():
+            _progress(message)
+            wait([future], timeout=ws_wait_interval)
+        return future.result()
+
+    def _wait_finishing(message: str):
+        future, job = finishing.popleft()
+        try:
+            _wait_future(future, message)
+        finally:
+            release_host(job.host)
+
+    def _finish_ready(block: bool):
+        """
+        pass on finished prompts to download, if block - wait for at least the oldest one
+        """
+        nonlocal frames_done
+        # frames may finish out of order on different hosts
+        while in_flight:
+            job = next((x for x in in_flight if x.result_future.done()), None)
+            if job is None:
+                if not block:
+                    break
+                job = in_flight[0]
+            block = False
+            res = _wait_future(job.result_future, f'waiting for frame {job.frame:g} ({frames_done}/{len(frames)} done)')
+            downloads, download_to_loader, downloads_to_cache = _collect_result_downloads(res, job.outputs, job.loader_paths, is_batched)
+            for loader_i, (_, _, ext, _) in zip(download_to_loader, downloads_to_cache):
+                loader_exts[loader_i] = ext
+            # do not let downloads pile up either
+            while len(finishing) >= max_in_flight:
+                _wait_finishing('downloading results')
+            in_flight.remove(job)
+            finishing.append((executor.submit(tracing.bind(_finish_frame), job, downloads, downloads_to_cache), job))
+            frames_done += 1
+        while finishing and finishing[0][0].done():
+            _wait_finishing('downloading results')
+
+    try:
+        for frame, loader_paths in zip(frames, frame_loader_paths):
+            # back-pressure: no more than max_in_flight prompts on the servers at a time
+            _finish_ready(block=len(in_flight) >= max_in_flight)
+
+            _progress(f'preparing frame {frame:g}')
+            hou.setFrame(frame)
+            cache_key = None
+
+            def _result_cache_lookup(graph: dict, outputs: list[str]):
+                nonlocal cache_key
+                cache_key = result_cache.make_key(graph, outputs)
+                return result_cache.lookup(cache_key)
+
+            # host stays acquired till frame's results are downloaded and it's cleaned up
+            host = acquire_host(base_url)
+            try:
+                with tracing.span('prepare graph', frame=frame, host=host), dispatched_to(base_url, host):
+                    graph, upload_nodes, outputs, cached = prepare_compound_graph(
+                        host,
+                        output_node,
+                        long_op=long_op,
+                        result_cache_lookup=_result_cache_lookup if use_result_cache else None,
+                        result_precision=result_precision,
+                    )
+                if cached is not None:
+                    loader_exts.update(_restore_cached_results(cached, loader_paths))
+                    frames_done += 1
+                    release_host(host)
+                    continue
+
+                tracker = get_prompt_tracker(host)
+                connection_epoch = tracker.connection_epoch if tracker else -1
+                with tracing.span('submit prompt', frame=frame, host=host, nodes=len(graph)) as submit_span:
+                    prompt_id, errors = submit_graph(host, graph, client_id=tracker.client_id if tracker else None)
+                    submit_span.set(prompt_id=prompt_id)
+                if errors:
+                    raise RuntimeError(f'some nodes have errors: {errors}')
+            except BaseException:
+                release_host(host)
+                raise
+            if tracker is not None:
+                tracker.track_progress(prompt_id, graph)
+            in_flight.append(_QueuedFrame(
+                frame,
+                host,
+                tracker,
+                prompt_id,
+                run_async(wait_for_prompt_result_async(host, prompt_id, tracker, connection_epoch)),
+                outputs,
+                loader_paths,
+                cache_key,
+                _cleanup_input_files(upload_nodes) if do_cleanup else None,
+            ))
+
+        while in_flight:
+            _finish_ready(block=True)
+        while finishing:
+            _wait_finishing('downloading results')
+    except BaseException:
+        # do not leave the rest of the range computing on the servers
+        for job in in_flight:
+            job.result_future.cancel()
+            try:
+                cancel_prompt(job.host, job.prompt_id)
+            except Exception as e:
+                print(f'[WARNING] failed to cancel prompt {job.prompt_id}: {e}')
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        for job in in_flight:
+            release_host(job.host)
+        for _, job in finishing:
+            release_host(job.host)
+        hou.setFrame(orig_frame)
+
+    for loader_i, outnode in enumerate(result_loaders):
+        _reload_result_loader(outnode, loader_exts.get(loader_i))
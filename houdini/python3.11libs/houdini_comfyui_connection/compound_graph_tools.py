@@ -1,13 +1,26 @@
 from collections import OrderedDict
 from dataclasses import dataclass
+import asyncio
 import os
+import re
+import traceback
+from concurrent.futures import Future
 from typing import Any, Optional
 import hou  # type:ignore
 import coptoolutils  # type:ignore
-import requests
 import json
 from itertools import chain
+from .http_client import get_client
+from .async_client import run_async, add_main_thread_callback
+from .node_definition_store import store_definition, load_definition, remove_unreferenced as remove_unreferenced_definitions
+from .object_info_cache import get_object_info
 from .compound_graph_core import get_output_index_from_input, CompoundGraphSource
+from .ui_tools import show_error
+
+try:
+    import hdefereval  # only available in graphical houdini session
+except ImportError:
+    hdefereval = None
 
 
 # it seeems that houdini treats ints in parms as floats?
@@ -18,6 +31,8 @@ from .compound_graph_core import get_output_index_from_input, CompoundGraphSourc
 hou_parm_template_maxint = pow(2, 31) - 1
 hou_parm_template_minint = -pow(2, 31)
 
+tools_per_step = 50  # shelf tools created per UI event loop step when updating in background
+
 
 class MissingNodeDefinitionError(RuntimeError):
     def __init__(self, node_type: str, *, pack_name: str|None = None, node_id: str|None = None):
@@ -314,16 +329,14 @@ def _extra_input_proc(graph_node, i, input_type):
 
 
 def get_node_definitions(host: str) -> dict:
-    resp = requests.get(f'{host}/object_info')
-
-    if resp.status_code != 200:
-        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
-
-    return resp.json()
+    """
+    returned dict is cached and shared, do not modify it
+    """
+    return get_object_info(host)
 
 
 def get_single_node_definition(host: str, node_type: str) -> dict:
-    resp = requests.get(f'{host}/object_info/{node_type}')
+    resp = get_client(host).get(f'/object_info/{node_type}')
 
     if resp.status_code != 200:
         raise RuntimeError(f'oh no, server said nono {resp.status_code}')
@@ -341,57 +354,217 @@ def find_nearest_compound_graph_parent(node: hou.Node) -> hou.Node|None:
     return node
 
 
-def update_comfy_nodes_definitions(host: str, long_op=None, *, 
-        tool_name_prefix='xxx::Cop/comfyui_compound_graph_submit::1.2::',
-        network_op_type='xxx::Cop/comfyui_compound_graph_submit::1.2::xxx::Cop/comfyui_partial_graph::1.2',
-        network_output_op_type='xxx::Cop/comfyui_compound_graph_submit::1.2::xxx::Cop/comfyui_partial_graph_outputs::1.0',
-        explicit_node_types: list[str]|None = None,
-    ):
+def create_tool_from_stored_definition(graph: hou.Node, definition_id: str, interactive_kwargs=None):
+    """
+    what generated shelf tools call
+    """
+    create_single_tool(graph, load_definition(definition_id), interactive_kwargs=interactive_kwargs)
+
+
+@dataclass
+class _ToolData:
+    name: str
+    label: str
+    script: str
+    network_op_type: str
+    location: str
+
+
+_tool_definition_id_re = re.compile(r'create_tool_from_stored_definition\(.*?\b([0-9a-f]{64})\b')
+
+
+def _shelf_filepath() -> str:
+    return os.path.join(hou.text.expandString('$HOUDINI_USER_PREF_DIR'), 'toolbar', 'comfyui_crap.shelf')
+
+
+def _fetch_and_store_node_definitions(host: str, explicit_node_types: list[str]|None) -> tuple[dict[str, dict], dict[str, str]]:
+    """
+    returns node definitions and their ids in the definition store
+    does not touch hou, so may run in a worker thread
+    """
     if explicit_node_types is None:  # get all definitions
         node_definitions = get_node_definitions(host)
     else:
         node_definitions = {x: get_single_node_definition(host, x) for x in explicit_node_types}
-    definitions_count = len(node_definitions)
+    definition_ids = {node_type_name: store_definition(node_type) for node_type_name, node_type in node_definitions.items()}
+    return node_definitions, definition_ids
 
-    shelf_filepath = os.path.join(hou.text.expandString('$HOUDINI_USER_PREF_DIR'), 'toolbar', 'comfyui_crap.shelf')
 
-    try:
-        hou.shelves.beginChangeBlock()
-        for def_i, (node_type_name, node_type) in enumerate(node_definitions.items()):
-            if long_op:
-                long_op.updateLongProgress(def_i / definitions_count, f"generating {node_type_name}")
-            
-            op_type = network_op_type
-            if node_type.get('output_node', False) and len(node_type['output']) == 0:
-                # output nodes that are just output nodes with nothing to pass to other nodes
-                #  allow them only inside special subgraph
-                op_type = network_output_op_type
-
-            tool_code = (
-                'from houdini_comfyui_connection.compound_graph_tools import create_single_tool\n'
-                f'node_type_data = {repr(node_type)}\n'
-                'pane = kwargs["pane"]\n'
-                'create_single_tool(pane.pwd(), node_type_data, interactive_kwargs=kwargs)\n'
-            )
+def _plan_tool_changes(node_definitions: dict[str, dict], definition_ids: dict[str, str], *,
+        tool_name_prefix: str,
+        network_op_type: str,
+        network_output_op_type: str,
+        remove_stale: bool,
+    ) -> tuple[list[_ToolData], list[str]]:
+    """
+    returns tools that need to be (re)created and names of tools to remove
+    tools already referencing the same definition are left alone
+    """
+    existing_tools = hou.shelves.tools()
+    tools = []
+    tool_names = set()
+    for node_type_name, node_type in node_definitions.items():
+        op_type = network_op_type
+        if node_type.get('output_node', False) and len(node_type['output']) == 0:
+            # output nodes that are just output nodes with nothing to pass to other nodes
+            #  allow them only inside special subgraph
+            op_type = network_output_op_type
+
+        tool_code = (
+            'from houdini_comfyui_connection.compound_graph_tools import create_tool_from_stored_definition\n'
+            'pane = kwargs["pane"]\n'
+            f'create_tool_from_stored_definition(pane.pwd(), {repr(definition_ids[node_type_name])}, interactive_kwargs=kwargs)\n'
+        )
 
-            tool_name = tool_name_prefix + hou.text.alphaNumeric(node_type_name)
+        tool_name = tool_name_prefix + hou.text.alphaNumeric(node_type_name)
+        tool_names.add(tool_name)
+        label = node_type.get('display_name') or hou.text.alphaNumeric(node_type_name)
 
+        if (existing_tool := existing_tools.get(tool_name)) \
+                and existing_tool.script() == tool_code \
+                and existing_tool.label() == label:
+            continue
+
+        category = node_type.get('category', '')
+        tools.append(_ToolData(
+            tool_name,
+            label,
+            tool_code,
+            op_type,
+            'ComfyUI/Compound Graph Nodes' + (f'/{category}' if category else ''),
+        ))
+
+    removed_names = []
+    if remove_stale:
+        removed_names = [x for x in existing_tools if x.startswith(tool_name_prefix) and x not in tool_names]
+    return tools, removed_names
+
+
+def _apply_tool_changes(tools: list[_ToolData], removed_names: list[str], long_op=None):
+    shelf_filepath = _shelf_filepath()
+    try:
+        hou.shelves.beginChangeBlock()
+        for tool_name in removed_names:
             if existing_tool := hou.shelves.tool(tool_name):
                 existing_tool.destroy()
+        for tool_i, tool in enumerate(tools):
+            if long_op:
+                long_op.updateLongProgress(tool_i / len(tools), f'generating {tool.label}')
+            if existing_tool := hou.shelves.tool(tool.name):
+                existing_tool.destroy()
 
-            category = node_type.get('category', '')
             hou.shelves.newTool(
                 file_path=shelf_filepath,
-                name=tool_name,
-                label=node_type.get('display_name') or hou.text.alphaNumeric(node_type_name),
-                script=tool_code,
-                network_op_type=op_type,
-                locations=('ComfyUI/Compound Graph Nodes' + (f'/{category}' if category else ''),),
+                name=tool.name,
+                label=tool.label,
+                script=tool.script,
+                network_op_type=tool.network_op_type,
+                locations=(tool.location,),
             )
     finally:
         hou.shelves.endChangeBlock()
 
 
+def _remove_unreferenced_definitions():
+    referenced_ids = set()
+    for tool in hou.shelves.tools().values():
+        if match := _tool_definition_id_re.search(tool.script()):
+            referenced_ids.add(match.group(1))
+    remove_unreferenced_definitions(referenced_ids)
+
+
+def update_comfy_nodes_definitions(host: str, long_op=None, *, 
+        tool_name_prefix='xxx::Cop/comfyui_compound_graph_submit::1.2::',
+        network_op_type='xxx::Cop/comfyui_compound_graph_submit::1.2::xxx::Cop/comfyui_partial_graph::1.2',
+        network_output_op_type='xxx::Cop/comfyui_compound_graph_submit::1.2::xxx::Cop/comfyui_partial_graph_outputs::1.0',
+        explicit_node_types: list[str]|None = None,
+    ):
+    """
+    only tools of node types with changed definitions are regenerated,
+    when updating all definitions - tools of node types server does not have any more are removed
+    """
+    if long_op:
+        long_op.updateLongProgress(0, 'fetching node definitions')
+    node_definitions, definition_ids = _fetch_and_store_node_definitions(host, explicit_node_types)
+    tools, removed_names = _plan_tool_changes(
+        node_definitions,
+        definition_ids,
+        tool_name_prefix=tool_name_prefix,
+        network_op_type=network_op_type,
+        network_output_op_type=network_output_op_type,
+        remove_stale=explicit_node_types is None,
+    )
+
+    _apply_tool_changes(tools, removed_names, long_op)
+
+    if explicit_node_types is None:
+        _remove_unreferenced_definitions()
+
+
+def update_comfy_nodes_definitions_in_background(host: str, *,
+        tool_name_prefix='xxx::Cop/comfyui_compound_graph_submit::1.2::',
+        network_op_type='xxx::Cop/comfyui_compound_graph_submit::1.2::xxx::Cop/comfyui_partial_graph::1.2',
+        network_output_op_type='xxx::Cop/comfyui_compound_graph_submit::1.2::xxx::Cop/comfyui_partial_graph_outputs::1.0',
+        explicit_node_types: list[str]|None = None,
+    ):
+    """
+    same as update_comfy_nodes_definitions, but without blocking the UI:
+    definitions are fetched in a worker thread, and tools are updated in small steps between UI events,
+    progress is shown in the status bar
+    """
+    if hdefereval is None:
+        update_comfy_nodes_definitions(
+            host,
+            tool_name_prefix=tool_name_prefix,
+            network_op_type=network_op_type,
+            network_output_op_type=network_output_op_type,
+            explicit_node_types=explicit_node_types,
+        )
+        return
+
+    remove_stale = explicit_node_types is None
+
+    def _on_error(e: Exception):
+        hou.ui.setStatusMessage('')
+        show_error(f'failed to update node definitions: {e}', details=''.join(traceback.format_exception(e)))
+
+    def _apply_step(tools: list[_ToolData], step: int):
+        try:
+            _apply_tool_changes(tools[step:step+tools_per_step], [])
+            step += tools_per_step
+            if step < len(tools):
+                hou.ui.setStatusMessage(f'updating ComfyUI node tools: {step}/{len(tools)}')
+                hdefereval.executeDeferred(_apply_step, tools, step)
+                return
+            if remove_stale:
+                _remove_unreferenced_definitions()
+        except Exception as e:
+            _on_error(e)
+            return
+        hou.ui.setStatusMessage(f'ComfyUI node tools updated: {len(tools)} changed')
+
+    def _on_fetched(future: Future):
+        try:
+            node_definitions, definition_ids = future.result()
+            tools, removed_names = _plan_tool_changes(
+                node_definitions,
+                definition_ids,
+                tool_name_prefix=tool_name_prefix,
+                network_op_type=network_op_type,
+                network_output_op_type=network_output_op_type,
+                remove_stale=remove_stale,
+            )
+            _apply_tool_changes([], removed_names)
+        except Exception as e:
+            _on_error(e)
+            return
+        _apply_step(tools, 0)
+
+    hou.ui.setStatusMessage('fetching ComfyUI node definitions...')
+    future = run_async(asyncio.to_thread(_fetch_and_store_node_definitions, host, explicit_node_types))
+    add_main_thread_callback(future, _on_fetched)
+
+
 def is_subgraph_wrapper(node) -> bool:
     return node.type().name() == 'subnet' and not is_subnet_wrapper(node)
 
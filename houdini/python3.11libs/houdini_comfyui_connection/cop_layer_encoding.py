@@ -0,0 +1,128 @@
+"""
+encode cooked COP layers to png or raw .npy in memory
+
+rendering a ROP to a temp file and reading it back is a disk round-trip for every input,
+while layer pixels are already there in memory after the cook.
+This only covers what can be done without OCIO, so raw (not cc-baked) png inputs at current frame
+(and raw .npy inputs at any frame), everything else still has to go through the ROP.
+tools/check_cop_encoding.py checks the encoders against reference decoders
+"""
+import io
+import struct
+import zlib
+from contextlib import contextmanager
+import numpy
+import hou  # type:ignore
+
+
+png_compression_level = 1  # inputs are uploaded once and thrown away, so faster encoding beats smaller files
+
+
+class LayerNotEncodable(RuntimeError):
+    pass
+
+
+_png_color_types = {
+    1: 0,  # grayscale
+    3: 2,  # rgb
+    4: 6,  # rgba
+}
+
+
+def read_layer_pixels(cop_node: hou.CopNode, output_index: int = 0) -> numpy.ndarray:
+    """
+    returns float32 array of shape (height, width, channels), top row first
+    """
+    layer = cop_node.layer(output_index)
+    if layer is None:
+        raise LayerNotEncodable(f'{cop_node.path()} has no layer at output {output_index}')
+
+    width, height = layer.bufferResolution()
+    channels = layer.channelCount()
+    if channels not in _png_color_types:
+        raise LayerNotEncodable(f'cannot encode layer with {channels} channels')
+
+    storage = layer.storageType()
+    if storage == hou.imageLayerStorageType.Float32:
+        dtype = numpy.float32
+    elif storage == hou.imageLayerStorageType.Float16:
+        dtype = numpy.float16
+    else:
+        raise LayerNotEncodable(f'cannot encode layer with storage type {storage}')
+
+    pixels = numpy.frombuffer(layer.allBufferElements(), dtype=dtype)
+    if pixels.size != width * height * channels:
+        raise LayerNotEncodable(f'unexpected buffer size {pixels.size} for {width}x{height}x{channels} layer')
+    # layer buffers start from the bottom row
+    return pixels.reshape(height, width, channels)[::-1].astype(numpy.float32)
+
+
+def encode_png(pixels: numpy.ndarray) -> bytes:
+    """
+    8 bit png from float (height, width, channels) array, values are clamped to 0-1
+    """
+    height, width, channels = pixels.shape
+    data = (numpy.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(numpy.uint8)
+    # every png row starts with filter type byte, 0 for no filter
+    rows = numpy.zeros((height, 1 + width * channels), dtype=numpy.uint8)
+    rows[:, 1:] = data.reshape(height, width * channels)
+
+    def _chunk(chunk_type: bytes, chunk_data: bytes) -> bytes:
+        return struct.pack('>I', len(chunk_data)) + chunk_type + chunk_data + struct.pack('>I', zlib.crc32(chunk_type + chunk_data))
+
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, _png_color_types[channels], 0, 0, 0)),
+        _chunk(b'IDAT', zlib.compress(rows.tobytes(), png_compression_level)),
+        _chunk(b'IEND', b''),
+    ))
+
+
+def encode_npy(pixels: numpy.ndarray) -> bytes:
+    """
+    raw float32 (height, width, channels) array, no conversion or clamping
+    """
+    buffer = io.BytesIO()
+    numpy.save(buffer, numpy.ascontiguousarray(pixels, dtype=numpy.float32), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def encode_cop_input_png(node: hou.Node, input_index: int = 0) -> bytes:
+    """
+    encode whatever is connected to node's input at current frame
+    """
+    return encode_png(_read_input_pixels(node, input_index))
+
+
+def encode_cop_input_npy(node: hou.Node, input_index: int = 0, frame: int|float|None = None) -> bytes:
+    """
+    raw pixels of whatever is connected to node's input, at given frame or at current one
+    """
+    with _at_frame(frame):
+        return encode_npy(_read_input_pixels(node, input_index))
+
+
+@contextmanager
+def _at_frame(frame: int|float|None):
+    prev_frame = hou.frame()
+    if frame is None or frame == prev_frame:
+        yield
+        return
+    hou.setFrame(frame)
+    try:
+        yield
+    finally:
+        hou.setFrame(prev_frame)
+
+
+def _read_input_pixels(node: hou.Node, input_index: int) -> numpy.ndarray:
+    connections = [x for x in node.inputConnections() if x.inputIndex() == input_index]
+    if not connections:
+        raise LayerNotEncodable(f'nothing is connected to input {input_index} of {node.path()}')
+    connection = connections[0]
+    source = connection.inputNode()
+    if source is None:
+        raise LayerNotEncodable(f'nothing is connected to input {input_index} of {node.path()}')
+    if not isinstance(source, hou.CopNode):
+        raise LayerNotEncodable(f'{source.path()} is not a cop node')
+    return read_layer_pixels(source, connection.outputIndex())
@@ -1,10 +1,25 @@
-import requests
+import os
 import json
 from pathlib import Path
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable
+import requests
 import hou
+from .http_client import get_client
+from .prompt_tracking import PromptTracker, get_prompt_tracker
+from .preview_streaming import PreviewStream
+from .prompt_progress import log_stage_timings
+from . import tracing
 
 poll_interval = 1
+ws_wait_interval = 0.1  # how often we wake up to let houdini process interrupts while waiting for ws events
+safety_poll_interval = 30  # even with ws connected, check prompt state once in a while in case an event was lost
+queue_poll_interval = 2  # how often queue position is checked while prompt waits in the queue
+download_chunk_size = 1 << 16
+download_attempts = 5
+download_retry_delay = 0.5
+max_parallel_downloads = 8
 
 
 class BadInputSubstituteError(RuntimeError):
@@ -73,12 +88,15 @@ class ResultNotFound(RuntimeError):
         self.res = res
 
 
-def submit_graph(host: str, graph_json_data: dict):
-    resp = requests.post(
-        f'{host}/prompt',
-        json = {
-            'prompt': graph_json_data,
-        },
+def submit_graph(host: str, graph_json_data: dict, client_id: str|None = None):
+    payload = {
+        'prompt': graph_json_data,
+    }
+    if client_id is not None:
+        payload['client_id'] = client_id
+    resp = get_client(host).post(
+        '/prompt',
+        json = payload,
     )
     
     if resp.status_code != 200:
@@ -98,7 +116,7 @@ def submit_graph(host: str, graph_json_data: dict):
         
 def check_if_prompt_done_and_get_result(host: str, prompt_id: str, output_ids=None):
     # otherwise check if it's running or queued
-    resp = requests.get(f'{host}/queue')
+    resp = get_client(host).get('/queue')
     if resp.status_code != 200:
         raise RuntimeError(f'oh no, server said nono {resp.status_code}')
     data = resp.json()
@@ -108,65 +126,303 @@ def check_if_prompt_done_and_get_result(host: str, prompt_id: str, output_ids=No
     
     # check if it's done
     # note, check order matters, the other way around we might get a race
-    resp = requests.get(f'{host}/history/{prompt_id}')
-    if resp.status_code != 200:
-        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
-    data = resp.json()
-    if len(data) > 0:  # means it's in history, therefore done
-        results = {}
-        outputs = data[prompt_id]['outputs']
-        if output_ids is None:
-            results = {k: v for k, v in outputs.items()}
-        else:
-            for output_id in output_ids:
-                results[output_id] = outputs[output_id]
+    if (results := get_prompt_history_result(host, prompt_id, output_ids)) is not None:
         return results
         
     raise RuntimeError('cannot find given prompt id on server')            
 
 
+def get_queue_position(host: str, prompt_id: str) -> int|None:
+    """
+    0 if prompt is running, 1-based position among pending prompts, None if it's not in the queue
+    """
+    resp = get_client(host).get('/queue')
+    if resp.status_code != 200:
+        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+    data = resp.json()
+    if any(prompt[1] == prompt_id for prompt in data['queue_running']):
+        return 0
+    # pending queue is not sorted, prompt's number defines it's order
+    pending = sorted(data['queue_pending'], key=lambda prompt: prompt[0])
+    for i, prompt in enumerate(pending):
+        if prompt[1] == prompt_id:
+            return i + 1
+    return None
+
+
+def forget_prompt(tracker: PromptTracker, prompt_id: str):
+    """
+    prompt is done, tracker does not need to keep it's state any more
+    """
+    if (progress := tracker.progress(prompt_id)) is not None and progress.finished:
+        log_stage_timings(prompt_id, progress)
+        tracing.record_prompt_execution(prompt_id, progress)
+    tracker.forget(prompt_id)
+
+
+class _ProgressReporter:
+    """
+    reports prompt's execution progress, or it's queue position, to houdini's long operation
+    """
+    def __init__(self, host: str, prompt_id: str, tracker: PromptTracker|None, long_op):
+        self.__host = host
+        self.__prompt_id = prompt_id
+        self.__tracker = tracker
+        self.__long_op = long_op
+        self.__next_queue_poll_time = 0.0
+        self.__queue_position: int|None = None
+        self.__last_report = None
+
+    def update(self):
+        progress = None
+        if self.__tracker is not None and self.__tracker.is_connected():
+            progress = self.__tracker.progress(self.__prompt_id)
+
+        if progress is not None and progress.started_at is not None:
+            fraction = progress.fraction()
+            message = f'ComfyUI: {progress.describe() or "running"}'
+        else:
+            # not started yet, or we cannot know without ws events
+            now = time.monotonic()
+            if now >= self.__next_queue_poll_time:
+                self.__next_queue_poll_time = now + queue_poll_interval
+                try:
+                    self.__queue_position = get_queue_position(self.__host, self.__prompt_id)
+                except (RuntimeError, requests.RequestException):
+                    pass
+            fraction = None
+            if self.__queue_position:
+                message = f'ComfyUI: queued, position {self.__queue_position}'
+            else:
+                message = 'waiting for ComfyUI to finish'
+
+        report = (-1 if fraction is None else round(fraction, 3), message)
+        if report != self.__last_report:
+            self.__last_report = report
+            self.__long_op.updateLongProgress(*report)
+
+
+def get_prompt_history_result(host: str, prompt_id: str, output_ids=None) -> dict|None:
+    """
+    get outputs of a finished prompt from history, None if prompt is not in history (yet)
+    """
+    resp = get_client(host).get(f'/history/{prompt_id}')
+    if resp.status_code != 200:
+        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+    data = resp.json()
+    if len(data) == 0:
+        return None
+    results = {}
+    outputs = data[prompt_id]['outputs']
+    if output_ids is None:
+        results = {k: v for k, v in outputs.items()}
+    else:
+        for output_id in output_ids:
+            results[output_id] = outputs[output_id]
+    return results
+
+
+def wait_for_prompt_result(host: str, prompt_id: str, tracker: PromptTracker|None, connection_epoch: int = -1, *, output_ids=None, long_op=None, on_wait: Callable[[], None]|None = None) -> dict:
+    """
+    wait for prompt to finish, relying on tracker's ws events when it's connected,
+    and falling back to polling /queue and /history otherwise
+
+    connection_epoch - tracker's connection epoch at the moment prompt was submitted
+    on_wait - called every time waiting wakes up, from the calling thread
+    """
+    next_poll_time = 0.0
+    if tracker is not None and tracker.is_connected() and tracker.connection_epoch == connection_epoch:
+        next_poll_time = time.monotonic() + safety_poll_interval
+    reporter = _ProgressReporter(host, prompt_id, tracker, long_op) if long_op else None
+
+    while True:
+        if tracker is not None and tracker.is_connected():
+            if tracker.connection_epoch != connection_epoch:
+                # reconnected, events might have been lost meanwhile, so double check with a poll
+                connection_epoch = tracker.connection_epoch
+                next_poll_time = 0.0
+            elif tracker.wait_for(prompt_id, ws_wait_interval):
+                forget_prompt(tracker, prompt_id)
+                if (res := get_prompt_history_result(host, prompt_id, output_ids)) is not None:
+                    return res
+                next_poll_time = 0.0  # should not happen, but let poll sort it out
+            fallback_interval = safety_poll_interval
+        else:
+            time.sleep(ws_wait_interval)
+            fallback_interval = poll_interval
 
-def submit_graph_and_get_result(host: str, graph_data: dict, long_op=None) -> tuple[dict, str]:
-    try:
-        prompt_id, errors = submit_graph(host, graph_data)
-    except RuntimeError as e:
-        raise
+        now = time.monotonic()
+        if now >= next_poll_time:
+            if (res := check_if_prompt_done_and_get_result(host, prompt_id, output_ids)) is not None:
+                if tracker is not None:
+                    forget_prompt(tracker, prompt_id)
+                return res
+            next_poll_time = now + fallback_interval
+
+        if long_op:
+            reporter.update()
+            long_op.updateProgress()
+        if on_wait:
+            on_wait()
+
+
+def submit_graph_and_get_result(host: str, graph_data: dict, long_op=None, *, preview: PreviewStream|None = None) -> tuple[dict, str]:
+    """
+    if preview is given - prompt's previews are streamed to it while waiting (needs websocket connection)
+    """
+    tracker = get_prompt_tracker(host)
+    connection_epoch = tracker.connection_epoch if tracker else -1
+    with tracing.span('submit prompt', nodes=len(graph_data)) as submit_span:
+        prompt_id, errors = submit_graph(host, graph_data, client_id=tracker.client_id if tracker else None)
+        submit_span.set(prompt_id=prompt_id)
 
     if errors:
         raise RuntimeError(f'some nodes have errors: {errors}')
     
     res = None
+    if tracker is not None:
+        tracker.track_progress(prompt_id, graph_data)
+    if preview is not None and tracker is not None:
+        tracker.set_preview_listener(prompt_id, preview.on_preview)
     try:
         if long_op:
             long_op.updateLongProgress(-1, "waiting for ComfyUI to finish")
-        while True:
-            if (res := check_if_prompt_done_and_get_result(host, prompt_id)) is not None:
-                break
-            time.sleep(poll_interval)
-            if long_op:
-                long_op.updateProgress()
+        with tracing.span('wait for result', prompt_id=prompt_id):
+            res = wait_for_prompt_result(host, prompt_id, tracker, connection_epoch, long_op=long_op, on_wait=preview.poll if preview is not None else None)
     
     except hou.OperationInterrupted:
         cancel_prompt(host, prompt_id)
         raise
+    finally:
+        if preview is not None and tracker is not None:
+            tracker.set_preview_listener(prompt_id, None)
 
     return res, prompt_id
 
 
 def download_result(host: str, filename: str, subfolder: str, dest_path: Path):
-    resp = requests.get(
-        f'{host}/view',
-        params = {
-            'filename': filename,
-            'subfolder': subfolder,
+    """
+    download result file in chunks into a temporary file next to dest_path, then atomically move it in place,
+    so dest_path always contains either the old or the complete new file.
+    Interrupted transfers are resumed with Range requests if server provides a validator for the file
+    """
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path = dest_path.with_name(f'.{dest_path.name}.part')
+    params = {
+        'filename': filename,
+        'subfolder': subfolder,
+    }
+    validator = None  # to make sure we resume the same file we started downloading
+    try:
+        for attempt in range(download_attempts):
+            offset = part_path.stat().st_size if validator and part_path.exists() else 0
+            headers = {}
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+                headers['If-Range'] = validator
+            try:
+                with get_client(host).stream('GET', '/view', params=params, headers=headers) as resp:
+                    if resp.status_code == 206 and offset:
+                        mode = 'ab'
+                    elif resp.status_code == 200:
+                        mode = 'wb'
+                        offset = 0
+                    else:
+                        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+                    validator = _get_resume_validator(resp)
+                    expected_size = offset + int(resp.headers['Content-Length']) if 'Content-Length' in resp.headers else None
+                    with open(part_path, mode) as f:
+                        for chunk in resp.iter_content(download_chunk_size):
+                            f.write(chunk)
+                            tracing.count('bytes_received', len(chunk))
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                if attempt == download_attempts - 1:
+                    raise
+                time.sleep(download_retry_delay * (attempt + 1))
+                continue
+
+            if expected_size is not None and part_path.stat().st_size != expected_size:
+                # connection closed early without an error
+                continue
+            os.replace(part_path, dest_path)
+            return
+        raise RuntimeError(f'failed to download "{filename}" after {download_attempts} attempts')
+    finally:
+        part_path.unlink(missing_ok=True)
+
+
+def _get_resume_validator(resp: requests.Response) -> str|None:
+    """
+    If-Range only works with strong etags or dates
+    """
+    etag = resp.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return resp.headers.get('Last-Modified')
+
+
+def download_results(
+    host: str,
+    downloads: list[tuple[str, str, Path]],
+    *,
+    long_op=None,
+    on_downloaded: Callable[[int], None]|None = None,
+):
+    """
+    download all given (filename, subfolder, dest_path) files in parallel
+
+    on_downloaded is called with index of the finished download from the calling thread,
+    so it's safe to touch hou from it
+    """
+    if not downloads:
+        return
+    total = len(downloads)
+    done_count = 0
+    executor = ThreadPoolExecutor(max_workers=min(max_parallel_downloads, total), thread_name_prefix='comfyui-download')
+    try:
+        download = tracing.bind(download_result)
+        future_to_index = {
+            executor.submit(download, host, filename, subfolder, dest_path): i
+            for i, (filename, subfolder, dest_path) in enumerate(downloads)
         }
+        pending = set(future_to_index)
+        while pending:
+            if long_op:
+                long_op.updateLongProgress(done_count / total, f"Downloading results ({done_count}/{total})...")
+            done, pending = wait(pending, timeout=ws_wait_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()  # reraise download errors
+                done_count += 1
+                if on_downloaded:
+                    on_downloaded(future_to_index[future])
+    finally:
+        # on error or interrupt - do not start downloads that are still queued,
+        #  running ones will finish in background, but they are atomic anyway
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def find_existing_inputs(host: str, files: list[tuple[str, str, int]]) -> list[bool]:
+    """
+    ask server which of given (filename, subfolder, size) input files are already present in its input dir
+    """
+    resp = get_client(host).post(
+        '/sidefx_houdini/inputs/exist',
+        json = {
+            'files': [
+                {
+                    'image_name': filename,
+                    'subfolder': subfolder,
+                    'size': size,
+                } for filename, subfolder, size in files
+            ],
+        },
     )
+
+    if resp.status_code in (404, 405):
+        raise FunctionalityNotAvailable('your version of houdini-connection extension does not provide this functionality')
     if resp.status_code != 200:
         raise RuntimeError(f'oh no, server said nono {resp.status_code}')
-    
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(dest_path, 'wb') as f:
-        f.write(resp.content)
+    return resp.json()['exist']
 
 
 def delete_input_image(host: str, filename: str, subfolder: str):
@@ -178,8 +434,8 @@ def delete_output_image(host: str, filename: str, subfolder: str):
 
 
 def delete_image(host: str, filename: str, subfolder: str, img_role: str):
-    resp = requests.delete(
-        f'{host}/sidefx_houdini/image',
+    resp = get_client(host).delete(
+        '/sidefx_houdini/image',
         json = {
             'type': img_role,
             'image_name': filename,
@@ -195,9 +451,42 @@ def delete_image(host: str, filename: str, subfolder: str, img_role: str):
         raise RuntimeError(f'oh no, server said nono {resp.status_code}')
 
 
+def cleanup_submission(
+    host: str,
+    *,
+    inputs: list[tuple[str, str]] = (),
+    outputs: list[tuple[str, str]] = (),
+    prompt_ids: list[str] = (),
+    shared_inputs: list[tuple[str, str]] = (),
+) -> dict[str, list[str]]:
+    """
+    delete given (filename, subfolder) input and output files and prompt history items with a single request
+
+    shared_inputs are content-addressed inputs used by the submission, they are kept,
+    but server removes ones in the same subfolders that were not used for a long time
+
+    returns dict with 'inputs', 'outputs', 'prompts' and 'shared_inputs' lists of per-item statuses: 'ok', 'missing' or 'invalid'
+    """
+    resp = get_client(host).post(
+        '/sidefx_houdini/cleanup',
+        json = {
+            'inputs': [{'image_name': filename, 'subfolder': subfolder} for filename, subfolder in inputs],
+            'outputs': [{'image_name': filename, 'subfolder': subfolder} for filename, subfolder in outputs],
+            'prompts': list(prompt_ids),
+            'shared_inputs': [{'image_name': filename, 'subfolder': subfolder} for filename, subfolder in shared_inputs],
+        }
+    )
+
+    if resp.status_code in (404, 405):
+        raise FunctionalityNotAvailable('your version of houdini-connection extension does not provide this functionality')
+    if resp.status_code != 200:
+        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+    return resp.json()
+
+
 def delete_prompt_history(host: str, prompt: str):
-    resp = requests.post(
-        f'{host}/history',
+    resp = get_client(host).post(
+        '/history',
         json = {
             'delete': [prompt],
         }
@@ -207,8 +496,8 @@ def delete_prompt_history(host: str, prompt: str):
         raise RuntimeError(f'oh no, server said nono {resp.status_code}')
 
 def cancel_prompt(host: str, prompt: str):
-    resp = requests.post(
-        f'{host}/sidefx_houdini/interrupt',
+    resp = get_client(host).post(
+        '/sidefx_houdini/interrupt',
         json = {
             'prompt_id': prompt
         }
@@ -0,0 +1,169 @@
+"""
+base_url parameter may contain several comfy addresses separated by commas or spaces,
+each prompt is then dispatched to the least loaded of them
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .http_client import get_client, normalize_host
+
+
+probe_timeout = (1, 2)  # (connect, read) seconds
+unhealthy_retry_interval = 15  # seconds before a failed host is probed again
+
+
+_in_flight: dict[str, int] = {}  # host -> number of prompts currently dispatched there from this session
+_unhealthy_until: dict[str, float] = {}
+_lock = threading.Lock()
+_local = threading.local()  # per-thread host currently dispatched for each base_url, and stack of all of them
+
+
+class NoHealthyHosts(RuntimeError):
+    pass
+
+
+def parse_hosts(base_url: str) -> list[str]:
+    hosts = []
+    for host in re.split(r'[\s,]+', base_url):
+        host = normalize_host(host)
+        if host and host not in hosts:
+            hosts.append(host)
+    return hosts
+
+
+def primary_host(base_url: str) -> str:
+    """
+    first host of the pool, for things that are not worth balancing, like fetching node definitions
+    """
+    hosts = parse_hosts(base_url)
+    if not hosts:
+        raise ValueError('no ComfyUI address given')
+    return hosts[0]
+
+
+def probe_queue_remaining(host: str) -> int|None:
+    """
+    returns number of prompts in host's queue, or None if host is not reachable
+    """
+    try:
+        resp = get_client(host).get('/prompt', timeout=probe_timeout)
+        if resp.status_code != 200:
+            return None
+        return int(resp.json()['exec_info']['queue_remaining'])
+    except Exception:
+        return None
+
+
+def pick_host(base_url: str) -> str:
+    """
+    pick least loaded healthy host from the pool
+    """
+    hosts = parse_hosts(base_url)
+    if not hosts:
+        raise ValueError('no ComfyUI address given')
+    if len(hosts) == 1:
+        return hosts[0]
+
+    now = time.monotonic()
+    with _lock:
+        to_probe = [x for x in hosts if _unhealthy_until.get(x, 0) <= now]
+    if not to_probe:
+        # everything is down as far as we know, give all of them another chance
+        to_probe = hosts
+
+    with ThreadPoolExecutor(max_workers=len(to_probe)) as executor:
+        queue_sizes = list(executor.map(probe_queue_remaining, to_probe))
+
+    best_host = None
+    best_load = None
+    with _lock:
+        for host, queue_size in zip(to_probe, queue_sizes):
+            if queue_size is None:
+                _unhealthy_until[host] = now + unhealthy_retry_interval
+                continue
+            _unhealthy_until.pop(host, None)
+            # prompts we are about to submit are not in server's queue yet
+            load = max(queue_size, _in_flight.get(host, 0))
+            if best_load is None or load < best_load:
+                best_host, best_load = host, load
+    if best_host is None:
+        raise NoHealthyHosts(f'none of ComfyUI servers respond: {", ".join(hosts)}')
+    return best_host
+
+
+def acquire_host(base_url: str) -> str:
+    """
+    pick a host for one submission and count it as busy there till release_host
+
+    for submissions that do not fit in a single with block, like pipelined frames, otherwise use dispatch
+    """
+    host = pick_host(base_url)
+    with _lock:
+        _in_flight[host] = _in_flight.get(host, 0) + 1
+    return host
+
+
+def release_host(host: str):
+    with _lock:
+        _in_flight[host] -= 1
+
+
+@contextmanager
+def dispatched_to(base_url: str, host: str):
+    """
+    make nested dispatches of base_url from this thread get already acquired host
+    """
+    dispatched: dict[str, str] = getattr(_local, 'dispatched', None)
+    if dispatched is None:
+        dispatched = _local.dispatched = {}
+        _local.stack = []
+    prev_host = dispatched.get(base_url)
+    dispatched[base_url] = host
+    _local.stack.append(host)
+    try:
+        yield host
+    finally:
+        _local.stack.pop()
+        if prev_host is None:
+            dispatched.pop(base_url, None)
+        else:
+            dispatched[base_url] = prev_host
+
+
+@contextmanager
+def dispatch(base_url: str):
+    """
+    choose a host for one submission, everything related to it (uploads, downloads, cleanup) should use that host
+
+    nested dispatches of the same base_url from the same thread get the same host,
+    as nested submissions share uploads with the outer one
+    """
+    dispatched: dict[str, str] = getattr(_local, 'dispatched', None)
+    if dispatched is not None and base_url in dispatched:
+        yield dispatched[base_url]
+        return
+
+    host = acquire_host(base_url)
+    try:
+        with dispatched_to(base_url, host):
+            yield host
+    finally:
+        release_host(host)
+
+
+@contextmanager
+def dispatch_nested(base_url: str):
+    """
+    like dispatch, but if this thread is already inside any dispatch - that host is used, whatever base_url it was for
+
+    for submissions made while preparing another one (so for every frame of a range - that frame's host),
+    as they share uploads with the outer submission
+    """
+    stack: list[str]|None = getattr(_local, 'stack', None)
+    if stack:
+        yield stack[-1]
+        return
+    with dispatch(base_url) as host:
+        yield host
@@ -0,0 +1,119 @@
+import threading
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import tracing
+
+
+default_timeout = (5, 120)  # (connect, read) seconds
+max_concurrent_requests = 8  # per host
+pool_size = 16  # keep-alive connections per host
+retry_count = 3
+retry_backoff = 0.25
+
+
+def normalize_host(host: str) -> str:
+    return host.strip().rstrip('/ ')
+
+
+class HostClient:
+    """
+    keep-alive connection pool to a single comfy host
+
+    all requests to comfy should go through this to reuse connections.
+    Requests are retried with backoff on connection errors and on gateway-like error statuses,
+    but non-idempotent methods (POST) are only retried if the request never reached the server
+    """
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.__semaphore = threading.BoundedSemaphore(max_concurrent_requests)
+        self.__session = requests.Session()
+        retry = Retry(
+            total=retry_count,
+            connect=retry_count,
+            read=retry_count,
+            status=retry_count,
+            backoff_factor=retry_backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(('GET', 'HEAD', 'DELETE', 'OPTIONS')),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+
+    def url(self, path: str) -> str:
+        return f'{self.base_url}/{path.lstrip("/")}'
+
+    def request(self, method: str, path: str, *, timeout=None, **kwargs) -> requests.Response:
+        with self.__semaphore:
+            resp = self.__session.request(
+                method,
+                self.url(path),
+                timeout=timeout if timeout is not None else default_timeout,
+                **kwargs,
+            )
+        if tracing.enabled:
+            _count_request(resp)
+            tracing.count('bytes_received', len(resp.content))
+        return resp
+
+    @contextmanager
+    def stream(self, method: str, path: str, *, timeout=None, **kwargs):
+        """
+        like request, but response body is not preloaded,
+        host concurrency slot is only held until headers arrive,
+        so slow body consumers don't starve other requests to the same host
+        """
+        with self.__semaphore:
+            resp = self.__session.request(
+                method,
+                self.url(path),
+                timeout=timeout if timeout is not None else default_timeout,
+                stream=True,
+                **kwargs,
+            )
+        if tracing.enabled:
+            # streamed body is counted by whoever reads it
+            _count_request(resp)
+        try:
+            yield resp
+        finally:
+            resp.close()
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request('DELETE', path, **kwargs)
+
+    def close(self):
+        self.__session.close()
+
+
+def _count_request(resp: requests.Response):
+    tracing.count('requests')
+    body = resp.request.body
+    if body is not None and hasattr(body, '__len__'):
+        tracing.count('bytes_sent', len(body))
+
+
+_clients: dict[str, HostClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host: str) -> HostClient:
+    """
+    get client shared by the whole session for the given host
+    """
+    base_url = normalize_host(host)
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = HostClient(base_url)
+            _clients[base_url] = client
+        return client
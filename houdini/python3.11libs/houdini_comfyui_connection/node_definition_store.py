@@ -0,0 +1,85 @@
+"""
+content addressed store of comfy node definitions used by generated shelf tools
+
+tools only reference a definition by id, so shelf file stays small and quick for houdini to load,
+while definitions themselves (with all the model lists) live in
+$HOUDINI_USER_PREF_DIR/comfyui_cache/node_definitions (or HCUI_NODE_DEFINITIONS_DIR)
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import uuid
+from pathlib import Path
+
+
+def store_dir() -> Path:
+    if env_dir := os.environ.get('HCUI_NODE_DEFINITIONS_DIR'):
+        return Path(env_dir)
+    pref_dir = os.environ.get('HOUDINI_USER_PREF_DIR') or tempfile.gettempdir()
+    return Path(pref_dir) / 'comfyui_cache' / 'node_definitions'
+
+
+class DefinitionNotFound(RuntimeError):
+    def __init__(self, definition_id: str):
+        super().__init__(f'node definition {definition_id} not found, try updating node definitions')
+        self.definition_id = definition_id
+
+
+_definition_id_re = re.compile(r'^[0-9a-f]{64}$')
+
+
+def definition_id(node_definition: dict) -> str:
+    data = json.dumps(node_definition, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def store_definition(node_definition: dict) -> str:
+    """
+    returns id to load the definition back with
+    """
+    def_id = definition_id(node_definition)
+    file_path = store_dir() / f'{def_id}.json'
+    if file_path.exists():
+        return def_id
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_name(f'.{def_id}.{uuid.uuid4().hex}.tmp')
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(node_definition, f, separators=(',', ':'))
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+    return def_id
+
+
+def load_definition(def_id: str) -> dict:
+    if not _definition_id_re.match(def_id):
+        raise ValueError(f'bad node definition id "{def_id}"')
+    try:
+        with open(store_dir() / f'{def_id}.json', 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise DefinitionNotFound(def_id) from None
+
+
+def remove_unreferenced(referenced_ids: set[str]):
+    """
+    delete stored definitions that no tool references any more
+    """
+    try:
+        files = list(store_dir().glob('*.json'))
+    except OSError:
+        return
+    for file_path in files:
+        if file_path.stem in referenced_ids:
+            continue
+        try:
+            file_path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,178 @@
+"""
+local cache of comfy's /object_info, one per host
+
+full /object_info may be several megabytes, so it's kept on disk
+in $HOUDINI_USER_PREF_DIR/comfyui_cache/object_info (or HCUI_OBJECT_INFO_CACHE_DIR)
+and revalidated against the fingerprint the bridge extension reports.
+When only some node definitions changed - only those are fetched.
+
+Returned definitions are shared between callers, they must not be modified
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import quote
+from .http_client import get_client
+from .graph_submission import FunctionalityNotAvailable
+
+
+max_incremental_fetch = 64  # if more definitions than that changed - just get the whole thing
+max_parallel_fetches = 8
+
+
+@dataclass
+class _CacheEntry:
+    fingerprint: str
+    node_hashes: dict[str, str]  # node type -> hash of it's definition
+    object_info: dict
+
+
+_memory: dict[str, _CacheEntry] = {}  # host -> last loaded entry
+_lock = threading.Lock()
+
+
+def cache_dir() -> Path:
+    if env_dir := os.environ.get('HCUI_OBJECT_INFO_CACHE_DIR'):
+        return Path(env_dir)
+    pref_dir = os.environ.get('HOUDINI_USER_PREF_DIR') or tempfile.gettempdir()
+    return Path(pref_dir) / 'comfyui_cache' / 'object_info'
+
+
+def _cache_file(host: str) -> Path:
+    return cache_dir() / f'{hashlib.sha256(host.encode("utf-8")).hexdigest()[:32]}.json'
+
+
+def get_fingerprint(host: str) -> tuple[str, dict[str, str]]:
+    """
+    returns global fingerprint and per node type hashes
+    """
+    resp = get_client(host).get('/sidefx_houdini/object_info/fingerprint')
+    if resp.status_code in (404, 405):
+        raise FunctionalityNotAvailable('your version of houdini-connection extension does not provide this functionality')
+    if resp.status_code != 200:
+        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+    data = resp.json()
+    return data['fingerprint'], data['nodes']
+
+
+def fetch_object_info(host: str) -> dict:
+    resp = get_client(host).get('/object_info')
+
+    if resp.status_code != 200:
+        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+
+    return resp.json()
+
+
+def fetch_node_object_info(host: str, node_type: str) -> dict|None:
+    """
+    returns None if server does not know such node type
+    """
+    resp = get_client(host).get(f'/object_info/{quote(node_type, safe="")}')
+
+    if resp.status_code != 200:
+        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+
+    return resp.json().get(node_type)
+
+
+def get_object_info(host: str) -> dict:
+    """
+    get all node definitions from host, using local cache if it's still valid
+    """
+    try:
+        fingerprint, node_hashes = get_fingerprint(host)
+    except FunctionalityNotAvailable:
+        # old extension - nothing to revalidate the cache against
+        return fetch_object_info(host)
+
+    with _lock:
+        entry = _memory.get(host)
+    if entry is None or entry.fingerprint != fingerprint:
+        entry = _load_entry(host) or entry
+    if entry is not None and entry.fingerprint == fingerprint:
+        with _lock:
+            _memory[host] = entry
+        return entry.object_info
+
+    changed = [
+        node_type for node_type, node_hash in node_hashes.items()
+        if entry is None or entry.node_hashes.get(node_type) != node_hash or node_type not in entry.object_info
+    ]
+    if entry is None or len(changed) > max_incremental_fetch:
+        object_info = fetch_object_info(host)
+    else:
+        object_info = {
+            node_type: node_def for node_type, node_def in entry.object_info.items()
+            if node_type in node_hashes
+        }
+        with ThreadPoolExecutor(max_workers=max_parallel_fetches) as executor:
+            for node_type, node_def in zip(changed, executor.map(lambda x: fetch_node_object_info(host, x), changed)):
+                if node_def is None:
+                    object_info.pop(node_type, None)
+                else:
+                    object_info[node_type] = node_def
+
+    entry = _CacheEntry(fingerprint, node_hashes, object_info)
+    with _lock:
+        _memory[host] = entry
+    try:
+        _store_entry(host, entry)
+    except OSError as e:
+        print(f'[WARNING] failed to store node definitions cache: {e}')
+    return object_info
+
+
+def clear(host: str|None = None):
+    """
+    forget cached definitions of the host, or of all hosts
+    """
+    with _lock:
+        if host is None:
+            _memory.clear()
+        else:
+            _memory.pop(host, None)
+    files = [_cache_file(host)] if host is not None else cache_dir().glob('*.json')
+    for file in files:
+        try:
+            file.unlink()
+        except OSError:
+            pass
+
+
+def _load_entry(host: str) -> _CacheEntry|None:
+    try:
+        with open(_cache_file(host), 'r') as f:
+            data = json.load(f)
+        if data['host'] != host:
+            return None
+        return _CacheEntry(data['fingerprint'], data['nodes'], data['object_info'])
+    except (OSError, json.JSONDecodeError, KeyError, TypeError):
+        return None
+
+
+def _store_entry(host: str, entry: _CacheEntry):
+    file_path = _cache_file(host)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_name(f'.{file_path.name}.{uuid.uuid4().hex}.tmp')
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'host': host,
+                'fingerprint': entry.fingerprint,
+                'nodes': entry.node_hashes,
+                'object_info': entry.object_info,
+            }, f, separators=(',', ':'))
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,108 @@
+"""
+snapshot of partial graph node's cui_* multiparms
+
+compiler, parameter propagation and workflow import all need the same per-input values,
+so they are read once per node into a plain structure instead of every consumer
+doing it's own evalParm per input per field
+"""
+from dataclasses import dataclass
+import hou  # type:ignore
+
+
+@dataclass
+class CuiInputParms:
+    node_title: str
+    node_input: str
+    value_type: str  # value type or inputN if fed from node's input N
+    orig_value_type: str
+    value: int|float|str|bool|None  # value of the parm of value type (or of orig value type if input), None if type has no value parm
+    converted_type: str  # only meaningful for text values
+    bake_cc: bool
+    input_type: str
+
+    @property
+    def is_input(self) -> bool:
+        return self.value_type.startswith('input')
+
+    @property
+    def input_index(self) -> int:
+        """
+        node input index if value is fed from node's input
+        """
+        return int(self.value_type[5:]) - 1
+
+
+@dataclass
+class CuiOutputParms:
+    node_title: str
+    node_output: int
+
+
+@dataclass
+class PartialGraphParms:
+    graph: str
+    inputs: list[CuiInputParms]  # inputs[i-1] is cui input i
+    outputs: list[CuiOutputParms]  # outputs[i-1] is cui output i
+
+    def input(self, i: int) -> CuiInputParms:
+        """
+        i is 1-based, as in parm names
+        """
+        return self.inputs[i-1]
+
+    def find_input(self, node_input: str) -> int|None:
+        """
+        returns 1-based number of cui input with given node input name
+        """
+        for i, inp in enumerate(self.inputs, 1):
+            if inp.node_input == node_input:
+                return i
+        return None
+
+
+_value_types = ('int', 'textint', 'float', 'text', 'bool')
+
+
+def read_partial_graph_parms(node: hou.Node) -> PartialGraphParms:
+    inputs = []
+    for i in range(1, 1+node.evalParm('cui_inputs')):
+        value_type = node.evalParm(f'cui_i_value_type_{i}')
+        orig_value_type = node.evalParm(f'cui_i_meta_orig_value_type_{i}')
+        is_input = value_type.startswith('input')
+        effective_type = orig_value_type if is_input else value_type
+
+        value = None
+        if effective_type in _value_types:
+            if (value_parm := node.parm(f'cui_i_value_{effective_type}_{i}')) is None:
+                raise RuntimeError(f'{node.path()}: parameter cui_i_value_{effective_type}_{i} not found')
+            value = value_parm.eval()
+
+        converted_type = ''
+        if effective_type == 'text':
+            converted_type = node.evalParm(f'cui_i_meta_convertedtype_{i}')
+
+        bake_cc = True  # default True - compatible with older asset version
+        input_type = 'IMAGE'  # default IMAGE for compat
+        if is_input:
+            if bake_cc_parm := node.parm(f'cui_i_meta_bakecc_{i}'):
+                bake_cc = bool(bake_cc_parm.eval())
+            if input_type_parm := node.parm(f'cui_i_meta_intype_{i}'):
+                input_type = input_type_parm.evalAsString()
+
+        inputs.append(CuiInputParms(
+            node.evalParm(f'cui_i_node_title_{i}'),
+            node.evalParm(f'cui_i_node_input_{i}'),
+            value_type,
+            orig_value_type,
+            value,
+            converted_type,
+            bake_cc,
+            input_type,
+        ))
+
+    outputs = [
+        CuiOutputParms(node.evalParm(f'cui_o_node_title_{i}'), node.evalParm(f'cui_o_node_output_{i}'))
+        for i in range(1, 1+node.evalParm('cui_outputs'))
+    ]
+
+    return PartialGraphParms(node.evalParm('cui_graph'), inputs, outputs)
@@ -0,0 +1,79 @@
+"""
+live previews of a running prompt
+
+comfy sends sampler previews as binary websocket messages to the client that submitted the prompt,
+prompt tracker hands them to PreviewStream on it's own thread, where latest preview is written to a file.
+Main thread, while waiting for the prompt, polls the stream and reloads preview loader cop,
+but not more often than preview_reload_interval, as reloading makes houdini recook and redraw
+"""
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+import hou  # type:ignore
+
+
+preview_write_interval = 0.25  # seconds, previews coming faster than that are dropped
+preview_reload_interval = 1.0  # seconds
+
+
+class PreviewStream:
+    def __init__(self, loader: hou.Node):
+        self.__loader = loader
+        loader_path = Path(loader.evalParm('filename'))
+        self.__base_path = loader_path.with_name(loader_path.stem)
+        self.__lock = threading.Lock()
+        self.__last_write_time = 0.0
+        self.__last_reload_time = 0.0
+        self.__latest: Path|None = None  # latest written preview, not yet shown
+        self.__write_failed = False
+
+    def on_preview(self, image_data: bytes, ext: str):
+        """
+        called from tracker's thread, so no hou here
+        """
+        now = time.monotonic()
+        if now - self.__last_write_time < preview_write_interval:
+            return
+        self.__last_write_time = now
+
+        file_path = self.__base_path.with_name(f'{self.__base_path.name}.{ext}')
+        tmp_path = file_path.with_name(f'.{file_path.name}.{uuid.uuid4().hex}.tmp')
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(image_data)
+            # loader must never see a half written file
+            os.replace(tmp_path, file_path)
+        except OSError as e:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            if not self.__write_failed:
+                self.__write_failed = True
+                print(f'[WARNING] failed to write preview: {e}')
+            return
+        with self.__lock:
+            self.__latest = file_path
+
+    def poll(self):
+        """
+        called from main thread while waiting, reloads preview loader if there is a new preview
+        """
+        now = time.monotonic()
+        if now - self.__last_reload_time < preview_reload_interval:
+            return
+        with self.__lock:
+            latest = self.__latest
+            self.__latest = None
+        if latest is None:
+            return
+        self.__last_reload_time = now
+
+        self.__loader.setCachedUserData('comfyui_preview_ext', latest.suffix.lstrip('.'))
+        self.__loader.parm('reload').pressButton()
+        # main thread is busy waiting, so ask ui to redraw now
+        if hou.isUIAvailable() and hasattr(hou.ui, 'triggerUpdate'):
+            hou.ui.triggerUpdate()
@@ -0,0 +1,155 @@
+"""
+execution progress of a single prompt, as reconstructed from comfy's ws events
+
+overall fraction is nodes done (executed or cached) out of nodes in the prompt,
+with sampler-like nodes (the ones sending progress events) contributing their steps within the node.
+It's a rough estimate: nodes take very different time, and some are never executed at all
+"""
+import os
+import time
+from dataclasses import dataclass, field
+
+
+log_stages = os.environ.get('HCUI_LOG_PROGRESS', '0') == '1'  # print per node timings of every finished prompt
+
+
+@dataclass
+class StageTiming:
+    node: str
+    class_type: str|None
+    seconds: float
+    steps: int  # progress steps the node got through, 0 if it did not report any
+    started_at: float  # time.monotonic()
+
+    def steps_per_second(self) -> float|None:
+        if self.steps == 0 or self.seconds <= 0:
+            return None
+        return self.steps / self.seconds
+
+
+@dataclass
+class PromptProgress:
+    total_nodes: int|None = None  # None until submitter tells how big the prompt is
+    node_types: dict[str, str] = field(default_factory=dict)  # node id -> class type, if known
+    queued_at: float|None = None  # time.monotonic() of when submitter started tracking it
+    started_at: float|None = None  # time.monotonic() of execution start, None while queued
+    finished: bool = False
+    cached_nodes: int = 0
+    executed_nodes: int = 0
+    current_node: str|None = None
+    current_node_started_at: float = 0.0
+    step: int = 0
+    steps: int = 0
+    stages: list[StageTiming] = field(default_factory=list)
+
+    def start(self, now: float):
+        if self.started_at is None:
+            self.started_at = now
+
+    def start_node(self, node: str|None, now: float):
+        """
+        node None means execution is over
+        """
+        self.start(now)
+        if self.current_node is not None:
+            self.executed_nodes += 1
+            self.stages.append(StageTiming(
+                self.current_node,
+                self.node_types.get(self.current_node),
+                now - self.current_node_started_at,
+                self.step,
+                self.current_node_started_at,
+            ))
+        self.current_node = node
+        self.current_node_started_at = now
+        self.step = 0
+        self.steps = 0
+        if node is None:
+            self.finished = True
+
+    def set_step(self, node: str|None, step: int, steps: int):
+        if node is not None and self.current_node is not None and node != self.current_node:
+            return
+        self.step = step
+        self.steps = steps
+
+    def fraction(self) -> float|None:
+        """
+        None if it cannot be estimated (yet)
+        """
+        if self.finished:
+            return 1.0
+        if not self.total_nodes or self.started_at is None:
+            return None
+        done = self.cached_nodes + self.executed_nodes
+        if self.current_node is not None and self.steps > 0:
+            done += min(self.step / self.steps, 1.0)
+        # never claim being done while it's still running
+        return min(done / self.total_nodes, 0.99)
+
+    def eta(self, now: float|None = None) -> float|None:
+        """
+        seconds left, assuming the rest goes as fast as what's done so far
+        """
+        if now is None:
+            now = time.monotonic()
+        fraction = self.fraction()
+        if not fraction or self.started_at is None:
+            return None
+        # cached nodes take no time, so they should not speed up the estimate
+        executed_fraction = fraction - self.cached_nodes / self.total_nodes if self.total_nodes else fraction
+        if executed_fraction <= 0:
+            return None
+        elapsed = now - self.started_at
+        return elapsed * (1.0 - fraction) / executed_fraction
+
+    def describe(self, now: float|None = None) -> str:
+        if self.finished:
+            return 'done'
+        parts = []
+        if self.total_nodes:
+            parts.append(f'node {min(self.cached_nodes + self.executed_nodes + 1, self.total_nodes)}/{self.total_nodes}')
+        if self.current_node is not None:
+            name = self.node_types.get(self.current_node, self.current_node)
+            if self.steps > 0:
+                parts.append(f'{name} step {self.step}/{self.steps}')
+            else:
+                parts.append(name)
+        if (eta := self.eta(now)) is not None:
+            parts.append(f'ETA {format_duration(eta)}')
+        return ', '.join(parts)
+
+    def copy(self) -> 'PromptProgress':
+        return PromptProgress(
+            self.total_nodes,
+            dict(self.node_types),
+            self.queued_at,
+            self.started_at,
+            self.finished,
+            self.cached_nodes,
+            self.executed_nodes,
+            self.current_node,
+            self.current_node_started_at,
+            self.step,
+            self.steps,
+            list(self.stages),
+        )
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds + 0.5)
+    if seconds >= 3600:
+        return f'{seconds // 3600}:{seconds // 60 % 60:02}:{seconds % 60:02}'
+    return f'{seconds // 60}:{seconds % 60:02}'
+
+
+def log_stage_timings(prompt_id: str, progress: PromptProgress):
+    if not log_stages:
+        return
+    total = sum(x.seconds for x in progress.stages)
+    print(f'[CUI_PROGRESS] prompt {prompt_id}: {len(progress.stages)} nodes executed, {progress.cached_nodes} cached, {total:.2f}s')
+    for stage in progress.stages:
+        line = f'[CUI_PROGRESS]   {stage.node} {stage.class_type or "?"}: {stage.seconds:.3f}s'
+        if (rate := stage.steps_per_second()) is not None:
+            line += f', {stage.steps} steps, {rate:.2f} it/s'
+        print(line)
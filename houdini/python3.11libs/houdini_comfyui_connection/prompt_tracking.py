@@ -0,0 +1,314 @@
+import json
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable
+from .prompt_progress import PromptProgress
+
+try:
+    import websocket  # websocket-client package
+except ImportError:
+    websocket = None
+
+
+connect_timeout = 2
+recv_timeout = 10
+reconnect_delay_min = 0.5
+reconnect_delay_max = 15
+max_remembered_prompts = 1000
+
+# comfy's binary websocket event types
+_preview_image_event = 1  # 4 byte image type (1 - jpeg, 2 - png), then image
+_preview_image_with_metadata_event = 4  # 4 byte metadata length, metadata json, then image
+_preview_image_exts = {1: 'jpg', 2: 'png'}
+_preview_mime_exts = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp'}
+
+
+class PromptTracker:
+    """
+    listens to comfy's /ws event stream and remembers which prompts are done,
+    how far along running ones are,
+    also passes on previews of running prompts to whoever listens to them
+
+    one tracker is shared by all submissions to the same host from this session,
+    prompts must be submitted with tracker's client_id, otherwise comfy will not send events for them to us
+    """
+    def __init__(self, host: str):
+        self.host = host
+        self.client_id = uuid.uuid4().hex
+        self.__cond = threading.Condition()
+        self.__finished: OrderedDict[str, str] = OrderedDict()  # prompt_id -> final status
+        self.__errors: dict[str, dict] = {}
+        self.__progress: OrderedDict[str, PromptProgress] = OrderedDict()
+        self.__preview_listeners: dict[str, Callable[[bytes, str], None]] = {}  # prompt_id -> callback(image data, extension)
+        self.__running_prompt: str|None = None  # old style previews do not say what prompt they belong to
+        self.__connected = False
+        self.__connection_epoch = 0
+        self.__stop = threading.Event()
+        self.__thread: threading.Thread|None = None
+
+    def _ws_url(self) -> str:
+        if self.host.startswith('https://'):
+            base = 'wss://' + self.host[len('https://'):]
+        elif self.host.startswith('http://'):
+            base = 'ws://' + self.host[len('http://'):]
+        else:
+            base = 'ws://' + self.host
+        return f'{base}/ws?clientId={self.client_id}'
+
+    @property
+    def connection_epoch(self) -> int:
+        """
+        incremented on every (re)connection, events sent while we were disconnected are lost,
+        so waiters should re-check prompt state when epoch changes
+        """
+        return self.__connection_epoch
+
+    def is_connected(self) -> bool:
+        return self.__connected
+
+    def start(self):
+        with self.__cond:
+            if self.__thread is not None:
+                return
+            self.__thread = threading.Thread(target=self._run, name=f'comfyui-tracker-{self.host}', daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def wait_connected(self, timeout: float) -> bool:
+        with self.__cond:
+            return self.__cond.wait_for(lambda: self.__connected, timeout)
+
+    def wait_for(self, prompt_id: str, timeout: float) -> bool:
+        """
+        returns True if prompt is known to be finished (in any way, including errors and interrupts)
+        returns False on timeout or if connection was lost meanwhile
+        """
+        with self.__cond:
+            self.__cond.wait_for(lambda: prompt_id in self.__finished or not self.__connected, timeout)
+            return prompt_id in self.__finished
+
+    def finished_status(self, prompt_id: str) -> str|None:
+        with self.__cond:
+            return self.__finished.get(prompt_id)
+
+    def error_data(self, prompt_id: str) -> dict|None:
+        with self.__cond:
+            return self.__errors.get(prompt_id)
+
+    def set_preview_listener(self, prompt_id: str, callback: Callable[[bytes, str], None]|None):
+        """
+        callback is called from tracker's thread with every preview image of the prompt, it should be quick
+        None removes the listener
+        """
+        with self.__cond:
+            if callback is None:
+                self.__preview_listeners.pop(prompt_id, None)
+            else:
+                self.__preview_listeners[prompt_id] = callback
+
+    def track_progress(self, prompt_id: str, graph: dict):
+        """
+        tell tracker what the prompt consists of, so progress can be estimated
+        """
+        with self.__cond:
+            progress = self.__get_progress(prompt_id)
+            progress.total_nodes = len(graph)
+            if progress.queued_at is None:
+                progress.queued_at = time.monotonic()
+            progress.node_types = {
+                node_id: node_data.get('class_type') for node_id, node_data in graph.items()
+                if isinstance(node_data, dict)
+            }
+
+    def progress(self, prompt_id: str) -> PromptProgress|None:
+        """
+        snapshot of prompt's progress, None if nothing is known about it
+        """
+        with self.__cond:
+            progress = self.__progress.get(prompt_id)
+            return progress.copy() if progress is not None else None
+
+    def forget(self, prompt_id: str):
+        with self.__cond:
+            self.__finished.pop(prompt_id, None)
+            self.__errors.pop(prompt_id, None)
+            self.__progress.pop(prompt_id, None)
+
+    def __get_progress(self, prompt_id: str) -> PromptProgress:
+        """
+        must be called under lock
+        """
+        progress = self.__progress.get(prompt_id)
+        if progress is None:
+            progress = PromptProgress()
+            self.__progress[prompt_id] = progress
+            while len(self.__progress) > max_remembered_prompts:
+                self.__progress.popitem(last=False)
+        return progress
+
+    def _set_connected(self, connected: bool):
+        with self.__cond:
+            self.__connected = connected
+            if connected:
+                self.__connection_epoch += 1
+            self.__cond.notify_all()
+
+    def _mark_finished(self, prompt_id: str, status: str):
+        with self.__cond:
+            if self.__finished.get(prompt_id) in ('error', 'interrupted'):
+                # the final "executing" event comes after error events, keep the more informative status
+                status = self.__finished[prompt_id]
+            self.__finished[prompt_id] = status
+            self.__finished.move_to_end(prompt_id)
+            if self.__running_prompt == prompt_id:
+                self.__running_prompt = None
+            while len(self.__finished) > max_remembered_prompts:
+                old_id, _ = self.__finished.popitem(last=False)
+                self.__errors.pop(old_id, None)
+            self.__cond.notify_all()
+
+    def _run(self):
+        delay = reconnect_delay_min
+        while not self.__stop.is_set():
+            try:
+                ws = websocket.create_connection(self._ws_url(), timeout=connect_timeout)
+            except Exception:
+                time.sleep(delay)
+                delay = min(delay * 2, reconnect_delay_max)
+                continue
+            delay = reconnect_delay_min
+            ws.settimeout(recv_timeout)
+            self._set_connected(True)
+            try:
+                while not self.__stop.is_set():
+                    try:
+                        message = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        ws.ping()  # make sure connection is still alive
+                        continue
+                    if isinstance(message, bytes):
+                        self._handle_binary_message(message)
+                        continue
+                    try:
+                        self._handle_message(json.loads(message))
+                    except (json.JSONDecodeError, AttributeError, TypeError):
+                        continue
+            except Exception:
+                pass
+            finally:
+                self._set_connected(False)
+                try:
+                    ws.close()
+                except Exception:
+                    pass
+
+    def _handle_message(self, message: dict):
+        msg_type = message.get('type')
+        data = message.get('data') or {}
+        prompt_id = data.get('prompt_id')
+        if prompt_id is None:
+            return
+
+        now = time.monotonic()
+        if msg_type == 'execution_start':
+            with self.__cond:
+                self.__running_prompt = prompt_id
+                self.__get_progress(prompt_id).start(now)
+        elif msg_type == 'execution_cached':
+            with self.__cond:
+                progress = self.__get_progress(prompt_id)
+                progress.start(now)
+                progress.cached_nodes += len(data.get('nodes') or ())
+        elif msg_type == 'progress':
+            with self.__cond:
+                self.__get_progress(prompt_id).set_step(data.get('node'), data.get('value', 0), data.get('max', 0))
+        elif msg_type == 'executing':
+            node = data.get('node')
+            with self.__cond:
+                self.__get_progress(prompt_id).start_node(node, now)
+                if node is not None:
+                    self.__running_prompt = prompt_id
+            # note: comfy sends node=None AFTER prompt is put to history,
+            #  unlike execution_success, that is sent before that
+            if node is None:
+                self._mark_finished(prompt_id, 'success')
+        elif msg_type == 'execution_error':
+            with self.__cond:
+                self.__errors[prompt_id] = data
+            self._mark_finished(prompt_id, 'error')
+        elif msg_type == 'execution_interrupted':
+            self._mark_finished(prompt_id, 'interrupted')
+
+
+    def _handle_binary_message(self, message: bytes):
+        if len(message) < 8:
+            return
+        event_type, = struct.unpack('>I', message[:4])
+        if event_type == _preview_image_event:
+            image_type, = struct.unpack('>I', message[4:8])
+            ext = _preview_image_exts.get(image_type)
+            image_data = message[8:]
+            with self.__cond:
+                prompt_id = self.__running_prompt
+        elif event_type == _preview_image_with_metadata_event:
+            metadata_length, = struct.unpack('>I', message[4:8])
+            try:
+                metadata = json.loads(message[8:8+metadata_length])
+                prompt_id = metadata.get('prompt_id')
+                ext = _preview_mime_exts.get(metadata.get('image_type'))
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                return
+            image_data = message[8+metadata_length:]
+        else:
+            return
+
+        if prompt_id is None or ext is None:
+            return
+        with self.__cond:
+            callback = self.__preview_listeners.get(prompt_id)
+        if callback is None:
+            return
+        try:
+            callback(image_data, ext)
+        except Exception as e:
+            print(f'[WARNING] preview listener failed: {e}')
+
+
+_trackers: dict[str, PromptTracker] = {}
+_trackers_lock = threading.Lock()
+_no_websocket_warned = False
+
+
+def get_prompt_tracker(host: str) -> PromptTracker|None:
+    """
+    get a connected tracker shared by the whole session for the given host
+
+    returns None if websocket is not available, in that case caller should fall back to polling
+    """
+    global _no_websocket_warned
+    if websocket is None:
+        if not _no_websocket_warned:
+            _no_websocket_warned = True
+            print('[WARNING] websocket-client package is not available to houdini python, falling back to polling for prompt progress (slower)')
+        return None
+
+    with _trackers_lock:
+        tracker = _trackers.get(host)
+        is_new = tracker is None
+        if is_new:
+            tracker = PromptTracker(host)
+            _trackers[host] = tracker
+            tracker.start()
+
+    if tracker.is_connected():
+        return tracker
+    # only first use waits for connection, later if server is down we don't want to stall every submission,
+    #  tracker will keep reconnecting in the background
+    if is_new and tracker.wait_connected(connect_timeout):
+        return tracker
+    return None
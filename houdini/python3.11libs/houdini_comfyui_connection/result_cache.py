@@ -0,0 +1,135 @@
+"""
+local cache of downloaded results, keyed by the final submitted graph
+
+inputs are referenced in the graph by content-addressed names, so graph hash covers input contents too.
+Cache lives in $HOUDINI_USER_PREF_DIR/comfyui_cache/results (or HCUI_RESULT_CACHE_DIR),
+total size is limited by HCUI_RESULT_CACHE_SIZE_MB, least recently used entries are evicted first
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+
+default_max_size_mb = 2048
+meta_filename = 'meta.json'
+
+
+@dataclass
+class CachedFile:
+    loader_index: int
+    batch_index: int|None  # None for single result loaders
+    ext: str
+    path: Path  # path to the file in the cache
+
+
+_lock = threading.Lock()
+
+
+def cache_dir() -> Path:
+    if env_dir := os.environ.get('HCUI_RESULT_CACHE_DIR'):
+        return Path(env_dir)
+    pref_dir = os.environ.get('HOUDINI_USER_PREF_DIR') or tempfile.gettempdir()
+    return Path(pref_dir) / 'comfyui_cache' / 'results'
+
+
+def max_size_bytes() -> int:
+    try:
+        size_mb = float(os.environ.get('HCUI_RESULT_CACHE_SIZE_MB', default_max_size_mb))
+    except ValueError:
+        size_mb = default_max_size_mb
+    return int(size_mb * 1024 * 1024)
+
+
+def make_key(graph: dict, outputs: list[str|None]) -> str:
+    data = json.dumps({'graph': graph, 'outputs': outputs}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def lookup(key: str) -> list[CachedFile]|None:
+    entry_dir = cache_dir() / key
+    try:
+        with open(entry_dir / meta_filename, 'r') as f:
+            meta = json.load(f)
+        files = [
+            CachedFile(x['loader_index'], x['batch_index'], x['ext'], entry_dir / x['file'])
+            for x in meta['files']
+        ]
+    except (OSError, json.JSONDecodeError, KeyError, TypeError):
+        return None
+    if not all(x.path.exists() for x in files):
+        return None
+    # mark as recently used
+    try:
+        os.utime(entry_dir)
+    except OSError:
+        pass
+    return files
+
+
+def store(key: str, files: list[tuple[int, int|None, str, Path]]):
+    """
+    files: (loader_index, batch_index, ext, local downloaded path)
+    """
+    base_dir = cache_dir()
+    base_dir.mkdir(parents=True, exist_ok=True)
+    entry_dir = base_dir / key
+    if entry_dir.exists():
+        return
+    tmp_dir = base_dir / f'.{key}.{uuid.uuid4().hex}.tmp'
+    tmp_dir.mkdir()
+    try:
+        meta_files = []
+        for i, (loader_index, batch_index, ext, local_path) in enumerate(files):
+            cached_name = f'{i}.{ext}' if ext else str(i)
+            shutil.copyfile(local_path, tmp_dir / cached_name)
+            meta_files.append({
+                'loader_index': loader_index,
+                'batch_index': batch_index,
+                'ext': ext,
+                'file': cached_name,
+            })
+        with open(tmp_dir / meta_filename, 'w') as f:
+            json.dump({'files': meta_files}, f)
+        try:
+            tmp_dir.rename(entry_dir)
+        except OSError:  # someone else has stored it meanwhile
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    evict()
+
+
+def evict(max_size: int|None = None):
+    """
+    remove least recently used entries till cache fits into max size
+    """
+    if max_size is None:
+        max_size = max_size_bytes()
+    base_dir = cache_dir()
+    with _lock:
+        entries = []
+        total_size = 0
+        try:
+            entry_dirs = [x for x in base_dir.iterdir() if x.is_dir() and not x.name.startswith('.')]
+        except OSError:
+            return
+        for entry_dir in entry_dirs:
+            try:
+                size = sum(x.stat().st_size for x in entry_dir.iterdir())
+                entries.append((entry_dir.stat().st_mtime, size, entry_dir))
+            except OSError:
+                continue
+            total_size += size
+        entries.sort()
+        for _, size, entry_dir in entries:
+            if total_size <= max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
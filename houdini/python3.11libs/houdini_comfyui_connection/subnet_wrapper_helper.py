@@ -1,4 +1,5 @@
 import hou  # type: ignore
+from .partial_graph_parms import PartialGraphParms, read_partial_graph_parms
 
 
 def propagate_single_parameter(node: hou.Node, ptg_i: int, i: int,
@@ -6,50 +7,51 @@ def propagate_single_parameter(node: hou.Node, ptg_i: int, i: int,
     also_connect_node_to_it: bool,
     ignore_unkonwn_types: bool = False,
     ptg_owner: hou.Node | None = None,
+    parms: PartialGraphParms | None = None,
 ) -> hou.ParmTemplate | None:
     """
     node - innermost partial graph node
+    parms - node's parm snapshot, pass it when propagating many parameters of the same node
     """
     assert node.type().nameComponents()[2] == 'comfyui_partial_graph'
     if ptg_owner is None:
         ptg_owner = node.parent()
     assert ptg_owner is not None
 
-    parm = node.parm(f'cui_i_node_input_{i}')
+    if parms is None:
+        parms = read_partial_graph_parms(node)
+    inp = parms.input(i)
+    label = inp.node_input
     extra_tags = {'hou_comfyui_inner_input_i': str(i)}
 
-    inp_type = node.evalParm(f'cui_i_meta_orig_value_type_{i}')
+    inp_type = inp.orig_value_type
 
     if inp_type == 'int':
-        val_parm = node.parm(f'cui_i_value_int_{i}')
         range_min, range_max = node.parmTuple(f'cui_i_meta_intrange_{i}').eval()
         if range_max <= range_min:
             # if invalid - set default range
             range_max = range_min + 10
-        pt = hou.IntParmTemplate(f'input_parm_{ptg_i}', parm.eval(), 1, min=range_min, max=range_max, default_value=(val_parm.eval(),), tags=extra_tags)
+        pt = hou.IntParmTemplate(f'input_parm_{ptg_i}', label, 1, min=range_min, max=range_max, default_value=(inp.value,), tags=extra_tags)
         conn_expr = f'ch("../input_parm_{ptg_i}")'
     elif inp_type == 'textint':
-        val_parm = node.parm(f'cui_i_value_textint_{i}')
         pt = hou.StringParmTemplate(
             f'input_parm_{ptg_i}',
-            parm.eval(),
+            label,
             1,
-            default_value=(val_parm.eval(),),
+            default_value=(inp.value,),
             script_callback=r'''import re;kwargs['parm'].set(re.sub(r'(?<!^)\D|(?<=^)[^-\d]', '', kwargs['parm'].eval()))''',
             script_callback_language=hou.scriptLanguage.Python,
             tags=extra_tags,
         )
         conn_expr = f'chs("../input_parm_{ptg_i}")'
     elif inp_type == 'float':
-        val_parm = node.parm(f'cui_i_value_float_{i}')
         range_min, range_max = node.parmTuple(f'cui_i_meta_floatrange_{i}').eval()
         if range_max <= range_min:
             # if invalid - set default range
             range_max = range_min + 1.0
-        pt = hou.FloatParmTemplate(f'input_parm_{ptg_i}', parm.eval(), 1, min=range_min, max=range_max, default_value=(val_parm.eval(),), tags=extra_tags)
+        pt = hou.FloatParmTemplate(f'input_parm_{ptg_i}', label, 1, min=range_min, max=range_max, default_value=(inp.value,), tags=extra_tags)
         conn_expr = f'ch("../input_parm_{ptg_i}")'
     elif inp_type == 'text':
-        val_parm = node.parm(f'cui_i_value_text_{i}')
         is_multiline = bool(node.parm(f'cui_i_meta_textmultiline_{i}').eval())
         
         use_menuvals = node.evalParm(f'cui_i_meta_usetextvals_{i}')
@@ -104,9 +106,9 @@ def propagate_single_parameter(node: hou.Node, ptg_i: int, i: int,
                 _kwargs['menu_type'] = hou.menuType.StringReplace
         pt = hou.StringParmTemplate(
             f'input_parm_{ptg_i}',
-            parm.eval(),
+            label,
             1,
-            default_value=(val_parm.eval(),),
+            default_value=(inp.value,),
             tags={
                 'editor': '1' if is_multiline else '0', 
                 **action_tags,
@@ -116,8 +118,7 @@ def propagate_single_parameter(node: hou.Node, ptg_i: int, i: int,
         )
         conn_expr = f'chs("../input_parm_{ptg_i}")'
     elif inp_type == 'bool':
-        val_parm = node.parm(f'cui_i_value_bool_{i}')
-        pt = hou.ToggleParmTemplate(f'input_parm_{ptg_i}', parm.eval(), default_value=bool(val_parm.eval()), tags=extra_tags)
+        pt = hou.ToggleParmTemplate(f'input_parm_{ptg_i}', label, default_value=bool(inp.value), tags=extra_tags)
         conn_expr = f'ch("../input_parm_{ptg_i}")'
     else:
         if ignore_unkonwn_types:
@@ -126,6 +127,6 @@ def propagate_single_parameter(node: hou.Node, ptg_i: int, i: int,
             raise NotImplementedError(f'unknown input type "{inp_type}"')
 
     if also_connect_node_to_it:
-        val_parm.setExpression(conn_expr, language=hou.exprLanguage.Hscript)
+        node.parm(f'cui_i_value_{inp_type}_{i}').setExpression(conn_expr, language=hou.exprLanguage.Hscript)
 
     return pt
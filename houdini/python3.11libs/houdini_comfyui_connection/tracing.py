@@ -0,0 +1,295 @@
+"""
+timing spans around submission phases, enabled by HCUI_TRACE=1
+
+spans nest per thread, work handed to worker threads is attached to the span it came from with bind().
+Spans can count things (bytes, requests), counts are added up into parent spans when child finishes.
+
+Finished spans are kept in memory (see export_chrome_trace to look at them in chrome://tracing or perfetto),
+and appended to a per-session log in $HOUDINI_USER_PREF_DIR/comfyui_traces (or HCUI_TRACE_DIR),
+one json span per line, so timings can be compared across sessions.
+With tracing disabled all of this costs a function call
+"""
+import atexit
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Callable, Iterable
+
+
+enabled = os.environ.get('HCUI_TRACE', '0') == '1'
+max_remembered_spans = 50000
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    id: int
+    parent: int|None
+    trace: int  # id of the root span
+    thread: str
+    start: float  # seconds since epoch
+    duration: float  # seconds
+    args: dict = field(default_factory=dict)
+    counters: dict[str, int|float] = field(default_factory=dict)
+
+
+_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+_recent: deque[SpanRecord] = deque(maxlen=max_remembered_spans)
+_unsaved: list[SpanRecord] = []
+_session_log_path: Path|None = None
+_session_log_failed = False
+# perf_counter for precision, shifted to wall clock so sessions can be compared
+_clock_offset = time.time() - time.perf_counter()
+
+
+def trace_dir() -> Path:
+    if env_dir := os.environ.get('HCUI_TRACE_DIR'):
+        return Path(env_dir)
+    pref_dir = os.environ.get('HOUDINI_USER_PREF_DIR') or tempfile.gettempdir()
+    return Path(pref_dir) / 'comfyui_traces'
+
+
+def _stack() -> list['_Span']:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = []
+        _local.stack = stack
+    return stack
+
+
+class _Span:
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.counters: dict[str, int|float] = {}
+        self.id = next(_ids)
+        self.parent: _Span|None = None
+        self.start = 0.0
+
+    @property
+    def trace(self) -> int:
+        return self.parent.trace if self.parent is not None else self.id
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def count(self, counter: str, amount: int|float = 1):
+        with _lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def __enter__(self):
+        stack = _stack()
+        self.parent = stack[-1] if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = time.perf_counter()
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        _finish(self, self.start, end)
+        return False
+
+
+class _NullSpan:
+    def set(self, **args):
+        pass
+
+    def count(self, counter: str, amount: int|float = 1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def span(name: str, **args) -> _Span|_NullSpan:
+    """
+    with span('upload', files=3) as s:
+        s.count('bytes_sent', size)
+    """
+    if not enabled:
+        return _null_span
+    return _Span(name, args)
+
+
+def count(counter: str, amount: int|float = 1):
+    """
+    add to a counter of the innermost span of the calling thread
+    """
+    if not enabled:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1].count(counter, amount)
+
+
+def bind(func: Callable) -> Callable:
+    """
+    wrap func to be run in another thread, so spans it opens are children of the current span
+    """
+    if not enabled:
+        return func
+    stack = _stack()
+    if not stack:
+        return func
+    parent = stack[-1]
+
+    def _bound(*args, **kwargs):
+        stack = _stack()
+        prev = list(stack)
+        stack[:] = [parent]
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stack[:] = prev
+    return _bound
+
+
+def record_span(name: str, start: float, end: float, **args):
+    """
+    record a span that was measured some other way, start and end are time.monotonic() values
+    """
+    if not enabled:
+        return
+    shift = time.perf_counter() - time.monotonic()
+    s = _Span(name, args)
+    stack = _stack()
+    s.parent = stack[-1] if stack else None
+    _finish(s, start + shift, end + shift)
+
+
+def record_prompt_execution(prompt_id: str, progress):
+    """
+    queued and executing spans of a finished prompt, with a child span for every executed comfy node
+    progress is prompt_progress.PromptProgress
+    """
+    if not enabled or progress.started_at is None:
+        return
+    now = time.monotonic()
+    if progress.queued_at is not None and progress.queued_at < progress.started_at:
+        record_span('comfy queued', progress.queued_at, progress.started_at, prompt_id=prompt_id)
+    shift = time.perf_counter() - time.monotonic()
+    execute = _Span('comfy execute', {
+        'prompt_id': prompt_id,
+        'executed_nodes': progress.executed_nodes,
+        'cached_nodes': progress.cached_nodes,
+    })
+    stack = _stack()
+    execute.parent = stack[-1] if stack else None
+    end = progress.stages[-1].started_at + progress.stages[-1].seconds if progress.stages else now
+    for stage in progress.stages:
+        node_span = _Span(f'comfy node {stage.class_type or "?"}', {'node': stage.node})
+        node_span.parent = execute
+        if stage.steps:
+            node_span.counters['steps'] = stage.steps
+        _finish(node_span, stage.started_at + shift, stage.started_at + stage.seconds + shift)
+    _finish(execute, progress.started_at + shift, end + shift)
+
+
+def _finish(s: _Span, start: float, end: float):
+    record = SpanRecord(
+        s.name,
+        s.id,
+        s.parent.id if s.parent is not None else None,
+        s.trace,
+        threading.current_thread().name,
+        start + _clock_offset,
+        end - start,
+        s.args,
+        dict(s.counters),
+    )
+    with _lock:
+        if s.parent is not None:
+            for counter, amount in s.counters.items():
+                s.parent.counters[counter] = s.parent.counters.get(counter, 0) + amount
+        _recent.append(record)
+        _unsaved.append(record)
+    if s.parent is None:
+        flush_session_log()
+
+
+def recent_spans() -> list[SpanRecord]:
+    with _lock:
+        return list(_recent)
+
+
+def flush_session_log():
+    """
+    append spans finished since last flush to this session's log
+    """
+    global _session_log_path, _session_log_failed
+    with _lock:
+        if not _unsaved or _session_log_failed:
+            return
+        records = list(_unsaved)
+        _unsaved.clear()
+        try:
+            if _session_log_path is None:
+                log_dir = trace_dir()
+                log_dir.mkdir(parents=True, exist_ok=True)
+                _session_log_path = log_dir / f'session-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.jsonl'
+            with open(_session_log_path, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(asdict(record), default=str) + '\n')
+        except OSError as e:
+            # not worth failing the submission for
+            _session_log_failed = True
+            print(f'[WARNING] failed to write trace log, tracing to disk is disabled: {e}')
+
+
+def read_session_log(path: Path|str) -> list[SpanRecord]:
+    spans = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                spans.append(SpanRecord(**json.loads(line)))
+    return spans
+
+
+def export_chrome_trace(path: Path|str, spans: Iterable[SpanRecord]|None = None):
+    """
+    write spans (by default - all remembered ones) in chrome's trace event format
+    """
+    if spans is None:
+        spans = recent_spans()
+    spans = list(spans)
+    base_time = min((x.start for x in spans), default=0.0)
+    thread_ids: dict[str, int] = {}
+    events = []
+    for record in spans:
+        tid = thread_ids.setdefault(record.thread, len(thread_ids) + 1)
+        events.append({
+            'name': record.name,
+            'cat': 'hcui',
+            'ph': 'X',
+            'ts': (record.start - base_time) * 1e6,
+            'dur': record.duration * 1e6,
+            'pid': 1,
+            'tid': tid,
+            'args': {**record.args, **record.counters},
+        })
+    for thread_name, tid in thread_ids.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': thread_name}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+
+atexit.register(flush_session_log)
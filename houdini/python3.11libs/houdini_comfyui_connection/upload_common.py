@@ -1,5 +1,54 @@
-import requests
+import hashlib
+import io
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass
 from pathlib import Path
+from .http_client import get_client
+from . import tracing
+from .graph_submission import find_existing_inputs, FunctionalityNotAvailable
+
+
+hash_chunk_size = 1 << 20
+upload_chunk_size = 1 << 20
+batch_upload_max_files = 256  # per request
+batch_upload_max_bytes = 256 * 1024 * 1024  # per request
+
+
+_batch_upload_supported: dict[str, bool] = {}  # host -> if server has batch upload route
+_batch_upload_supported_lock = threading.Lock()
+
+
+@dataclass
+class CookedInput:
+    """
+    input that was cooked to a local file (or straight to memory), but not yet uploaded
+
+    temp_dir, if set, is removed once upload is done
+    """
+    file_path: Path
+    temp_dir: Path|None = None
+    data: bytes|None = None  # if set - file contents, and nothing was written to file_path
+
+    @property
+    def source(self) -> Path|bytes:
+        return self.data if self.data is not None else self.file_path
+
+    def size(self) -> int:
+        return _source_size(self.source)
+
+
+def _source_size(source: Path|bytes) -> int:
+    if isinstance(source, bytes):
+        return len(source)
+    return source.stat().st_size
+
+
+def _open_source(source: Path|bytes):
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    return open(source, 'rb')
 
 
 def upload_image(host: str, file_path: Path, subdir: str, image_name: str|None):
@@ -9,11 +58,161 @@ def upload_image(host: str, file_path: Path, subdir: str, image_name: str|None):
     with open(file_path, 'rb') as f:
         file_data = f.read()
     
-    resp = requests.post(
-        f'{host}/upload/image',
+    upload_image_data(host, file_data, subdir, image_name)
+
+
+def upload_image_data(host: str, file_data: bytes, subdir: str, image_name: str):
+    resp = get_client(host).post(
+        '/upload/image',
         files = {'image': (image_name, file_data)},
         data = {'subfolder': subdir, 'overwrite': '1'},
     )
 
     if resp.status_code != 200:
-        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
\ No newline at end of file
+        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+
+
+def _multipart_file_header(boundary: str, subdir: str, name: str) -> bytes:
+    quoted_name = name.replace('"', '%22')
+    return (
+        f'--{boundary}\r\n'
+        'Content-Disposition: form-data; name="subfolder"\r\n\r\n'
+        f'{subdir}\r\n'
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="file"; filename="{quoted_name}"\r\n'
+        'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode('utf-8')
+
+
+class _MultipartFilesBody:
+    """
+    multipart body streamed from files on disk (not loaded into memory) or from in-memory data
+
+    length is known upfront, so it's sent with Content-Length and not chunked
+    """
+    def __init__(self, boundary: str, files: list[tuple[Path|bytes, str, str]]):
+        self.__files = files
+        self.__headers = [_multipart_file_header(boundary, subdir, name) for _, subdir, name in files]
+        self.__footer = f'--{boundary}--\r\n'.encode('utf-8')
+        self.__length = sum(len(x) + _source_size(source) + 2 for x, (source, _, _) in zip(self.__headers, files)) + len(self.__footer)
+
+    def __len__(self):
+        return self.__length
+
+    def __iter__(self):
+        for header, (source, _, _) in zip(self.__headers, self.__files):
+            yield header
+            with _open_source(source) as f:
+                while chunk := f.read(upload_chunk_size):
+                    yield chunk
+            yield b'\r\n'
+        yield self.__footer
+
+
+def _post_upload_batch(host: str, files: list[tuple[Path|bytes, str, str]]) -> list[str]:
+    boundary = uuid.uuid4().hex
+    resp = get_client(host).post(
+        '/sidefx_houdini/upload/batch',
+        data=_MultipartFilesBody(boundary, files),
+        headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+    )
+    if resp.status_code in (404, 405):
+        raise FunctionalityNotAvailable('your version of houdini-connection extension does not provide this functionality')
+    if resp.status_code != 200:
+        raise RuntimeError(f'oh no, server said nono {resp.status_code}')
+    return [x['status'] for x in resp.json()['files']]
+
+
+def _is_batch_upload_supported(host: str) -> bool:
+    with _batch_upload_supported_lock:
+        if (supported := _batch_upload_supported.get(host)) is not None:
+            return supported
+    # probe with an empty batch, so we never stream files just to find out the route is missing
+    try:
+        _post_upload_batch(host, [])
+        supported = True
+    except FunctionalityNotAvailable:
+        supported = False
+    with _batch_upload_supported_lock:
+        _batch_upload_supported[host] = supported
+    return supported
+
+
+def upload_files(host: str, files: list[tuple[Path|bytes, str, str]]):
+    """
+    upload (file path or file contents, subdir, name) files using as few requests as possible,
+    falls back to one request per file for older server extensions
+    """
+    if not files:
+        return
+    if not _is_batch_upload_supported(host):
+        for source, subdir, name in files:
+            if isinstance(source, bytes):
+                upload_image_data(host, source, subdir, name)
+            else:
+                upload_image(host, source, subdir, name)
+        return
+
+    batch = []
+    batch_size = 0
+    for source, subdir, name in files:
+        size = _source_size(source)
+        if batch and (len(batch) >= batch_upload_max_files or batch_size + size > batch_upload_max_bytes):
+            _upload_files_batch(host, batch)
+            batch = []
+            batch_size = 0
+        batch.append((source, subdir, name))
+        batch_size += size
+    _upload_files_batch(host, batch)
+
+
+def _upload_files_batch(host: str, files: list[tuple[Path|bytes, str, str]]):
+    statuses = _post_upload_batch(host, files)
+    if failed := [f'{subdir}/{name}' for (_, subdir, name), status in zip(files, statuses) if status != 'ok']:
+        raise RuntimeError(f'server refused to store uploaded files: {", ".join(failed)}')
+
+
+def upload_cooked_input(host: str, cooked: CookedInput, subdir: str, image_name: str|None):
+    """
+    upload input produced by uploader's cook_input_to, does not touch hou, so safe to call from any thread
+    """
+    try:
+        upload_files(host, [(cooked.source, subdir, image_name or cooked.file_path.name)])
+    finally:
+        discard_cooked_input(cooked)
+
+
+def content_addressed_name(file_path: Path|bytes, ext: str) -> str:
+    """
+    name the file by the hash of it's contents, so same inputs always get the same name
+    """
+    hasher = hashlib.sha256()
+    with tracing.span('hash input', size=_source_size(file_path)), _open_source(file_path) as f:
+        while chunk := f.read(hash_chunk_size):
+            hasher.update(chunk)
+    return f'{hasher.hexdigest()}{ext}'
+
+
+def upload_cooked_inputs_as(host: str, items: list[tuple[CookedInput, str, str]]):
+    """
+    upload cooked inputs under given content-addressed names, (cooked, subdir, final_name) items,
+    only those the server does not have already:
+    one existence check for all of them, and missing ones are uploaded in as few requests as possible
+    """
+    try:
+        files = [(cooked.source, subdir, final_name) for cooked, subdir, final_name in items]
+        with tracing.span('upload inputs', files=len(files)) as upload_span:
+            try:
+                exist = find_existing_inputs(host, [(name, subdir, _source_size(source)) for source, subdir, name in files])
+            except FunctionalityNotAvailable:
+                exist = [False] * len(files)
+            upload_span.set(already_on_server=sum(exist))
+            upload_files(host, [x for x, exists in zip(files, exist) if not exists])
+    finally:
+        for cooked, _, _ in items:
+            discard_cooked_input(cooked)
+
+
+def discard_cooked_input(cooked: CookedInput):
+    if cooked.temp_dir is not None:
+        shutil.rmtree(cooked.temp_dir, ignore_errors=True)
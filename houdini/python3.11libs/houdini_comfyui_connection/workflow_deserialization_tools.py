@@ -5,6 +5,7 @@ from collections import OrderedDict
 
 from .compound_graph_tools import create_single_tool, get_node_definitions, DefinitionOverrideData, DefinitionOverrideConnectionData, MissingNodeDefinitionError, is_subgraph_wrapper, is_subnet_wrapper, subnet_wrapper_wrapped_node, convert_parm_to_input, partial_graph_input_to_parm_i
 from .subnet_wrapper_helper import propagate_single_parameter
+from .partial_graph_parms import read_partial_graph_parms
 from .compound_graph_core import debug
 from .compound_graph_core_graph_helpers import follow_output_till_deadend_condition
 
@@ -509,18 +510,17 @@ def create_network_from_prompt(host: str, parent_node: hou.Node, prompt) -> dict
 def _connect_compound_nodes(in_node: hou.Node, in_output_id: int, out_node: hou.Node, out_input_name):
     debug('connecting compound nodes:', in_node, in_output_id, out_node, out_input_name)
     out_node_inner = subnet_wrapper_wrapped_node(out_node)
-    for i in range(out_node_inner.evalParm('cui_inputs')):
-        if out_input_name != out_node_inner.evalParm(f'cui_i_node_input_{i+1}'):
+    for i, inp in enumerate(read_partial_graph_parms(out_node_inner).inputs):
+        if out_input_name != inp.node_input:
             continue
-        input_val = out_node_inner.evalParm(f'cui_i_value_type_{i+1}')
         
         # may be possible if input exist only in UI, not on prompt level (when we create graph from workflow)
-        if not input_val.startswith('input'):
+        if not inp.is_input:
             convert_parm_to_input(out_node, f'input_parm_{i+1}')
             # easier to just call ourselves again instead of adapting to changes in parameters
             return _connect_compound_nodes(in_node, in_output_id, out_node, out_input_name)
 
-        inner_input_num = int(input_val[5:]) - 1
+        inner_input_num = inp.input_index
         # expect input of inner_input_num to exist and have a single connection to input
         input_num = out_node_inner.inputConnectors()[inner_input_num][0].inputIndex()
 
@@ -533,10 +533,10 @@ def _connect_compound_nodes(in_node: hou.Node, in_output_id: int, out_node: hou.
 def _set_compound_node_input_value(node: hou.Node, input_name: str, value):
     debug('setting compound nodes value:', node, input_name, value)
     node_inner = subnet_wrapper_wrapped_node(node)
-    for i in range(node_inner.evalParm('cui_inputs')):
-        if input_name != node_inner.evalParm(f'cui_i_node_input_{i+1}'):
+    for i, inp in enumerate(read_partial_graph_parms(node_inner).inputs):
+        if input_name != inp.node_input:
             continue
-        val_type = node_inner.evalParm(f'cui_i_value_type_{i+1}')
+        val_type = inp.value_type
         # found i, now actually set the value
         if val_type == 'int':
             node_inner.parm(f'cui_i_value_int_{i+1}').set(int(value))
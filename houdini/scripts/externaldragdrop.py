@@ -3,6 +3,7 @@ import json
 import os
 import traceback
 import PIL
+from houdini_comfyui_connection.host_pool import primary_host
 from houdini_comfyui_connection.workflow_deserialization_tools import create_network_from_prompt, create_network_from_workflow, MissingNodeDefinitionError
 
 
@@ -26,7 +27,7 @@ def dropAccept(file_list):
     parent_node = pane.pwd()
     if (gnode := parent_node.node('..')) is None or gnode.type().nameComponents()[2] != 'comfyui_compound_graph_submit':
         return False
-    host = gnode.evalParm('base_url').rstrip('/ ')
+    host = primary_host(gnode.evalParm('base_url'))
 
     # we only accept single png file
     if len(file_list) != 1 or not file_list:
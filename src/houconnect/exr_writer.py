@@ -0,0 +1,70 @@
+"""
+minimal uncompressed scanline OpenEXR writer
+
+no compression on purpose: writing is a single memory copy, and results
+travel to houdini once, so file size matters less than encode time
+"""
+import struct
+import numpy as np
+
+
+_pixel_types = {
+    np.dtype(np.float16): 1,  # HALF
+    np.dtype(np.float32): 2,  # FLOAT
+}
+
+_channel_names = {
+    1: ('Y',),
+    3: ('R', 'G', 'B'),
+    4: ('R', 'G', 'B', 'A'),
+}
+
+
+def _attribute(name: str, type_name: str, value: bytes) -> bytes:
+    return name.encode('ascii') + b'\0' + type_name.encode('ascii') + b'\0' + struct.pack('<i', len(value)) + value
+
+
+def encode_exr(pixels: np.ndarray, dtype=np.float32) -> bytes:
+    """
+    pixels is (height, width, channels) array, top row first, with 1, 3 or 4 channels
+    dtype is np.float16 or np.float32
+    """
+    dtype = np.dtype(dtype)
+    pixel_type = _pixel_types[dtype]
+    height, width, channels = pixels.shape
+    names = _channel_names[channels]
+    # exr wants channels sorted by name, both in header and in pixel data
+    order = sorted(range(channels), key=lambda i: names[i])
+
+    chlist = b''.join(
+        names[i].encode('ascii') + b'\0' + struct.pack('<iB3xii', pixel_type, 0, 1, 1)
+        for i in order
+    ) + b'\0'
+    box = struct.pack('<iiii', 0, 0, width - 1, height - 1)
+    header = b''.join((
+        struct.pack('<ii', 20000630, 2),  # magic, version 2 single part scanline
+        _attribute('channels', 'chlist', chlist),
+        _attribute('compression', 'compression', b'\0'),
+        _attribute('dataWindow', 'box2i', box),
+        _attribute('displayWindow', 'box2i', box),
+        _attribute('lineOrder', 'lineOrder', b'\0'),
+        _attribute('pixelAspectRatio', 'float', struct.pack('<f', 1.0)),
+        _attribute('screenWindowCenter', 'v2f', struct.pack('<ff', 0.0, 0.0)),
+        _attribute('screenWindowWidth', 'float', struct.pack('<f', 1.0)),
+        b'\0',
+    ))
+
+    # each uncompressed block is one scanline: y, data size, then every channel's row in turn
+    line_size = width * channels * dtype.itemsize
+    lines = np.empty(height, dtype=np.dtype([
+        ('y', '<i4'),
+        ('size', '<i4'),
+        ('data', dtype.newbyteorder('<'), (channels, width)),
+    ]))
+    lines['y'] = np.arange(height, dtype=np.int32)
+    lines['size'] = line_size
+    lines['data'] = np.asarray(pixels)[:, :, order].transpose(0, 2, 1)
+
+    first_line = len(header) + 8 * height
+    offsets = first_line + np.arange(height, dtype='<u8') * (8 + line_size)
+    return header + offsets.tobytes() + lines.tobytes()
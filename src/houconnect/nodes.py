@@ -295,6 +295,218 @@ class HouCuiFixImageFix:
         return (image1,)
 
 
+class HouCuiLoadImageBatch:
+    """
+    load a list of input images straight into a single image batch
+    images of different size are scaled to the size of the first one, same as ImageBatch does
+    """
+    image_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tif', '.tiff', '.exr')
+    max_decode_workers = 8
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "images": ("STRING", {"multiline": True, "default": "", "tooltip": "input image paths, one per line, in batch order"}),
+            },
+            "optional": {
+                "subfolder": ("STRING", {"default": "", "tooltip": "if no images are given - load all images from this input subfolder, sorted by name"}),
+            },
+        }
+
+    RETURN_TYPES = ("IMAGE", "MASK")
+    RETURN_NAMES = ("images", "masks")
+    DESCRIPTION = cleandoc(__doc__ if __doc__ is not None else '')
+    FUNCTION = "process"
+    OUTPUT_NODE = False
+    CATEGORY = "image"
+
+    @classmethod
+    def _image_paths(cls, images, subfolder=''):
+        names = [x.strip() for x in images.splitlines() if x.strip()]
+        if names:
+            return [folder_paths.get_annotated_filepath(x) for x in names]
+        base_dir = os.path.join(folder_paths.get_input_directory(), subfolder)
+        if not subfolder or not os.path.isdir(base_dir):
+            return []
+        return [
+            os.path.join(base_dir, x) for x in sorted(os.listdir(base_dir))
+            if os.path.splitext(x)[1].lower() in cls.image_extensions
+        ]
+
+    @classmethod
+    def IS_CHANGED(cls, images, subfolder=''):
+        state = []
+        for path in cls._image_paths(images, subfolder):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                state.append((path, None))
+                continue
+            state.append((path, stat.st_mtime_ns, stat.st_size))
+        return str(state)
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, images, subfolder=''):
+        paths = cls._image_paths(images, subfolder)
+        if not paths:
+            return 'no images to load'
+        for path in paths:
+            if not os.path.isfile(path):
+                return f'invalid image file: {path}'
+        return True
+
+    @staticmethod
+    def _decode(path):
+        import numpy as np
+        from PIL import Image, ImageOps
+
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode == 'I':
+                img = img.point(lambda i: i * (1 / 255))
+            rgb = np.asarray(img.convert('RGB'), dtype=np.float32) / 255.0
+            alpha = None
+            if 'A' in img.getbands():
+                alpha = 1.0 - np.asarray(img.getchannel('A'), dtype=np.float32) / 255.0
+        return rgb, alpha
+
+    def process(self, images, subfolder=''):
+        import torch
+        from concurrent.futures import ThreadPoolExecutor
+        import comfy.utils
+
+        paths = self._image_paths(images, subfolder)
+        if not paths:
+            raise ValueError('no images to load')
+
+        # first image defines batch resolution, so batch can be allocated once
+        first_rgb, first_alpha = self._decode(paths[0])
+        height, width = first_rgb.shape[:2]
+        out_images = torch.empty((len(paths), height, width, 3), dtype=torch.float32)
+        out_masks = torch.zeros((len(paths), height, width), dtype=torch.float32)
+
+        def _put(i, rgb, alpha):
+            image = torch.from_numpy(rgb)
+            mask = torch.from_numpy(alpha) if alpha is not None else None
+            if rgb.shape[:2] != (height, width):
+                image = comfy.utils.common_upscale(image.unsqueeze(0).movedim(-1, 1), width, height, "bilinear", "center").movedim(1, -1)[0]
+                if mask is not None:
+                    mask = comfy.utils.common_upscale(mask[None, None], width, height, "bilinear", "center")[0, 0]
+            out_images[i] = image
+            if mask is not None:
+                out_masks[i] = mask
+
+        _put(0, first_rgb, first_alpha)
+        with ThreadPoolExecutor(max_workers=min(self.max_decode_workers, len(paths))) as executor:
+            for i, (rgb, alpha) in enumerate(executor.map(self._decode, paths[1:]), start=1):
+                _put(i, rgb, alpha)
+
+        return (out_images, out_masks)
+
+
+class HouCuiLoadRawImage:
+    """
+    load raw float image uploaded from houdini as .npy, without any decoding
+    file is memory-mapped and copied straight into the tensor, so there is no precision loss and no png decode
+    1 channel is loaded as grayscale, 4th channel goes to mask (inverted, same as LoadImage does)
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("STRING", {"default": "", "tooltip": "input .npy file path"}),
+            },
+        }
+
+    RETURN_TYPES = ("IMAGE", "MASK")
+    RETURN_NAMES = ("image", "mask")
+    DESCRIPTION = cleandoc(__doc__ if __doc__ is not None else '')
+    FUNCTION = "process"
+    OUTPUT_NODE = False
+    CATEGORY = "image"
+
+    @classmethod
+    def IS_CHANGED(cls, image):
+        try:
+            stat = os.stat(folder_paths.get_annotated_filepath(image))
+        except OSError:
+            return ''
+        return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+    @classmethod
+    def VALIDATE_INPUTS(cls, image):
+        if not folder_paths.exists_annotated_filepath(image):
+            return f'invalid image file: {image}'
+        return True
+
+    def process(self, image):
+        import numpy as np
+        import torch
+
+        data = np.load(folder_paths.get_annotated_filepath(image), mmap_mode='r', allow_pickle=False)
+        if data.ndim == 2:
+            data = data[:, :, None]
+        if data.ndim == 3:
+            data = data[None]
+        if data.ndim != 4 or data.shape[-1] not in (1, 3, 4):
+            raise ValueError(f'unexpected raw image shape {data.shape}')
+        batch, height, width, channels = data.shape
+
+        out_image = torch.empty((batch, height, width, 3), dtype=torch.float32)
+        # single pass from mapped file into tensor's memory, converting dtype on the way
+        out_image.numpy()[...] = data[..., :3] if channels >= 3 else data
+        out_mask = torch.zeros((batch, height, width), dtype=torch.float32)
+        if channels == 4:
+            np.subtract(1.0, data[..., 3], out=out_mask.numpy(), casting='unsafe')
+
+        return (out_image, out_mask)
+
+
+class HouCuiSaveImageFloat:
+    """
+    save images as uncompressed float EXR, without 8 bit quantization and without png encoding
+    values are written as they are, no color transform is applied
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "images": ("IMAGE", {"tooltip": "images to save"}),
+                "filename_prefix": ("STRING", {"default": "ComfyUI"}),
+                "precision": (["half", "float"], {"default": "half", "tooltip": "16 or 32 bit float channels"}),
+            },
+        }
+
+    RETURN_TYPES = ()
+    DESCRIPTION = cleandoc(__doc__ if __doc__ is not None else '')
+    FUNCTION = "process"
+    OUTPUT_NODE = True
+    CATEGORY = "image"
+
+    def process(self, images, filename_prefix, precision):
+        import numpy as np
+        from .exr_writer import encode_exr
+
+        dtype = np.float16 if precision == 'half' else np.float32
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, folder_paths.get_output_directory(), images[0].shape[1], images[0].shape[0])
+        results = []
+        for batch_number, image in enumerate(images):
+            file = f"{filename.replace('%batch_num%', str(batch_number))}_{counter:05}_.exr"
+            with open(os.path.join(full_output_folder, file), 'wb') as f:
+                f.write(encode_exr(image.cpu().numpy(), dtype))
+            results.append({
+                "filename": file,
+                "subfolder": subfolder,
+                "type": "output",
+            })
+            counter += 1
+
+        return {"ui": {"images": results}}
+
+
 # A dictionary that contains all nodes you want to export with their names
 # NOTE: names should be globally unique
 
@@ -307,6 +519,9 @@ NODE_CLASS_MAPPINGS = {
     "HouStringPassThrough": HouStringPassThrough,
     "HouStringToFile": HouStringToFile,
     "HouCuiFixImageFix": HouCuiFixImageFix,
+    "HouCuiLoadImageBatch": HouCuiLoadImageBatch,
+    "HouCuiLoadRawImage": HouCuiLoadRawImage,
+    "HouCuiSaveImageFloat": HouCuiSaveImageFloat,
 }
 
 # A dictionary that contains the friendly/humanly readable titles for the nodes
@@ -319,4 +534,7 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "HouStringPassThrough": "String Pass Through",
     "HouStringToFile": "String Save",
     "HouCuiFixImageFix": "Fix Image Dimensions",
+    "HouCuiLoadImageBatch": "Load Image Batch",
+    "HouCuiLoadRawImage": "Load Raw Image",
+    "HouCuiSaveImageFloat": "Save Image (Float EXR)",
 }
@@ -3,11 +3,23 @@ import folder_paths
 from aiohttp import web
 from pathlib import Path
 import time
+import asyncio
+import hashlib
+import json
+import contextlib
+import os
+import re
+import threading
+import uuid
 
 prompt_server = PromptServer.instance
 routes = prompt_server.routes
 
 route_base = 'sidefx_houdini'
+upload_chunk_size = 1 << 20
+# content-addressed inputs are shared between submissions, cleanup only removes ones not used for this long
+shared_input_max_age = 24 * 60 * 60
+_content_addressed_name_re = re.compile(r'[0-9a-f]{64}(\.[^./\\]+)?')
 messages = []
 
 
@@ -68,34 +80,366 @@ async def get_messages(request):
     })
 
 
-@routes.delete(f'/{route_base}/image')
-async def delete_image(request):
-    data = await request.json()
-    image_type = data.get('type')
+def _get_base_dir(image_type: str) -> Path|None:
     if image_type == 'input':
-        base_dir = Path(folder_paths.get_input_directory())
+        return Path(folder_paths.get_input_directory())
     elif image_type == 'output':
-        base_dir = Path(folder_paths.get_output_directory())
-    else:
-        return web.Response(status=400)
+        return Path(folder_paths.get_output_directory())
+    return None
+
 
+def _delete_file(base_dir: Path, subfolder: str, image_name: str) -> str:
+    """
+    returns status: 'ok', 'missing' or 'invalid'
+    """
     # Note: no path validation!
-    image_path = base_dir / data.get('subfolder', '') /  data.get('image_name', '')
-    print(f'DEBUG {image_path}')
+    image_path = base_dir / subfolder / image_name
 
     if not image_path.exists():
-        return web.Response(status=400)
+        return 'missing'
     
     # ok, just a little validation
     if not image_path.resolve(True).is_relative_to(base_dir.resolve(True)):
+        return 'invalid'
+
+    try:
+        image_path.unlink()
+    except FileNotFoundError:
+        return 'missing'
+    except OSError:
+        return 'invalid'
+    return 'ok'
+
+
+@routes.delete(f'/{route_base}/image')
+async def delete_image(request):
+    data = await request.json()
+    base_dir = _get_base_dir(data.get('type'))
+    if base_dir is None:
+        return web.Response(status=400)
+
+    status = await asyncio.get_running_loop().run_in_executor(
+        None,
+        _delete_file, base_dir, data.get('subfolder', ''), data.get('image_name', ''),
+    )
+    if status != 'ok':
+        return web.Response(status=400)
+
+    return web.json_response({
+        'status': 'ok',
+    })
+
+
+def _touch_input_file(base_dir: Path, subfolder: str, image_name: str) -> str:
+    """
+    mark shared input as just used, returns status: 'ok', 'missing' or 'invalid'
+    """
+    image_path = base_dir / subfolder / image_name
+    if not image_path.is_file():
+        return 'missing'
+    if not image_path.resolve(True).is_relative_to(base_dir.resolve(True)):
+        return 'invalid'
+    try:
+        os.utime(image_path)
+    except FileNotFoundError:
+        return 'missing'
+    except OSError:
+        return 'invalid'
+    return 'ok'
+
+
+def _collect_shared_inputs(base_dir: Path, subfolders: set[str], max_age: float) -> int:
+    """
+    delete content-addressed inputs that were not uploaded or reused for max_age seconds
+
+    content-addressed files are not owned by any single submission, so they can't be deleted by the one using them,
+    instead every cleanup collects stale ones from the subfolders it's inputs were in.
+    returns number of deleted files
+    """
+    thres = time.time() - max_age
+    deleted = 0
+    for subfolder in subfolders:
+        folder = base_dir / subfolder
+        if not folder.is_dir() or not folder.resolve(True).is_relative_to(base_dir.resolve(True)):
+            continue
+        for entry in os.scandir(folder):
+            if not _content_addressed_name_re.fullmatch(entry.name):
+                continue
+            try:
+                if not entry.is_file() or entry.stat().st_mtime >= thres:
+                    continue
+                os.unlink(entry.path)
+            except OSError:
+                continue
+            deleted += 1
+    return deleted
+
+
+@routes.post(f'/{route_base}/cleanup')
+async def cleanup(request):
+    """
+    delete many input/output files and history items in one go
+
+    returns status for each item in the same order as given:
+    'ok', 'missing' (nothing to delete) or 'invalid' (cannot be deleted)
+
+    "shared_inputs" are content-addressed inputs the submission used, they are not deleted,
+    but marked as used, and content-addressed inputs in their subfolders unused for shared_input_max_age are deleted
+    """
+    data = await request.json()
+    inputs = data.get('inputs', [])
+    outputs = data.get('outputs', [])
+    prompt_ids = data.get('prompts', [])
+    shared_inputs = data.get('shared_inputs', [])
+    if not all(isinstance(x, list) for x in (inputs, outputs, prompt_ids, shared_inputs)):
+        return web.Response(status=400)
+
+    input_dir = _get_base_dir('input')
+    output_dir = _get_base_dir('output')
+
+    def _delete_all():
+        shared_statuses = [_touch_input_file(input_dir, x.get('subfolder', ''), x.get('image_name', '')) for x in shared_inputs]
+        return (
+            [_delete_file(input_dir, x.get('subfolder', ''), x.get('image_name', '')) for x in inputs],
+            [_delete_file(output_dir, x.get('subfolder', ''), x.get('image_name', '')) for x in outputs],
+            shared_statuses,
+            _collect_shared_inputs(input_dir, {x.get('subfolder', '') for x in shared_inputs}, shared_input_max_age),
+        )
+
+    input_statuses, output_statuses, shared_statuses, collected = await asyncio.get_running_loop().run_in_executor(None, _delete_all)
+
+    prompt_statuses = []
+    for prompt_id in prompt_ids:
+        if not prompt_server.prompt_queue.get_history(prompt_id=prompt_id):
+            prompt_statuses.append('missing')
+            continue
+        prompt_server.prompt_queue.delete_history_item(prompt_id)
+        prompt_statuses.append('ok')
+
+    return web.json_response({
+        'status': 'ok',
+        'inputs': input_statuses,
+        'outputs': output_statuses,
+        'prompts': prompt_statuses,
+        'shared_inputs': shared_statuses,
+        'collected_shared_inputs': collected,
+    })
+
+
+def _input_file_exists(base_dir: Path, subfolder: str, image_name: str, size: int|None) -> bool:
+    image_path = base_dir / subfolder / image_name
+    if not image_path.is_file():
+        return False
+    if not image_path.resolve(True).is_relative_to(base_dir.resolve(True)):
+        return False
+    if size is not None and image_path.stat().st_size != size:
+        return False
+    # existing file is about to be reused instead of uploaded, so it's fresh for cleanup's shared input collection
+    with contextlib.suppress(OSError):
+        os.utime(image_path)
+    return True
+
+
+@routes.post(f'/{route_base}/inputs/exist')
+async def inputs_exist(request):
+    """
+    check which of the given input files are already present in the input dir (by name and size),
+    so client can skip uploading them
+    """
+    data = await request.json()
+    files = data.get('files')
+    if not isinstance(files, list):
         return web.Response(status=400)
 
-    image_path.unlink()
+    base_dir = Path(folder_paths.get_input_directory())
+
+    def _check_all():
+        return [
+            _input_file_exists(base_dir, file.get('subfolder', ''), file.get('image_name', ''), file.get('size'))
+            for file in files
+        ]
+
+    exist = await asyncio.get_running_loop().run_in_executor(None, _check_all)
+
+    return web.json_response({
+        'status': 'ok',
+        'exist': exist,
+    })
+
+
+def _open_upload_target(base_dir: Path, subfolder: str, name: str):
+    """
+    returns (target path, temporary path, temporary file opened for writing),
+    or None if target is outside of base dir
+    """
+    if not name:
+        return None
+    target_path = (base_dir / subfolder / name).resolve()
+    if not target_path.is_relative_to(base_dir.resolve()):
+        return None
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target_path.with_name(f'.{target_path.name}.{uuid.uuid4().hex}.part')
+    return target_path, tmp_path, open(tmp_path, 'wb')
+
+
+def _finish_upload_target(target_path: Path, tmp_path: Path, f):
+    f.close()
+    os.replace(tmp_path, target_path)
+
+
+def _abort_upload_target(tmp_path: Path, f):
+    f.close()
+    try:
+        tmp_path.unlink()
+    except OSError:
+        pass
+
+
+@routes.post(f'/{route_base}/upload/batch')
+async def upload_batch(request):
+    """
+    upload many input files in one streamed multipart request
+
+    a "subfolder" field sets subfolder for all the "file" parts after it,
+    each file part's filename is the name to store it under, existing files are overwritten.
+    returns status for each file part in order: 'ok' or 'invalid'
+    """
+    base_dir = Path(folder_paths.get_input_directory())
+    loop = asyncio.get_running_loop()
+    reader = await request.multipart()
+
+    subfolder = ''
+    results = []
+    while (part := await reader.next()) is not None:
+        if part.name == 'subfolder':
+            subfolder = await part.text()
+            continue
+        if part.name != 'file':
+            await part.release()
+            continue
+
+        name = part.filename or ''
+        target = await loop.run_in_executor(None, _open_upload_target, base_dir, subfolder, name)
+        if target is None:
+            await part.release()
+            results.append({'name': name, 'subfolder': subfolder, 'status': 'invalid'})
+            continue
+        target_path, tmp_path, f = target
+        try:
+            while chunk := await part.read_chunk(upload_chunk_size):
+                await loop.run_in_executor(None, f.write, chunk)
+        except BaseException:
+            await loop.run_in_executor(None, _abort_upload_target, tmp_path, f)
+            raise
+        await loop.run_in_executor(None, _finish_upload_target, target_path, tmp_path, f)
+        results.append({'name': name, 'subfolder': subfolder, 'status': 'ok'})
+
+    return web.json_response({
+        'status': 'ok',
+        'files': results,
+    })
+
+
+def _node_info_data(node_type: str, node_class) -> dict:
+    """
+    roughly the same data comfy's /object_info reports for the node,
+    only used for hashing, so it does not need to match exactly
+    """
+    if hasattr(node_class, 'GET_NODE_INFO_V1'):
+        return node_class.GET_NODE_INFO_V1()
+    return {
+        'input': node_class.INPUT_TYPES(),
+        'output': getattr(node_class, 'RETURN_TYPES', None),
+        'output_is_list': getattr(node_class, 'OUTPUT_IS_LIST', None),
+        'output_name': getattr(node_class, 'RETURN_NAMES', None),
+        'output_tooltips': getattr(node_class, 'OUTPUT_TOOLTIPS', None),
+        'output_node': getattr(node_class, 'OUTPUT_NODE', False),
+        'display_name': nodes.NODE_DISPLAY_NAME_MAPPINGS.get(node_type),
+        'description': getattr(node_class, 'DESCRIPTION', ''),
+        'category': getattr(node_class, 'CATEGORY', ''),
+        'python_module': getattr(node_class, 'RELATIVE_PYTHON_MODULE', 'nodes'),
+        'deprecated': getattr(node_class, 'DEPRECATED', False),
+        'experimental': getattr(node_class, 'EXPERIMENTAL', False),
+    }
+
+
+def _node_info_hash(node_type: str, node_class) -> str:
+    try:
+        data = _node_info_data(node_type, node_class)
+    except Exception as e:
+        # stays the same while node keeps failing the same way, so client does not refetch it every time
+        data = {'error': f'{type(e).__name__}: {e}'}
+    # node inputs include model file lists, so those are covered too
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=repr).encode('utf-8')).hexdigest()
+
+
+_node_hashes_lock = threading.Lock()
+_node_hashes: dict[str, tuple[object, str]] = {}  # node type -> (node class, hash)
+_node_hashes_folders_state: tuple|None = None
+
+
+def _folders_state() -> tuple:
+    """
+    mtimes of model and input folders and all of their subfolders.
+    node definitions list files from those, so while this stays the same - definitions do too,
+    except for reloaded custom nodes, but those come with new node classes
+    """
+    folders = {folder_paths.get_input_directory()}
+    for value in getattr(folder_paths, 'folder_names_and_paths', {}).values():
+        folders.update(value[0])
+    state = []
+    for folder in sorted(folders):
+        for dirpath, _, _ in os.walk(folder, followlinks=True):
+            with contextlib.suppress(OSError):
+                state.append((dirpath, os.stat(dirpath).st_mtime_ns))
+    return tuple(state)
+
+
+def _compute_node_hashes() -> dict[str, str]:
+    """
+    calling INPUT_TYPES of every node is slow, so hashes are remembered per node,
+    and only recomputed for new node classes, or for all nodes if any of the folders changed
+    """
+    global _node_hashes_folders_state
+    with _node_hashes_lock:
+        folders_state = _folders_state()
+        if folders_state != _node_hashes_folders_state:
+            _node_hashes.clear()
+            _node_hashes_folders_state = folders_state
+
+        node_hashes = {}
+        cache_helper = getattr(folder_paths, 'cache_helper', None)
+        with cache_helper if cache_helper is not None else contextlib.nullcontext():
+            for node_type, node_class in list(nodes.NODE_CLASS_MAPPINGS.items()):
+                cached = _node_hashes.get(node_type)
+                if cached is None or cached[0] is not node_class:
+                    cached = (node_class, _node_info_hash(node_type, node_class))
+                    _node_hashes[node_type] = cached
+                node_hashes[node_type] = cached[1]
+        for node_type in _node_hashes.keys() - node_hashes.keys():
+            del _node_hashes[node_type]
+        return node_hashes
+
+
+@routes.get(f'/{route_base}/object_info/fingerprint')
+async def object_info_fingerprint(request):
+    """
+    hashes of every node definition, and of all of them together,
+    so client can tell if it's cached /object_info is still valid, and what exactly changed
+    """
+    node_hashes = await asyncio.get_running_loop().run_in_executor(None, _compute_node_hashes)
+
+    total = hashlib.sha256()
+    for node_type, node_hash in sorted(node_hashes.items()):
+        total.update(f'{node_type}:{node_hash}\n'.encode('utf-8'))
 
     return web.json_response({
         'status': 'ok',
+        'fingerprint': total.hexdigest(),
+        'nodes': node_hashes,
     })
 
+
 @routes.post(f'/{route_base}/interrupt')
 async def interrupt(request):
     """
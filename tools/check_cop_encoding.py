@@ -0,0 +1,128 @@
+"""
+round-trip check of cop_layer_encoding, runs outside of houdini
+
+png and npy written by the hand-made encoders are read back with reference decoders (PIL and numpy.load)
+and compared with what the encoders were given, for all channel counts, both layer storage types
+and odd image sizes. Layer reading (bottom row first buffers) is checked with stand-in layers.
+
+needs plain python with numpy and PIL (pillow), but not houdini:
+    python tools/check_cop_encoding.py
+exits with non-zero status if anything does not match
+"""
+import sys
+import argparse
+import io
+from pathlib import Path
+
+tools_dir = Path(__file__).resolve().parent
+repo_dir = tools_dir.parent
+sys.path[:0] = [str(tools_dir / 'fake_hou'), str(repo_dir / 'houdini' / 'python3.11libs')]
+
+import numpy
+from PIL import Image
+import hou  # type:ignore
+if not hasattr(hou, 'register_node_type'):
+    raise RuntimeError('real hou module got imported, run this with plain python, not hython')
+
+from houdini_comfyui_connection import cop_layer_encoding
+
+
+sizes = ((1, 1), (7, 3), (64, 33), (513, 257))  # (width, height)
+pil_modes = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+
+
+class _StandInLayer:
+    """
+    just what read_layer_pixels needs from hou.ImageLayer
+    """
+    def __init__(self, pixels: numpy.ndarray, storage: str):
+        self.__pixels = pixels
+        self.__storage = storage
+
+    def bufferResolution(self) -> tuple[int, int]:
+        return self.__pixels.shape[1], self.__pixels.shape[0]
+
+    def channelCount(self) -> int:
+        return self.__pixels.shape[2]
+
+    def storageType(self) -> str:
+        return self.__storage
+
+    def allBufferElements(self) -> bytes:
+        dtype = numpy.float16 if self.__storage == hou.imageLayerStorageType.Float16 else numpy.float32
+        # real layers start from the bottom row
+        return numpy.ascontiguousarray(self.__pixels[::-1], dtype=dtype).tobytes()
+
+
+class _StandInCopNode(hou.CopNode):
+    def __init__(self, layer: _StandInLayer):
+        self.__layer = layer
+
+    def path(self) -> str:
+        return '/stage/stand_in'
+
+    def layer(self, output_index: int = 0):
+        return self.__layer if output_index == 0 else None
+
+
+def check_png(pixels: numpy.ndarray) -> str|None:
+    expected = (numpy.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(numpy.uint8)
+    with Image.open(io.BytesIO(cop_layer_encoding.encode_png(pixels))) as image:
+        image.load()
+        if image.mode != pil_modes[pixels.shape[2]]:
+            return f'decoded as {image.mode}, expected {pil_modes[pixels.shape[2]]}'
+        decoded = numpy.asarray(image).reshape(expected.shape)
+    if not numpy.array_equal(decoded, expected):
+        return f'{numpy.count_nonzero(decoded != expected)} values differ'
+    return None
+
+
+def check_npy(pixels: numpy.ndarray) -> str|None:
+    decoded = numpy.load(io.BytesIO(cop_layer_encoding.encode_npy(pixels)), allow_pickle=False)
+    if decoded.dtype != numpy.float32 or decoded.shape != pixels.shape:
+        return f'decoded {decoded.dtype} {decoded.shape}, expected float32 {pixels.shape}'
+    if not numpy.array_equal(decoded, pixels):
+        return f'{numpy.count_nonzero(decoded != pixels)} values differ'
+    return None
+
+
+def check_layer_read(pixels: numpy.ndarray, storage: str) -> str|None:
+    expected = pixels.astype(numpy.float16).astype(numpy.float32) if storage == hou.imageLayerStorageType.Float16 else pixels
+    read = cop_layer_encoding.read_layer_pixels(_StandInCopNode(_StandInLayer(pixels, storage)))
+    if read.shape != expected.shape:
+        return f'read shape {read.shape}, expected {expected.shape}'
+    if not numpy.array_equal(read, expected):
+        return f'{numpy.count_nonzero(read != expected)} values differ'
+    return None
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(argv)
+
+    rng = numpy.random.default_rng(options.seed)
+    failed = 0
+    for width, height in sizes:
+        for channels in sorted(pil_modes):
+            # out of 0-1 range values too, png has to clamp them
+            pixels = rng.uniform(-0.25, 1.25, (height, width, channels)).astype(numpy.float32)
+            checks = [
+                ('png', check_png(pixels)),
+                ('npy', check_npy(pixels)),
+            ]
+            for storage in (hou.imageLayerStorageType.Float32, hou.imageLayerStorageType.Float16):
+                checks.append((f'read {storage}', check_layer_read(pixels, storage)))
+            for name, error in checks:
+                status = 'ok' if error is None else f'FAILED: {error}'
+                print(f'{width}x{height}x{channels} {name:<12} {status}')
+                failed += error is not None
+
+    if failed:
+        print(f'{failed} checks failed')
+        sys.exit(1)
+    print('all checks passed')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
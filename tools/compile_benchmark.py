@@ -0,0 +1,400 @@
+"""
+benchmark of compound graph construction, runs outside of houdini
+
+synthetic networks of partial graph nodes are built with a stand-in hou module (tools/fake_hou),
+then construct_full_graph (with cold and warm compile cache), combine_graph_parts
+and replace_params_in_graph_by_key are timed on them.
+Results can be appended to a jsonl file together with the git commit they were measured at,
+and --history shows how timings changed from commit to commit.
+
+needs plain python with the packages houdini's python has (requests, numpy), but not houdini:
+    python tools/compile_benchmark.py --preset wide --preset nested --save compile_benchmark.jsonl
+    python tools/compile_benchmark.py --history compile_benchmark.jsonl
+"""
+import sys
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable
+
+tools_dir = Path(__file__).resolve().parent
+repo_dir = tools_dir.parent
+sys.path[:0] = [str(tools_dir / 'fake_hou'), str(repo_dir / 'houdini' / 'python3.11libs')]
+
+import hou  # type:ignore
+if not hasattr(hou, 'register_node_type'):
+    raise RuntimeError('real hou module got imported, run this with plain python, not hython')
+
+from houdini_comfyui_connection import compound_graph_core, compound_graph_compile_cache
+
+
+@dataclass
+class NetworkShape:
+    layers: int  # partial graph nodes in the longest chain of inputs
+    width: int  # partial graph nodes in each layer
+    fan_in: int  # connected inputs of each partial graph node, fed from random nodes of the previous layer
+    nesting: int  # every partial graph node sits this many subnets deep, so every connection crosses 2*nesting subnet boundaries
+    comfy_nodes: int = 4  # comfy nodes inside each partial graph
+    value_inputs: int = 6  # cui inputs set by value, not by connection
+    passthrough_every: int = 3  # every Nth connection goes through a null, a switch or a bypassed node
+
+    def node_count(self) -> int:
+        return self.layers * self.width
+
+
+presets = {
+    'small': NetworkShape(layers=5, width=10, fan_in=2, nesting=0),
+    'wide': NetworkShape(layers=4, width=500, fan_in=8, nesting=0),
+    'deep': NetworkShape(layers=100, width=20, fan_in=2, nesting=0),
+    'nested': NetworkShape(layers=10, width=100, fan_in=3, nesting=8),
+    'large': NetworkShape(layers=20, width=150, fan_in=4, nesting=2),
+}
+
+context_vars = {
+    'prompt': 'a photo of a capybara',
+    'seed': 42,
+}
+
+
+def _register_node_types(shape: NetworkShape):
+    hou.register_node_type('comfyui_partial_graph', max_inputs=max(shape.fan_in, 1), max_outputs=1, is_network=True, namespace='xxx')
+    hou.register_node_type('comfyui_partial_graph_outputs', max_inputs=2, max_outputs=0, namespace='xxx')
+    hou.register_node_type('comfyui_image_uploader', max_inputs=1, max_outputs=0, is_network=True, namespace='xxx')
+
+
+def _partial_graph_parms(shape: NetworkShape, rng: random.Random, connected_inputs: int, is_first_layer: bool) -> dict:
+    """
+    parms of a partial graph node with a chain of comfy nodes inside,
+    first comfy node gets all the connected inputs, last one is the output
+    """
+    graph = {}
+    for i in range(1, shape.comfy_nodes + 1):
+        graph[str(i)] = {
+            'inputs': {'previous': [str(i - 1), 0]} if i > 1 else {},
+            'class_type': f'BenchNode{i % 3}',
+            '_meta': {'title': f'node{i}'},
+        }
+    parms = {
+        'cui_graph': json.dumps(graph),
+        'cui_outputs': 1,
+        'cui_o_node_title_1': f'node{shape.comfy_nodes}',
+        'cui_o_node_output_1': 0,
+        'cui_o_meta_outtype_1': 'IMAGE',
+    }
+
+    inputs = []
+    for input_i in range(connected_inputs):
+        inputs.append({
+            'node_input': f'image{input_i}',
+            'value_type': f'input{input_i + 1}',
+            'orig_value_type': '',
+            'intype': 'IMAGE',
+            'bakecc': 0 if is_first_layer and input_i % 2 else 1,
+        })
+    value_types = ('int', 'float', 'text', 'bool', 'textint')
+    for value_i in range(shape.value_inputs):
+        value_type = value_types[value_i % len(value_types)]
+        value = {
+            'int': rng.randint(0, 100),
+            'float': rng.random(),
+            'text': rng.choice(('@{{prompt}}, detailed', 'plain text', 'seed @{{seed}}')),
+            'bool': rng.randint(0, 1),
+            'textint': str(rng.randint(0, 1 << 40)),
+        }[value_type]
+        inputs.append({
+            'node_input': f'value{value_i}',
+            'value_type': value_type,
+            'orig_value_type': value_type,
+            'value': value,
+            'convertedtype': 'text',
+        })
+
+    parms['cui_inputs'] = len(inputs)
+    for i, inp in enumerate(inputs, 1):
+        parms[f'cui_i_node_title_{i}'] = 'node1'
+        parms[f'cui_i_node_input_{i}'] = inp['node_input']
+        parms[f'cui_i_value_type_{i}'] = inp['value_type']
+        parms[f'cui_i_meta_orig_value_type_{i}'] = inp['orig_value_type']
+        if 'value' in inp:
+            parms[f'cui_i_value_{inp["value_type"]}_{i}'] = inp['value']
+        if inp['value_type'] == 'text':
+            parms[f'cui_i_meta_convertedtype_{i}'] = inp['convertedtype']
+        if 'intype' in inp:
+            parms[f'cui_i_meta_intype_{i}'] = inp['intype']
+            parms[f'cui_i_meta_bakecc_{i}'] = inp['bakecc']
+    return parms
+
+
+def _wrap_in_subnets(parent: hou.Node, depth: int, name: str) -> tuple[hou.Node, hou.Node]:
+    """
+    returns the outermost subnet and the network to put the node in
+    """
+    outer = parent
+    network = parent
+    for level in range(depth):
+        network = network.createNode('subnet', f'{name}_nest{level}')
+        if level == 0:
+            outer = network
+    return outer, network
+
+
+def _connect_through_subnets(outer: hou.Node, depth: int, inner: hou.Node, input_i: int, source: hou.Node):
+    """
+    wire source into input_i of the outermost subnet, and through every level of nesting down to inner node's input_i
+    """
+    if depth == 0:
+        inner.setInput(input_i, source)
+        return
+    outer.setInput(input_i, source)
+    network = outer
+    for _ in range(depth - 1):
+        child = next(x for x in network.children() if x.type().name() == 'subnet')
+        child.setInput(input_i, network.node('inputs'), input_i)
+        network = child
+    inner.setInput(input_i, network.node('inputs'), input_i)
+
+
+def _expose_through_subnets(outer: hou.Node, depth: int, inner: hou.Node):
+    """
+    wire inner node's output to output 0 of every subnet it's nested in
+    """
+    if depth == 0:
+        return
+    networks = [outer]
+    for _ in range(depth - 1):
+        networks.append(next(x for x in networks[-1].children() if x.type().name() == 'subnet'))
+    source = inner
+    for network in reversed(networks):
+        network.node('outputs').setInput(0, source)
+        source = network
+
+
+def _passthrough(network: hou.Node, source: hou.Node, kind: int, name: str) -> hou.Node:
+    if kind == 0:
+        null = network.createNode('null', f'{name}_null')
+        null.setInput(0, source)
+        return null
+    elif kind == 1:
+        switch = network.createNode('switch', f'{name}_switch')
+        switch.setInput(0, network.node('bench_constant'))
+        switch.setInput(1, source)
+        switch.setParms({'input': 1})
+        return switch
+    bypassed = network.createNode('comfyui_partial_graph', f'{name}_bypassed')
+    bypassed.setParms(_partial_graph_parms(NetworkShape(1, 1, 1, 0), random.Random(0), 1, False))
+    bypassed.setInput(0, source)
+    bypassed.bypass(True)
+    return bypassed
+
+
+def build_network(name: str, shape: NetworkShape, seed: int = 0) -> hou.Node:
+    """
+    returns the outputs node, ready for construct_full_graph
+    """
+    _register_node_types(shape)
+    rng = random.Random(seed)
+    copnet = hou.node('/obj').createNode('copnet', name)
+    graph = copnet.createNode('copnet', 'graph')
+    graph.createNode('constant', 'bench_constant')
+
+    connection_count = 0
+    previous_layer: list[hou.Node] = []
+    for layer_i in range(shape.layers):
+        layer = []
+        for node_i in range(shape.width):
+            node_name = f'pg_{layer_i}_{node_i}'
+            outer, network = _wrap_in_subnets(graph, shape.nesting, node_name)
+            partial = network.createNode('comfyui_partial_graph', node_name)
+            for input_i in range(shape.fan_in):
+                partial.createNode('comfyui_image_uploader', f'input_upload{input_i + 1}')
+            partial.setParms(_partial_graph_parms(shape, rng, shape.fan_in, layer_i == 0))
+
+            for input_i in range(shape.fan_in):
+                if previous_layer:
+                    source = rng.choice(previous_layer)
+                else:
+                    # first layer is fed with plain cop images, those become uploads
+                    source = graph.createNode('constant', f'{node_name}_image{input_i}')
+                connection_count += 1
+                if shape.passthrough_every and connection_count % shape.passthrough_every == 0:
+                    source = _passthrough(graph, source, connection_count // shape.passthrough_every % 3, f'{node_name}_{input_i}')
+                _connect_through_subnets(outer, shape.nesting, partial, input_i, source)
+            _expose_through_subnets(outer, shape.nesting, partial)
+            layer.append(outer if shape.nesting else partial)
+        previous_layer = layer
+
+    outputs = graph.createNode('comfyui_partial_graph_outputs', 'outputs')
+    for i, last in enumerate(previous_layer):
+        outputs.setInput(i, last)
+    return outputs
+
+
+def _collect_graph_parts(output_node: hou.Node) -> dict:
+    """
+    what construct_full_graph does before combining parts, without saving nodes
+    """
+    node_to_graph = {}
+    upload_nodes = {}
+    for i, connector in enumerate(output_node.inputConnectors()):
+        if not connector:
+            continue
+        source = compound_graph_core.get_output_index_from_input(output_node, i)
+        if source is None or isinstance(source, compound_graph_core.NonGraphSource):
+            continue
+        compound_graph_core.process_graph_node(source.node, node_to_graph, upload_nodes, context_vars)
+    return node_to_graph, upload_nodes
+
+
+@dataclass
+class Timing:
+    preset: str
+    benchmark: str
+    repeat: int
+    min_ms: float
+    median_ms: float
+    graph_nodes: int  # comfy nodes in the result
+
+
+def _measure(func: Callable[[], int], setup: Callable[[], None]|None, repeat: int) -> tuple[list[float], int]:
+    times = []
+    graph_nodes = 0
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        # like timeit, so collections triggered by garbage of previous runs do not add noise
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            graph_nodes = func()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return times, graph_nodes
+
+
+def run_preset(preset: str, shape: NetworkShape, repeat: int, seed: int) -> list[Timing]:
+    output_node = build_network(f'bench_{preset}', shape, seed)
+    results = []
+
+    def _construct():
+        graph, _, _ = compound_graph_core.construct_full_graph(output_node, context_vars=context_vars)
+        return len(graph)
+
+    state = {}
+
+    def _setup_combine():
+        state['parts'], state['uploads'] = _collect_graph_parts(output_node)
+
+    def _combine():
+        state['graph'], state['overrides'] = compound_graph_core.combine_graph_parts(state['parts'])
+        return len(state['graph'])
+
+    def _setup_replace():
+        _setup_combine()
+        _combine()
+
+    def _replace():
+        compound_graph_core.replace_params_in_graph_by_key(state['graph'], state['overrides'], state['uploads'], context_vars)
+        return len(state['graph'])
+
+    benchmarks = (
+        ('construct_full_graph cold', _construct, compound_graph_compile_cache.clear),
+        ('construct_full_graph warm', _construct, None),
+        ('combine_graph_parts', _combine, _setup_combine),
+        ('replace_params_in_graph_by_key', _replace, _setup_replace),
+    )
+    _construct()  # warm up caches and imports
+    for name, func, setup in benchmarks:
+        times, graph_nodes = _measure(func, setup, repeat)
+        results.append(Timing(preset, name, repeat, min(times) * 1000, statistics.median(times) * 1000, graph_nodes))
+    return results
+
+
+def _git_commit() -> tuple[str|None, bool]:
+    """
+    current commit and whether there are uncommitted changes
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo_dir, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo_dir, capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, dirty
+
+
+def save_results(path: Path, results: list[Timing]):
+    commit, dirty = _git_commit()
+    with open(path, 'a') as f:
+        for timing in results:
+            f.write(json.dumps({
+                'commit': commit,
+                'dirty': dirty,
+                'time': time.time(),
+                'python': platform.python_version(),
+                'machine': platform.node(),
+                **asdict(timing),
+            }) + '\n')
+
+
+def print_history(path: Path):
+    """
+    median of every benchmark per commit, in the order commits were first measured,
+    with the change from the previous commit
+    """
+    per_commit: dict[str, dict[tuple[str, str], list[float]]] = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            commit = (entry['commit'] or 'unknown')[:10] + ('+' if entry['dirty'] else '')
+            per_commit.setdefault(commit, {}).setdefault((entry['preset'], entry['benchmark']), []).append(entry['median_ms'])
+
+    previous: dict[tuple[str, str], float] = {}
+    for commit, timings in per_commit.items():
+        print(commit)
+        for key, values in sorted(timings.items()):
+            value = statistics.median(values)
+            change = ''
+            if (prev_value := previous.get(key)) is not None and prev_value > 0:
+                change = f'{(value - prev_value) / prev_value * 100:+.1f}%'
+            print(f'  {key[0]:<8} {key[1]:<32} {value:10.2f} ms {change}')
+            previous[key] = value
+
+
+def main(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--preset', action='append', choices=sorted(presets), help='can be given multiple times, all presets by default')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='append results to this jsonl file, with current git commit')
+    parser.add_argument('--history', help='print results saved in this jsonl file per commit, then exit')
+
+    options = parser.parse_args(argv)
+
+    if options.history:
+        print_history(Path(options.history))
+        return
+
+    all_results = []
+    for preset in options.preset or list(presets):
+        shape = presets[preset]
+        print(f'{preset}: {shape.node_count()} partial graph nodes, {shape.layers} layers, fan-in {shape.fan_in}, nesting {shape.nesting}')
+        results = run_preset(preset, shape, options.repeat, options.seed)
+        for timing in results:
+            print(f'  {timing.benchmark:<32} min {timing.min_ms:10.2f} ms, median {timing.median_ms:10.2f} ms ({timing.graph_nodes} comfy nodes)')
+        all_results.extend(results)
+
+    if options.save:
+        save_results(Path(options.save), all_results)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
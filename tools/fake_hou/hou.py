@@ -0,0 +1,425 @@
+"""
+minimal stand-in for houdini's hou module
+
+just enough of it for graph compilation (compound_graph_core and it's helpers) to run outside of houdini:
+nodes with inputs, outputs and parms, subnets with their input/output nodes, switches, nulls and bypass.
+Networks are built with the same calls as in houdini (createNode, setInput, setParms, bypass),
+the only liberty is that setParms creates parms that do not exist yet, as there are no real node types here
+"""
+import itertools
+from types import SimpleNamespace
+
+
+class OperationInterrupted(Exception):
+    pass
+
+
+class InterruptableOperation:
+    def __init__(self, operation_name: str, long_operation_name: str|None = None, open_interrupt_dialog: bool = False):
+        self.operation_name = operation_name
+        self.long_operation_name = long_operation_name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def updateProgress(self, percentage: float = -1.0):
+        pass
+
+    def updateLongProgress(self, percentage: float = -1.0, long_op_status: str|None = None):
+        pass
+
+
+class NodeTypeCategory:
+    def __init__(self, name: str):
+        self.__name = name
+
+    def name(self) -> str:
+        return self.__name
+
+
+_categories = {name: NodeTypeCategory(name) for name in ('Object', 'Cop', 'Sop', 'Driver')}
+
+
+def nodeTypeCategories() -> dict[str, NodeTypeCategory]:
+    return dict(_categories)
+
+
+class NodeType:
+    def __init__(self, name: str, category: NodeTypeCategory, *, max_inputs: int, max_outputs: int, is_network: bool, namespace: str = ''):
+        self.__name = name
+        self.__category = category
+        self.__namespace = namespace
+        self.max_inputs = max_inputs
+        self.max_outputs = max_outputs
+        self.is_network = is_network
+
+    def name(self) -> str:
+        if self.__namespace:
+            return f'{self.__namespace}::{self.__name}'
+        return self.__name
+
+    def nameComponents(self) -> tuple[str, str, str, str]:
+        return ('', self.__namespace, self.__name, '')
+
+    def category(self) -> NodeTypeCategory:
+        return self.__category
+
+
+_node_types: dict[str, NodeType] = {}
+
+
+def register_node_type(name: str, *, category: str = 'Cop', max_inputs: int = 4, max_outputs: int = 1, is_network: bool = False, namespace: str = '') -> NodeType:
+    """
+    not part of hou, here node types have to be declared before createNode can use them
+    """
+    node_type = NodeType(name, _categories[category], max_inputs=max_inputs, max_outputs=max_outputs, is_network=is_network, namespace=namespace)
+    _node_types[name] = node_type
+    return node_type
+
+
+register_node_type('root', category='Object', max_inputs=0, max_outputs=0, is_network=True)
+register_node_type('copnet', category='Object', max_inputs=0, max_outputs=0, is_network=True)
+register_node_type('subnet', max_inputs=4, max_outputs=4, is_network=True)
+register_node_type('input', max_inputs=0, max_outputs=4)
+register_node_type('output', max_inputs=4, max_outputs=0)
+register_node_type('null')
+register_node_type('switch', max_inputs=0)  # any number of inputs
+register_node_type('constant', max_inputs=0)
+
+
+class parmTemplateType:
+    Int = 'Int'
+    Float = 'Float'
+    String = 'String'
+    Toggle = 'Toggle'
+
+
+class ParmTemplate:
+    def __init__(self, name: str, template_type: str):
+        self.__name = name
+        self.__type = template_type
+
+    def name(self) -> str:
+        return self.__name
+
+    def type(self) -> str:
+        return self.__type
+
+
+class Parm:
+    def __init__(self, node: 'Node', name: str, value):
+        self.__node = node
+        self.__name = name
+        self.__value = value
+        if isinstance(value, bool):
+            template_type = parmTemplateType.Toggle
+        elif isinstance(value, int):
+            template_type = parmTemplateType.Int
+        elif isinstance(value, float):
+            template_type = parmTemplateType.Float
+        else:
+            template_type = parmTemplateType.String
+        self.__template = ParmTemplate(name, template_type)
+
+    def name(self) -> str:
+        return self.__name
+
+    def node(self) -> 'Node':
+        return self.__node
+
+    def parmTemplate(self) -> ParmTemplate:
+        return self.__template
+
+    def eval(self):
+        if self.__template.type() == parmTemplateType.Toggle:
+            return int(self.__value)
+        return self.__value
+
+    def evalAsString(self) -> str:
+        return str(self.eval())
+
+    def evalAsInt(self) -> int:
+        return int(self.__value)
+
+    def evalAsFloat(self) -> float:
+        return float(self.__value)
+
+    def unexpandedString(self) -> str:
+        return str(self.__value)
+
+    def keyframes(self) -> tuple:
+        return ()
+
+    def expression(self) -> str:
+        raise OperationFailed(f'{self.__name} has no expression')
+
+    def getReferencedParm(self) -> 'Parm':
+        return self
+
+    def set(self, value):
+        self.__value = value
+        self.__node._parm_changed(self)
+
+
+class NodeConnection:
+    def __init__(self, input_node: 'Node', output_index: int, output_node: 'Node', input_index: int):
+        self.__input_node = input_node
+        self.__output_index = output_index
+        self.__output_node = output_node
+        self.__input_index = input_index
+
+    def inputNode(self) -> 'Node':
+        return self.__input_node
+
+    def outputIndex(self) -> int:
+        return self.__output_index
+
+    def outputNode(self) -> 'Node':
+        return self.__output_node
+
+    def inputIndex(self) -> int:
+        return self.__input_index
+
+
+class nodeEventType:
+    ParmTupleChanged = 'ParmTupleChanged'
+    BeingDeleted = 'BeingDeleted'
+
+
+class hipFileEventType:
+    BeforeClear = 'BeforeClear'
+    BeforeLoad = 'BeforeLoad'
+
+
+class imageLayerStorageType:
+    Float16 = 'Float16'
+    Float32 = 'Float32'
+
+
+_session_ids = itertools.count(1)
+
+
+class Node:
+    def __init__(self, parent: 'Node|None', node_type: NodeType, name: str):
+        self.__parent = parent
+        self.__type = node_type
+        self.__name = name
+        self.__session_id = next(_session_ids)
+        self.__children: dict[str, Node] = {}
+        self.__parms: dict[str, Parm] = {}
+        self.__inputs: dict[int, NodeConnection] = {}
+        self.__outputs: dict[int, list[NodeConnection]] = {}
+        self.__bypassed = False
+        self.__event_callbacks: list[tuple[tuple, object]] = []
+        self.__hda_module = SimpleNamespace()
+
+    def name(self) -> str:
+        return self.__name
+
+    def path(self) -> str:
+        if self.__parent is None:
+            return '/'
+        parent_path = self.__parent.path()
+        return f'{parent_path.rstrip("/")}/{self.__name}'
+
+    def sessionId(self) -> int:
+        return self.__session_id
+
+    def type(self) -> NodeType:
+        return self.__type
+
+    def parent(self) -> 'Node|None':
+        return self.__parent
+
+    def children(self) -> tuple['Node', ...]:
+        return tuple(self.__children.values())
+
+    def node(self, path: str) -> 'Node|None':
+        if path.startswith('/'):
+            return node(path)
+        current = self
+        for part in path.split('/'):
+            if part in ('', '.'):
+                continue
+            if part == '..':
+                current = current.parent()
+            else:
+                current = current.__children.get(part)
+            if current is None:
+                return None
+        return current
+
+    def createNode(self, node_type_name: str, node_name: str|None = None) -> 'Node':
+        node_type = _node_types.get(node_type_name)
+        if node_type is None:
+            raise OperationFailed(f'unknown node type "{node_type_name}"')
+        if node_name is None:
+            node_name = next(f'{node_type_name}{i}' for i in itertools.count(1) if f'{node_type_name}{i}' not in self.__children)
+        elif node_name in self.__children:
+            raise OperationFailed(f'node "{node_name}" already exists in {self.path()}')
+        new_node = (CopNode if node_type.category() is _categories['Cop'] else Node)(self, node_type, node_name)
+        self.__children[node_name] = new_node
+        if node_type_name == 'subnet':
+            # like copernicus subnets, they come with their inputs and outputs nodes
+            new_node.createNode('input', 'inputs')
+            new_node.createNode('output', 'outputs')
+        return new_node
+
+    def setInput(self, input_index: int, item_to_become_input: 'Node|None', output_index: int = 0):
+        if (old := self.__inputs.pop(input_index, None)) is not None:
+            old.inputNode().__outputs[old.outputIndex()].remove(old)
+        if item_to_become_input is None:
+            return
+        connection = NodeConnection(item_to_become_input, output_index, self, input_index)
+        self.__inputs[input_index] = connection
+        item_to_become_input.__outputs.setdefault(output_index, []).append(connection)
+
+    def inputs(self) -> tuple['Node|None', ...]:
+        if not self.__inputs:
+            return ()
+        return tuple(
+            connection.inputNode() if (connection := self.__inputs.get(i)) is not None else None
+            for i in range(max(self.__inputs) + 1)
+        )
+
+    def inputConnections(self) -> tuple[NodeConnection, ...]:
+        return tuple(self.__inputs[i] for i in sorted(self.__inputs))
+
+    def inputConnectors(self) -> tuple[tuple[NodeConnection, ...], ...]:
+        count = max(self.__type.max_inputs, max(self.__inputs, default=-1) + 1)
+        return tuple(
+            (connection,) if (connection := self.__inputs.get(i)) is not None else ()
+            for i in range(count)
+        )
+
+    def outputConnectors(self) -> tuple[tuple[NodeConnection, ...], ...]:
+        count = max(self.__type.max_outputs, max(self.__outputs, default=-1) + 1)
+        return tuple(tuple(self.__outputs.get(i, ())) for i in range(count))
+
+    def isBypassed(self) -> bool:
+        return self.__bypassed
+
+    def bypass(self, on: bool):
+        self.__bypassed = on
+
+    def subnetOutputs(self) -> tuple['Node', ...]:
+        return tuple(x for x in self.__children.values() if x.type().name() == 'output')
+
+    def childTypeCategory(self) -> NodeTypeCategory|None:
+        if not self.__type.is_network:
+            return None
+        if self.__type.name() in ('root', 'copnet', 'subnet'):
+            return _categories['Cop']
+        return self.__type.category()
+
+    def parm(self, parm_path: str) -> Parm|None:
+        return self.__parms.get(parm_path)
+
+    def parms(self) -> tuple[Parm, ...]:
+        return tuple(self.__parms.values())
+
+    def evalParm(self, parm_path: str):
+        parm = self.__parms.get(parm_path)
+        if parm is None:
+            raise OperationFailed(f'{self.path()} has no parm "{parm_path}"')
+        return parm.eval()
+
+    def setParms(self, parm_dict: dict):
+        for name, value in parm_dict.items():
+            if (parm := self.__parms.get(name)) is not None:
+                parm.set(value)
+            else:
+                self.__parms[name] = Parm(self, name, value)
+
+    def hdaModule(self):
+        return self.__hda_module
+
+    def destroy(self):
+        for child in self.children():
+            child.destroy()
+        for event_types, callback in list(self.__event_callbacks):
+            if nodeEventType.BeingDeleted in event_types:
+                callback(node=self, event_type=nodeEventType.BeingDeleted)
+        for i in list(self.__inputs):
+            self.setInput(i, None)
+        for connections in list(self.__outputs.values()):
+            for connection in list(connections):
+                connection.outputNode().setInput(connection.inputIndex(), None)
+        if self.__parent is not None:
+            self.__parent.__children.pop(self.__name, None)
+
+    def addEventCallback(self, event_types, callback):
+        self.__event_callbacks.append((tuple(event_types), callback))
+
+    def removeEventCallback(self, event_types, callback):
+        self.__event_callbacks = [x for x in self.__event_callbacks if x[1] is not callback]
+
+    def _parm_changed(self, parm: Parm):
+        for event_types, callback in list(self.__event_callbacks):
+            if nodeEventType.ParmTupleChanged in event_types:
+                callback(node=self, event_type=nodeEventType.ParmTupleChanged, parm_tuple=parm)
+
+    def __repr__(self):
+        return f'<hou.{type(self).__name__} {self.path()}>'
+
+
+class CopNode(Node):
+    def layer(self, output_index: int = 0):
+        return None
+
+
+class OperationFailed(Exception):
+    pass
+
+
+_root = Node(None, _node_types['root'], '')
+_root.createNode('copnet', 'obj')
+_frame = 1.0
+
+
+def node(path: str) -> Node|None:
+    if not path.startswith('/'):
+        return None
+    return _root.node(path.lstrip('/'))
+
+
+def root() -> Node:
+    return _root
+
+
+def frame() -> float:
+    return _frame
+
+
+def setFrame(frame: float):
+    global _frame
+    _frame = float(frame)
+
+
+def isUIAvailable() -> bool:
+    return False
+
+
+class _HipFile:
+    def __init__(self):
+        self.__callbacks = []
+
+    def addEventCallback(self, callback):
+        self.__callbacks.append(callback)
+
+    def removeEventCallback(self, callback):
+        self.__callbacks.remove(callback)
+
+    def clear(self, suppress_save_prompt: bool = True):
+        for callback in list(self.__callbacks):
+            callback(hipFileEventType.BeforeClear)
+        for child in _root.children():
+            child.destroy()
+        _root.createNode('copnet', 'obj')
+
+
+hipFile = _HipFile()
+ui = None